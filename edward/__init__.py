@@ -12,8 +12,9 @@ from edward import util
 from edward.models import PyMC3Model, PythonModel, StanModel
 from edward.criticisms import evaluate, ppc
 from edward.inferences import Inference, MonteCarlo, VariationalInference, \
-    MFVI, KLpq, MAP, Laplace
-from edward.util import copy, cumprod, dot, Empty, get_dims, \
-    get_session, hessian, kl_multivariate_normal, log_sum_exp, logit, \
-    multivariate_rbf, placeholder, rbf, set_seed, tile, to_simplex
+    MFVI, IWVI, KLpq, MAP, Laplace, SGLD, SGHMC, SMC, run_chains
+from edward.util import BatchIterator, copy, cumprod, dot, Empty, \
+    get_dims, get_session, hessian, kl_multivariate_normal, log_sum_exp, \
+    logit, multivariate_rbf, placeholder, rbf, set_seed, TFRecordData, \
+    tile, to_simplex
 from edward.version import __version__
@@ -536,3 +536,74 @@ def cosine_proximity(y_true, y_pred):
   y_true = tf.nn.l2_normalize(y_true, len(y_true.get_shape()) - 1)
   y_pred = tf.nn.l2_normalize(y_pred, len(y_pred.get_shape()) - 1)
   return tf.reduce_sum(y_true * y_pred)
+
+
+# Convergence diagnostics
+
+
+def potential_scale_reduction(samples):
+  """Split potential scale reduction factor, :math:`\hat{R}`.
+  (Gelman and Rubin, 1992; Gelman et al., 2013)
+
+  Each chain is split into its first and second half, and the
+  between-chain variance of the halves is compared to their
+  within-chain variance. Values close to 1 indicate convergence.
+
+  Parameters
+  ----------
+  samples : np.ndarray
+    A n-D array of shape ``[n_chains, n_samples, ...]``, with
+    ``n_samples >= 4``.
+
+  Returns
+  -------
+  np.ndarray
+    An array of shape ``samples.shape[2:]``.
+  """
+  samples = np.asarray(samples, dtype=np.float64)
+  n = samples.shape[1] // 2
+  # Drop the middle sample if the chains have odd length.
+  halves = np.concatenate([samples[:, :n], samples[:, -n:]], 0)
+  within = np.mean(np.var(halves, 1, ddof=1), 0)
+  between = np.var(np.mean(halves, 1), 0, ddof=1)
+  var_plus = (n - 1.0) / n * within + between
+  return np.sqrt(var_plus / within)
+
+
+def effective_sample_size(samples):
+  """Effective sample size across chains. (Geyer, 1992; Gelman et al.,
+  2013)
+
+  The autocorrelations are computed with a fast Fourier transform and
+  summed over lags using Geyer's initial positive sequence.
+
+  Parameters
+  ----------
+  samples : np.ndarray
+    A n-D array of shape ``[n_chains, n_samples, ...]``, with
+    ``n_samples >= 2``.
+
+  Returns
+  -------
+  np.ndarray
+    An array of shape ``samples.shape[2:]``.
+  """
+  samples = np.asarray(samples, dtype=np.float64)
+  m, n = samples.shape[:2]
+  centered = samples - np.mean(samples, 1, keepdims=True)
+  # Autocovariance of each chain at all lags, zero-padding to avoid
+  # circular wrap-around.
+  fft = np.fft.rfft(centered, 2 * n, axis=1)
+  acov = np.fft.irfft(fft * np.conjugate(fft), 2 * n, axis=1)[:, :n] / n
+  within = np.mean(acov[:, 0], 0) * n / (n - 1.0)
+  between = np.var(np.mean(samples, 1), 0, ddof=1) if m > 1 else 0.0
+  var_plus = (n - 1.0) / n * within + between
+  rho = 1.0 - (within - np.mean(acov, 0)) / var_plus
+  # Sum consecutive pairs of autocorrelations, truncating at the
+  # first pair which is negative.
+  n_pairs = n // 2
+  pairs = rho[:2 * n_pairs:2] + rho[1:2 * n_pairs:2]
+  mask = np.cumprod(pairs > 0, 0)
+  tau = -1.0 + 2.0 * np.sum(pairs * mask, 0)
+  # Bound the estimate for antithetic chains, as in Stan.
+  return m * n / np.maximum(tau, 1.0 / np.log10(m * n + 10.0))
@@ -7,9 +7,14 @@ import numpy as np
 import six
 import tensorflow as tf
 
-from edward.models import StanModel, RandomVariable, Normal, PointMass
-from edward.util import copy, get_dims, get_session, hessian, \
-    kl_multivariate_normal, log_sum_exp, placeholder
+from edward.criticisms import effective_sample_size, \
+    potential_scale_reduction
+from edward.models import StanModel, RandomVariable, Empirical, Normal, \
+    PointMass
+from edward.util import BatchIterator, TFRecordFeature, copy, get_dims, \
+    get_session, hessian, kl_multivariate_normal, log_mean_exp, \
+    log_sum_exp, placeholder
+from scipy import sparse
 
 try:
   import prettytensor as pt
@@ -17,6 +22,103 @@ except ImportError:
   pass
 
 
+def _is_npy_path(value):
+  return isinstance(value, six.string_types) and value.endswith('.npy')
+
+
+def _data_dtype(dtype):
+  """Return the dtype to store observed data of dtype ``dtype`` in.
+
+  Booleans and small integers, such as binarized images, counts, and
+  labels, keep their compact dtype; they are cast to the dtype of the
+  random variable when its density is evaluated. Other data is stored
+  as ``tf.float32``.
+  """
+  dtype = tf.as_dtype(dtype).base_dtype
+  if dtype in [tf.bool, tf.int8, tf.uint8, tf.int16, tf.int32]:
+    return dtype
+  else:
+    return tf.float32
+
+
+def _trainable_variables(rv):
+  """Return the trainable variables which the parameters of the random
+  variable ``rv`` depend on."""
+  trainable = {var.name: var for var in tf.trainable_variables()}
+  variables = []
+  visited = set()
+  stack = [value for value in six.itervalues(rv._dist_args)
+           if isinstance(value, (RandomVariable, tf.Variable, tf.Tensor))]
+  while stack:
+    value = stack.pop()
+    if isinstance(value, RandomVariable):
+      stack.extend([v for v in six.itervalues(value._dist_args)
+                    if isinstance(v, (RandomVariable, tf.Variable,
+                                      tf.Tensor))])
+      continue
+    elif isinstance(value, tf.Variable):
+      value = value.value()
+
+    if value.name in visited:
+      continue
+
+    visited.add(value.name)
+    if value.name in trainable:
+      variables.append(trainable[value.name])
+    else:
+      stack.extend(value.op.inputs)
+
+  return variables
+
+
+def _depends_on(rv, tensors):
+  """Return whether the parameters of the random variable ``rv`` depend
+  on any tensor in ``tensors``."""
+  names = set([tensor.name for tensor in tensors])
+  visited = set()
+  stack = [value for value in six.itervalues(rv._dist_args)
+           if isinstance(value, (RandomVariable, tf.Tensor))]
+  while stack:
+    value = stack.pop()
+    if isinstance(value, RandomVariable):
+      stack.extend([v for v in six.itervalues(value._dist_args)
+                    if isinstance(v, (RandomVariable, tf.Tensor))])
+      continue
+    elif value.name in visited:
+      continue
+
+    visited.add(value.name)
+    if value.name in names:
+      return True
+
+    stack.extend(value.op.inputs)
+
+  return False
+
+
+def _to_variable(value, dtype=tf.float32):
+  """Store a NumPy array in the graph as a non-trainable variable,
+  without adding its value as a constant to the graph definition."""
+  ph = placeholder(dtype, value.shape)
+  var = tf.Variable(ph, trainable=False, collections=[])
+  get_session().run(var.initializer, {ph: value})
+  return var
+
+
+def _to_graph(value):
+  """Store a NumPy array as a variable, or a SciPy sparse matrix as a
+  ``tf.SparseTensor`` whose indices and values are variables."""
+  if sparse.issparse(value):
+    value = value.tocoo()
+    indices = np.vstack([value.row, value.col]).T.astype(np.int64)
+    return tf.SparseTensor(_to_variable(indices, tf.int64),
+                           _to_variable(value.data,
+                                        _data_dtype(value.dtype)),
+                           value.shape)
+  else:
+    return _to_variable(value, _data_dtype(value.dtype))
+
+
 class Inference(object):
   """Base class for Edward inference methods.
 
@@ -28,6 +130,14 @@ class Inference(object):
     will infer the former conditional on data.
   data : dict
     Data dictionary whose values may vary at each session run.
+  batch_indices : dict
+    Dictionary binding data keys to the indices of the rows in the
+    current minibatch, if batched in the graph. Use them to gather
+    the local parameters matching the minibatch.
+  scale : dict
+    Dictionary binding data keys to the ratio of the data size to the
+    minibatch size of their group. The log-likelihood of each observed
+    variable is multiplied by its scale.
   model_wrapper : ed.Model or None
     An optional wrapper for the probability model. If specified, the
     random variables in `latent_vars`' dictionary keys are strings
@@ -67,7 +177,31 @@ class Inference(object):
     2. externally if user passes in data as a dictionary of
        TensorFlow placeholders (and manually feeds them);
     3. externally if user passes in data as TensorFlow tensors
-       which are the outputs of data readers.
+       which are the outputs of data readers;
+    4. internally if user passes in data as features of an
+       ``ed.TFRecordData`` source, which reads and parses minibatches
+       of records from files in parallel.
+
+    Data too large to fit in memory can be passed in as a
+    ``np.memmap`` or as the path of a ``.npy`` file, which is
+    memory-mapped. Such data is not stored in the computational
+    graph; shuffled minibatches of rows are read from disk by a
+    ``BatchIterator``, prefetched in a background thread, and fed
+    at each ``update``. It requires ``n_minibatch`` to be specified
+    during initialization.
+
+    Observed data of boolean or small integer dtype, such as
+    binarized images, counts, and labels, is stored in its compact
+    dtype and cast to the dtype of the random variable only when its
+    density is evaluated. Other data is stored as ``tf.float32``.
+
+    Placeholders bound in ``data`` are replaced with their
+    realizations in both the probability model and the variational
+    model. This enables amortized inference: build the variational
+    model with an inference network whose input is a placeholder,
+    and bind the placeholder to the same data as the observed
+    variable. Local latent variables can be sized dynamically to the
+    minibatch using ``tf.shape`` of the placeholder.
 
     Examples
     --------
@@ -100,26 +234,516 @@ class Inference(object):
       # dictionary ``self.data`` at compile time to ``data``.
       self.data = data
     else:
+      # If any data lives on disk or is sparse, keep all arrays on the
+      # host until initialization. They may be streamed in minibatches
+      # during inference, so that rows of different arrays stay
+      # aligned.
+      stream = any([isinstance(value, np.memmap) or _is_npy_path(value) or
+                    sparse.issparse(value)
+                    for value in six.itervalues(data)])
       self.data = {}
       for key, value in six.iteritems(data):
-        if isinstance(value, tf.Tensor):
+        same = [k for k, v in six.iteritems(data)
+                if v is value and k in self.data]
+        if same:
+          # If the same array or tensor is bound more than once, e.g.,
+          # to an observed variable and to the input of an inference
+          # network, store it only once.
+          self.data[key] = self.data[same[0]]
+        elif _is_npy_path(value):
+          # Memory-map the file; rows are read only when batched.
+          self.data[key] = np.load(value, mmap_mode='r')
+        elif stream and (isinstance(value, np.ndarray) or
+                         sparse.issparse(value)):
+          self.data[key] = value
+        elif isinstance(value, TFRecordFeature):
+          # Build the input pipeline during initialization, once the
+          # minibatch size is known.
+          self.data[key] = value
+        elif isinstance(value, tf.Tensor):
           # If ``data`` has TensorFlow placeholders, the user
           # must manually feed them at each step of
           # inference.
           # If ``data`` has tensors that are the output of
           # data readers, then batch training operates
           # according to the reader.
-          self.data[key] = tf.cast(value, tf.float32)
+          self.data[key] = tf.cast(value, _data_dtype(value.dtype))
         elif isinstance(value, np.ndarray):
           # If ``data`` has NumPy arrays, store the data
           # in the computational graph.
-          ph = placeholder(tf.float32, value.shape)
-          var = tf.Variable(ph, trainable=False, collections=[])
-          self.data[key] = var
-          sess.run(var.initializer, {ph: value})
+          self.data[key] = _to_variable(value, _data_dtype(value.dtype))
         else:
           raise NotImplementedError()
 
+  def run(self, *args, **kwargs):
+    """A simple wrapper to run inference.
+
+    1. Initialize via ``initialize``.
+    2. Run ``update`` for ``self.n_iter`` iterations.
+    3. While running, ``print_progress``.
+    4. Finalize via ``finalize``.
+
+    Parameters
+    ----------
+    *args
+      Passed into ``initialize``.
+    **kwargs
+      Passed into ``initialize``.
+    """
+    self.initialize(*args, **kwargs)
+    for t in range(self.n_iter + 1):
+      loss = self.update()
+      self.print_progress(t, loss)
+
+    self.finalize()
+
+  def initialize(self, n_iter=1000, n_minibatch=None, n_print=100,
+                 sparse_minibatch='row', local_vars=None):
+    """Initialize inference algorithm.
+
+    Parameters
+    ----------
+    n_iter : int, optional
+      Number of iterations for algorithm.
+    n_minibatch : int or dict, optional
+      Number of samples for data subsampling. Default is to use
+      all the data. Subsampling is available only if all data
+      passed in are NumPy arrays and the model is not a Stan
+      model. Minibatches are drawn by a ``BatchIterator``, without
+      queue runners: data on disk and sparse matrices are fed in
+      batches of rows, and data stored in the graph is gathered at
+      fed batches of row indices. Outside of ``update``, the indices
+      are drawn at random in the graph.
+      Data is grouped by the size of its first dimension, and rows
+      are subsampled jointly within each group. A dictionary binds
+      data keys to the batch size of their group; groups without a
+      batch size use all their data. The row indices of each batch
+      are stored in ``batch_indices``.
+    n_print : int, optional
+      Number of iterations for each print progress. To suppress print
+      progress, then specify None.
+    sparse_minibatch : str, optional
+      How to subsample SciPy sparse data: ``'row'`` to subsample rows,
+      aligned with the rows of all other arrays; or ``'nonzero'`` to
+      subsample nonzero entries, if the data is a single sparse
+      matrix. Each minibatch is a ``tf.SparseTensor`` with the shape
+      of the full matrix for ``'nonzero'``, and with ``n_minibatch``
+      rows for ``'row'``. Entries of a ``'nonzero'`` minibatch are
+      not in canonical order.
+    local_vars : dict, optional
+      Dictionary binding local latent variables (keys in
+      ``latent_vars``) to the data keys whose rows they are local to.
+      Their variational parameters are stored for all rows, and only
+      the rows in the current minibatch are gathered, sampled, and
+      updated. The variational parameters of a local latent variable
+      are the trainable variables its random variable depends on
+      whose first dimension is the number of data rows. The model
+      should define the local latent variable on the minibatch, e.g.,
+      with ``n_minibatch`` rows. Local latent variables, including
+      those whose variational model takes a data placeholder as
+      input, have their prior and variational densities scaled as
+      the log-likelihood of their data.
+
+    Raises
+    ------
+    ValueError
+      If ``n_minibatch`` is not specified for data stored on disk, or
+      if it is a dictionary with conflicting batch sizes in a group,
+      or if data bound to local latent variables is not batched in
+      the graph.
+    """
+    self.n_iter = n_iter
+    self.n_minibatch = n_minibatch
+    self.n_print = n_print
+    self.loss = tf.constant(0.0)
+    # Ratio of the full data size to the minibatch size, for each data
+    # key. Algorithms multiply the log-likelihood of each observed
+    # variable by it in order to form an unbiased estimate of the full
+    # data log-likelihood. Model wrappers must implement ``log_lik``
+    # for it to apply.
+    self.scale = {key: 1.0 for key in six.iterkeys(self.data)}
+    # Iterator over minibatches of data kept on the host, if any.
+    self.batches = None
+    # Placeholders of the row indices of minibatches of data stored in
+    # the graph, with the iterators which feed them.
+    self._index_batches = []
+    # Indices of the rows of each data array in the current minibatch.
+    self.batch_indices = {}
+    # Number of rows of each data array batched in the graph.
+    n_rows = {}
+
+    record_keys = [key for key, value in six.iteritems(self.data)
+                   if isinstance(value, TFRecordFeature)]
+    if isinstance(n_minibatch, dict) and (record_keys or any(
+        [isinstance(value, np.ndarray) or sparse.issparse(value)
+         for value in six.itervalues(self.data)])):
+      raise ValueError("Batch sizes for groups of data require the data "
+                       "to be stored in the graph.")
+
+    if record_keys and n_minibatch is None:
+      raise ValueError("Data read from TFRecord files requires "
+                       "n_minibatch.")
+
+    for key in record_keys:
+      source = self.data[key].source
+      parsed = source.build(n_minibatch)
+      value = parsed[self.data[key].name]
+      self.data[key] = tf.cast(value, _data_dtype(value.dtype))
+      if source.n_data is not None:
+        self.scale[key] = float(source.n_data) / n_minibatch
+
+    if isinstance(self.model_wrapper, StanModel):
+      host_keys = []
+    else:
+      host_keys = [key for key, value in six.iteritems(self.data)
+                   if isinstance(value, np.ndarray) or
+                   sparse.issparse(value)]
+
+    # Store or batch each distinct array once, even if it is bound to
+    # several keys.
+    arrays = []
+    for key in host_keys:
+      if not any([self.data[key] is array for array in arrays]):
+        arrays.append(self.data[key])
+
+    if host_keys and n_minibatch is None:
+      if any([isinstance(array, np.memmap) for array in arrays]):
+        raise ValueError("Data stored on disk requires n_minibatch.")
+
+      tensors = [_to_graph(array) for array in arrays]
+    elif host_keys and sparse_minibatch == 'nonzero':
+      if len(arrays) != 1 or not sparse.issparse(arrays[0]):
+        raise ValueError("Subsampling nonzero entries requires the data "
+                         "to be a single sparse matrix.")
+
+      full = _to_graph(arrays[0])
+      for key in host_keys:
+        self.scale[key] = float(arrays[0].nnz) / n_minibatch
+
+      idx = self._batch_rows(arrays[0].nnz, n_minibatch)
+      indices = tf.gather(full.indices, idx)
+      values = tf.gather(full.values, idx)
+      # Mark the minibatch, so that log densities do not count the
+      # entries which are not stored as zeros.
+      tf.add_to_collection('NONZERO_MINIBATCHES', values)
+      tensors = [tf.SparseTensor(indices, values, arrays[0].shape)]
+    elif host_keys:
+      if sparse_minibatch != 'row':
+        raise ValueError("sparse_minibatch must be 'row' or 'nonzero'.")
+
+      # Feed shuffled batches of rows into placeholders at each update.
+      self.batches = BatchIterator(arrays, n_minibatch)
+      for key in host_keys:
+        self.scale[key] = float(self.batches.n_data) / n_minibatch
+
+      self._batch_placeholders = []
+      tensors = []
+      for array in arrays:
+        shape = [n_minibatch] + list(array.shape[1:])
+        if sparse.issparse(array):
+          indices = placeholder(tf.int64, [None, 2])
+          values = placeholder(_data_dtype(array.dtype), [None])
+          self._batch_placeholders.append((indices, values))
+          tensors.append(tf.SparseTensor(indices, values, shape))
+        else:
+          self._batch_placeholders.append(
+              placeholder(_data_dtype(array.dtype), shape))
+          tensors.append(self._batch_placeholders[-1])
+
+    for key in host_keys:
+      idx = [i for i, array in enumerate(arrays)
+             if self.data[key] is array][0]
+      self.data[key] = tensors[idx]
+
+    if not host_keys and not record_keys and n_minibatch is not None and \
+       not isinstance(self.model_wrapper, StanModel):
+      # Re-assign data to batch tensors. Data is grouped by its index
+      # space, i.e., the size of its first dimension, and each group is
+      # subsampled with its own batch size.
+      keys = list(six.iterkeys(self.data))
+      values = list(six.itervalues(self.data))
+      groups = {}
+      for i, value in enumerate(values):
+        groups.setdefault(get_dims(value)[0], []).append(i)
+
+      n_max = max([n_data for n_data in six.iterkeys(groups)
+                   if n_data is not None] or [None])
+      self.data = {}
+      for n_data, group in six.iteritems(groups):
+        if isinstance(n_minibatch, dict):
+          sizes = set([n_minibatch[keys[i]] for i in group
+                       if keys[i] in n_minibatch])
+          if len(sizes) > 1:
+            raise ValueError("Data with the same first dimension must "
+                             "have the same batch size.")
+
+          size = sizes.pop() if sizes else None
+        else:
+          size = n_minibatch
+
+        if size is None:
+          # Use the full data of a group without a batch size.
+          for i in group:
+            self.data[keys[i]] = values[i]
+            self.batch_indices[keys[i]] = tf.range(tf.shape(values[i])[0])
+            n_rows[keys[i]] = n_data
+
+          continue
+
+        if n_data is not None:
+          for i in group:
+            self.scale[keys[i]] = float(n_data) / size
+
+        # Batch each distinct tensor once, even if it is bound to
+        # several keys.
+        unique_values = []
+        for i in group:
+          if not any(values[i] is v for v in unique_values):
+            unique_values.append(values[i])
+
+        if n_data is not None:
+          # Gather the rows at the indices fed at each update, so that
+          # models can also gather the local parameters matching the
+          # batch.
+          idx = self._batch_rows(n_data, size)
+          batches = [idx] + [tf.gather(value, idx)
+                             for value in unique_values]
+        else:
+          # The number of rows is only known in the graph, so slice
+          # the rows in the graph, by as many threads as CPUs.
+          index = tf.range(tf.shape(unique_values[0])[0])
+          slices = tf.train.slice_input_producer([index] + unique_values)
+          batches = tf.train.batch(slices, size,
+                                   num_threads=multiprocessing.cpu_count())
+
+        for i in group:
+          idx = [j for j, v in enumerate(unique_values)
+                 if v is values[i]][0]
+          self.data[keys[i]] = batches[idx + 1]
+          self.batch_indices[keys[i]] = batches[0]
+          n_rows[keys[i]] = n_data
+
+    if self.model_wrapper is None and \
+       any([isinstance(value, tf.SparseTensor)
+            for value in six.itervalues(self.data)]):
+      raise TypeError("Sparse data requires a model wrapper: random "
+                      "variables cannot evaluate their density at a "
+                      "tf.SparseTensor.")
+
+    # Latent variables local to subsampled data are only represented
+    # for the current minibatch: those bound in ``local_vars``, and
+    # those whose variational model takes a data placeholder as input.
+    # Their prior and variational densities are scaled as the
+    # log-likelihood of their data, so that the loss estimates the
+    # objective on the full data.
+    self._latent_scale = {}
+    for z, qz in six.iteritems(self.latent_vars):
+      if local_vars and z in local_vars:
+        scales = [self.scale[local_vars[z]]]
+      else:
+        scales = [self.scale[key] for key in six.iterkeys(self.data)
+                  if isinstance(key, tf.Tensor) and _depends_on(qz, [key])]
+
+      if len(set(scales)) > 1:
+        raise ValueError("Local latent variables must be local to data "
+                         "subsampled with the same batch size.")
+
+      self._latent_scale[z] = scales[0] if scales else 1.0
+
+    # Replace placeholders bound in ``data`` with their realizations in
+    # the variational model, so that inference networks take the
+    # current minibatch as input.
+    data_swap = {key: tf.cast(value, key.dtype)
+                 for key, value in six.iteritems(self.data)
+                 if isinstance(key, tf.Tensor)}
+    if data_swap:
+      scope = 'inference_' + str(id(self))
+      self.latent_vars = {z: copy(qz, data_swap, scope=scope)
+                          for z, qz in six.iteritems(self.latent_vars)}
+
+    # Gather the rows of local variational parameters in the current
+    # minibatch. Their gradients are ``tf.IndexedSlices``, so that
+    # only the gathered rows are updated.
+    if local_vars:
+      for z, key in six.iteritems(local_vars):
+        if n_rows.get(key) is None:
+          raise ValueError("Local latent variables require their data to "
+                           "be batched in the graph, with known size.")
+
+        idx = self.batch_indices[key]
+        qz = self.latent_vars[z]
+        gather_swap = {}
+        for var in _trainable_variables(qz):
+          if get_dims(var)[:1] == [n_rows[key]]:
+            # Parameters refer to the variable itself, to its value, or
+            # to its reference, depending on how they were built.
+            rows = tf.gather(var, idx)
+            for ref in [var, var.value(), var.ref()]:
+              gather_swap[ref] = rows
+
+        self.latent_vars[z] = copy(qz, gather_swap,
+                                   scope='local_' + str(id(self)))
+
+  def _batch_rows(self, n_data, n_minibatch):
+    """Return the row indices of a minibatch. They are fed at each
+    ``update`` from a ``BatchIterator`` over ``n_data`` rows; if not
+    fed, they are drawn at random in the graph."""
+    rows = tf.slice(tf.random_shuffle(tf.range(n_data)), [0], [n_minibatch])
+    idx = tf.placeholder_with_default(rows, [n_minibatch])
+    # Copies of the model reuse placeholders, so that they read the
+    # same fed indices.
+    tf.add_to_collection('PLACEHOLDERS', idx)
+    batches = BatchIterator([np.arange(n_data, dtype=np.int32)],
+                            n_minibatch)
+    self._index_batches.append((idx, batches))
+    return idx
+
+  def _local_scale(self):
+    """Return the scale shared by all latent variables, if all of them
+    are local to subsampled data, or 1 if none of them is.
+
+    Raises
+    ------
+    ValueError
+      If only some latent variables are local, or if they are local
+      to data subsampled with different batch sizes.
+    """
+    scales = set(six.itervalues(self._latent_scale))
+    if len(scales) > 1:
+      raise ValueError("This algorithm requires either all or none of "
+                       "the latent variables to be local to the data.")
+
+    return scales.pop() if scales else 1.0
+
+  def _wrapper_scale(self):
+    """Return the data scale of the model wrapper's log-likelihood.
+
+    The wrapper's log-likelihood is evaluated on all data at once, so
+    all data subsampled with a scale other than 1 must share it.
+
+    Raises
+    ------
+    ValueError
+      If data is subsampled with different scales.
+    """
+    scales = set([scale for scale in six.itervalues(self.scale)
+                  if scale != 1.0])
+    if len(scales) > 1:
+      raise ValueError("Model wrappers require all subsampled data to "
+                       "have the same ratio of data size to batch size.")
+
+    return scales.pop() if scales else 1.0
+
+  def _wrapper_log_prob(self, z_samples):
+    """Return the model wrapper's log joint density at each set of
+    latent variable samples in ``z_samples``.
+
+    If the wrapper implements ``batch_log_prob``, all samples are
+    stacked along a new first dimension and passed in one call, so
+    that a Python wrapper is crossed into once rather than once per
+    sample.
+
+    If the wrapper implements ``log_lik``, its log-likelihood is
+    scaled by the data scale; otherwise the log joint density is
+    returned as is. If all latent variables are local to the data,
+    the whole log joint density is scaled.
+
+    Raises
+    ------
+    ValueError
+      If only some latent variables are local to the data.
+    """
+    x = self.data
+    if hasattr(self.model_wrapper, 'batch_log_prob'):
+      zs = {key: tf.pack([z_sample[key] for z_sample in z_samples])
+            for key in six.iterkeys(z_samples[0])}
+      log_prob = tf.unpack(self.model_wrapper.batch_log_prob(x, zs),
+                           num=len(z_samples))
+    else:
+      log_prob = [self.model_wrapper.log_prob(x, z_sample)
+                  for z_sample in z_samples]
+
+    scale = self._wrapper_scale()
+    if self._local_scale() != 1.0:
+      if self._local_scale() != scale:
+        raise ValueError("Model wrappers with local latent variables "
+                         "require them to be local to all subsampled "
+                         "data.")
+
+      log_prob = [scale * value for value in log_prob]
+    elif scale != 1.0 and hasattr(self.model_wrapper, 'log_lik'):
+      log_prob = [log_prob[s] + (scale - 1.0) *
+                  self.model_wrapper.log_lik(x, z_sample)
+                  for s, z_sample in enumerate(z_samples)]
+
+    return log_prob
+
+  def update(self, feed_dict=None):
+    """Run one iteration of inference.
+
+    Parameters
+    ----------
+    feed_dict : dict, optional
+      Feed dictionary for a TensorFlow session run. It is used to feed
+      placeholders that are not fed internally.
+
+    Returns
+    -------
+    loss : double
+      Loss function values after one iteration.
+    """
+    if feed_dict is None:
+      feed_dict = {}
+
+    if self.batches is not None or self._index_batches:
+      feed_dict = feed_dict.copy()
+
+    if self.batches is not None:
+      for ph, batch in zip(self._batch_placeholders, next(self.batches)):
+        if sparse.issparse(batch):
+          indices, values = ph
+          feed_dict[indices] = np.vstack([batch.row, batch.col]).T
+          feed_dict[values] = batch.data
+        else:
+          feed_dict[ph] = batch
+
+    for idx, batches in self._index_batches:
+      feed_dict[idx] = next(batches)[0]
+
+    sess = get_session()
+    _, loss = sess.run([self.train, self.loss], feed_dict)
+    return loss
+
+  def print_progress(self, t, loss):
+    """Print progress to output.
+
+    Parameters
+    ----------
+    t : int
+      Iteration counter.
+    loss : double
+      Loss function value at iteration ``t``.
+    """
+    if self.n_print is not None:
+      if t % self.n_print == 0:
+        print("iter {:d} loss {:.2f}".format(t, loss))
+        for rv in six.itervalues(self.latent_vars):
+          print(rv)
+
+  def finalize(self):
+    """Function to call after convergence.
+
+    Any class based on ``Inference`` **may** overwrite this method.
+    """
+    # Ask threads to stop.
+    self.coord.request_stop()
+    self.coord.join(self.threads)
+    if self.batches is not None:
+      self.batches.close()
+
+    for _, batches in self._index_batches:
+      batches.close()
+
 
 class MonteCarlo(Inference):
   """Base class for Monte Carlo inference methods.
@@ -150,6 +774,265 @@ class MonteCarlo(Inference):
     """
     super(MonteCarlo, self).__init__(latent_vars, data, model_wrapper)
 
+  def initialize(self, n_iter=1000, n_minibatch=None, n_print=100,
+                 burn=0, thin=1, dtype=None, sparse_minibatch='row'):
+    """Initialize Monte Carlo algorithm.
+
+    Allocate a sample buffer in the graph for each latent variable,
+    build the update, and initialize all variables.
+
+    Parameters
+    ----------
+    n_iter : int, optional
+      Number of iterations for algorithm.
+    n_minibatch : int or dict, optional
+      Number of samples for data subsampling. Default is to use
+      all the data. For subsampling details, see
+      ``Inference.initialize``.
+    n_print : int, optional
+      Number of iterations for each print progress. To suppress print
+      progress, then specify None.
+    burn : int, optional
+      Number of iterations to discard at the start of the chain.
+    thin : int, optional
+      Store one of every ``thin`` iterations after burn-in.
+    dtype : tf.DType, optional
+      Type to store samples in. Default is the type of each latent
+      variable. Use ``tf.float16`` to halve the memory of long traces.
+    sparse_minibatch : str, optional
+      How to subsample sparse data. For details, see
+      ``Inference.initialize``.
+
+    Notes
+    -----
+    Samples are kept in ``self.samples``, a dictionary binding each
+    latent variable to an ``Empirical`` random variable. Each is
+    backed by a non-trainable ``tf.Variable`` of shape ``[n_samples,
+    ...]``, where ``n_samples = (n_iter - burn) // thin + 1``. Samples
+    are written with ``tf.scatter_update`` as part of each update, so
+    no sample leaves the graph during sampling.
+    """
+    super(MonteCarlo, self).initialize(n_iter, n_minibatch, n_print,
+                                       sparse_minibatch)
+    self.burn = burn
+    self.thin = thin
+    self.n_samples = max((n_iter - burn) // thin + 1, 1)
+
+    self.t = tf.Variable(0, trainable=False)
+    # Read the iteration once. The sample store and the update use this
+    # read, and the increment runs after them, so that they all see the
+    # same iteration.
+    self._t_value = tf.identity(self.t)
+    self.samples = {}
+    for z, qz in six.iteritems(self.latent_vars):
+      params = tf.Variable(
+          tf.zeros([self.n_samples] + get_dims(qz.value()),
+                   dtype=dtype or qz.dtype),
+          trainable=False)
+      self.samples[z] = Empirical(params=params)
+
+    # Write the current state into the buffer before moving the
+    # chain. Every iteration within a thinning window writes to the
+    # same row, so the row ends up holding the window's last state;
+    # iterations during burn-in write to the first row.
+    idx = tf.clip_by_value(tf.div(self._t_value - burn, thin), 0,
+                           self.n_samples - 1)
+    store = []
+    for z, qz in six.iteritems(self.latent_vars):
+      params = self.samples[z].params
+      value = tf.cast(tf.expand_dims(qz.value(), 0), params.dtype.base_dtype)
+      store.append(tf.scatter_update(params, tf.expand_dims(idx, 0), value))
+
+    with tf.control_dependencies(store):
+      update = self.build_update()
+
+    with tf.control_dependencies([update]):
+      self.train = tf.group(self.t.assign_add(1))
+
+    init = tf.initialize_all_variables()
+    init.run()
+
+    # Start input enqueue threads.
+    self.coord = tf.train.Coordinator()
+    self.threads = tf.train.start_queue_runners(coord=self.coord)
+
+  def build_update(self):
+    """Build update, which moves the chain one step.
+
+    Empty method.
+
+    Any class based on ``MonteCarlo`` **must** implement this method.
+    It may also set ``self.loss`` to a tensor which is fetched at each
+    iteration.
+
+    Raises
+    ------
+    NotImplementedError
+    """
+    raise NotImplementedError()
+
+
+def run_chains(build_inference, n_chains=4, n_check=100, target_rhat=1.01,
+               min_ess=None, seed=None, *args, **kwargs):
+  """Run independent chains of a Monte Carlo algorithm in parallel
+  processes, stopping once the chains have converged.
+
+  Each chain runs in its own process, with its own graph, session, and
+  seed. Every ``n_check`` iterations, the chains send their newly
+  stored samples to the calling process, which merges them and
+  computes the split :math:`\hat{R}` and effective sample size of
+  every latent variable. All chains stop once every :math:`\hat{R}` is
+  below ``target_rhat`` and every effective sample size is at least
+  ``min_ess``, or after ``n_iter`` iterations.
+
+  Parameters
+  ----------
+  build_inference : function
+    A function with no arguments which builds the model and returns
+    a ``MonteCarlo`` instance. It is called in each child process
+    after the graph is created, and it must be picklable, e.g., a
+    function defined at the top level of a module.
+  n_chains : int, optional
+    Number of chains.
+  n_check : int, optional
+    Number of iterations between convergence checks.
+  target_rhat : float, optional
+    Threshold on the split :math:`\hat{R}` for convergence.
+  min_ess : float, optional
+    Threshold on the effective sample size for convergence. Default
+    is to not check it.
+  seed : int, optional
+    Seed for generating the seed of each chain.
+  *args
+    Passed into the inference's ``initialize``.
+  **kwargs
+    Passed into the inference's ``initialize``.
+
+  Returns
+  -------
+  list of dict
+    The merged samples, the split :math:`\hat{R}`, and the effective
+    sample size. Each dictionary is keyed by the latent variable's
+    key in ``latent_vars`` for model wrappers and by its name
+    otherwise. The samples have shape ``[n_chains, n_samples, ...]``.
+
+  Examples
+  --------
+  >>> def build_inference():
+  ...   model = BetaBernoulli()
+  ...   qp = PointMass(params=tf.Variable(0.5))
+  ...   return SGLD({'p': qp}, data, model)
+  >>>
+  >>> samples, rhat, ess = run_chains(build_inference, n_chains=4,
+  ...                                 n_iter=10000, thin=10)
+  """
+  # Child processes start from a fresh interpreter if possible, as
+  # forking a process with a running TensorFlow session is unsafe.
+  if hasattr(multiprocessing, 'get_context'):
+    ctx = multiprocessing.get_context('spawn')
+  else:
+    ctx = multiprocessing
+
+  seeds = np.random.RandomState(seed).randint(0, 2**31 - 1, n_chains)
+  conns = []
+  processes = []
+  for k in range(n_chains):
+    conn, child_conn = ctx.Pipe()
+    process = ctx.Process(target=_run_chain,
+                          args=(build_inference, int(seeds[k]), n_check,
+                                child_conn, args, kwargs))
+    process.start()
+    # Close the parent's handle so that ``recv`` raises an error if
+    # the child exits early.
+    child_conn.close()
+    conns.append(conn)
+    processes.append(process)
+
+  chunks = [{} for k in range(n_chains)]
+  rhat = {}
+  ess = {}
+  try:
+    while True:
+      is_last = False
+      for k, conn in enumerate(conns):
+        names, values, is_last = conn.recv()
+        for name, value in zip(names, values):
+          chunks[k].setdefault(name, []).append(value)
+
+      samples = {name: np.stack([np.concatenate(chunk[name], 0)
+                                 for chunk in chunks])
+                 for name in six.iterkeys(chunks[0])}
+      converged = False
+      if all([value.shape[1] >= 4 for value in six.itervalues(samples)]):
+        rhat = {name: potential_scale_reduction(value)
+                for name, value in six.iteritems(samples)}
+        ess = {name: effective_sample_size(value)
+               for name, value in six.iteritems(samples)}
+        converged = all([np.all(value < target_rhat)
+                         for value in six.itervalues(rhat)])
+        if min_ess is not None:
+          converged = converged and all([np.all(value >= min_ess)
+                                         for value in six.itervalues(ess)])
+
+      if is_last:
+        break
+
+      for conn in conns:
+        conn.send(converged)
+
+      if converged:
+        break
+  finally:
+    for conn in conns:
+      conn.close()
+
+    for process in processes:
+      process.join()
+
+  return [samples, rhat, ess]
+
+
+def _run_chain(build_inference, seed, n_check, conn, args, kwargs):
+  """Run one chain for ``run_chains``, in a child process."""
+  with tf.Graph().as_default():
+    np.random.seed(seed)
+    tf.set_random_seed(seed)
+    sess = tf.Session()
+    with sess.as_default():
+      inference = build_inference()
+      inference.initialize(*args, **kwargs)
+      keys = list(six.iterkeys(inference.samples))
+      names = [key if isinstance(key, str) else key.name for key in keys]
+
+      # Fetch only the rows stored since the last check.
+      start = tf.placeholder(tf.int32, [])
+      stop = tf.placeholder(tf.int32, [])
+      chunk = [tf.gather(inference.samples[key].params, tf.range(start, stop))
+               for key in keys]
+      n_stored = 0
+      for t in range(inference.n_iter + 1):
+        inference.update()
+        is_last = t == inference.n_iter
+        if (t + 1) % n_check == 0 or is_last:
+          if is_last and t >= inference.burn:
+            n = inference.n_samples
+          else:
+            # A row is complete once its thinning window has passed.
+            n = (t + 1 - inference.burn) // inference.thin
+            n = min(max(n, 0), inference.n_samples)
+
+          values = sess.run(chunk, {start: n_stored, stop: n})
+          n_stored = n
+          conn.send((names, values, is_last))
+          if is_last or conn.recv():
+            break
+
+      inference.finalize()
+
+    sess.close()
+
+  conn.close()
+
 
 class VariationalInference(Inference):
   """Base class for variational inference methods.
@@ -180,31 +1063,10 @@ class VariationalInference(Inference):
     """
     super(VariationalInference, self).__init__(latent_vars, data, model_wrapper)
 
-  def run(self, *args, **kwargs):
-    """A simple wrapper to run variational inference.
-
-    1. Initialize via ``initialize``.
-    2. Run ``update`` for ``self.n_iter`` iterations.
-    3. While running, ``print_progress``.
-    4. Finalize via ``finalize``.
-
-    Parameters
-    ----------
-    *args
-      Passed into ``initialize``.
-    **kwargs
-      Passed into ``initialize``.
-    """
-    self.initialize(*args, **kwargs)
-    for t in range(self.n_iter + 1):
-      loss = self.update()
-      self.print_progress(t, loss)
-
-    self.finalize()
-
   def initialize(self, n_iter=1000, n_minibatch=None, n_print=100,
                  optimizer=None, scope=None, logdir=None,
-                 use_prettytensor=False):
+                 use_prettytensor=False, sparse_minibatch='row',
+                 local_vars=None):
     """Initialize variational inference algorithm.
 
     Set up ``tf.train.AdamOptimizer`` with a decaying scale factor.
@@ -215,12 +1077,10 @@ class VariationalInference(Inference):
     ----------
     n_iter : int, optional
       Number of iterations for optimization.
-    n_minibatch : int, optional
+    n_minibatch : int or dict, optional
       Number of samples for data subsampling. Default is to use
-      all the data. Subsampling is available only if all data
-      passed in are NumPy arrays and the model is not a Stan
-      model. For subsampling details, see
-      ``tf.train.slice_input_producer`` and ``tf.train.batch``.
+      all the data. For subsampling details, see
+      ``Inference.initialize``.
     n_print : int, optional
       Number of iterations for each print progress. To suppress print
       progress, then specify None.
@@ -228,7 +1088,8 @@ class VariationalInference(Inference):
       A TensorFlow optimizer, to use for optimizing the variational
       objective. Alternatively, one can pass in the name of a
       TensorFlow optimizer, and default parameters for the optimizer
-      will be used.
+      will be used. Default is ADAM, or Adagrad if ``local_vars`` is
+      specified.
     scope : str, optional
       Scope of TensorFlow variable objects to optimize over.
     logdir : str, optional
@@ -238,28 +1099,19 @@ class VariationalInference(Inference):
       ``True`` if aim to use TensorFlow optimizer or ``False`` if aim
       to use PrettyTensor optimizer (when using PrettyTensor).
       Defaults to TensorFlow.
+    sparse_minibatch : str, optional
+      How to subsample sparse data. For details, see
+      ``Inference.initialize``.
+    local_vars : dict, optional
+      Local latent variables to subsample along with their data. For
+      details, see ``Inference.initialize``. Each step costs time in
+      the minibatch size only if the optimizer applies sparse
+      gradients sparsely, e.g., ``'gradientdescent'`` or
+      ``'adagrad'``; optimizers such as ADAM, RMSProp, and momentum
+      update their slots for all rows.
     """
-    self.n_iter = n_iter
-    self.n_minibatch = n_minibatch
-    self.n_print = n_print
-    self.loss = tf.constant(0.0)
-
-    if n_minibatch is not None and \
-       not isinstance(self.model_wrapper, StanModel):
-      # Re-assign data to batch tensors, with size given by
-      # ``n_minibatch``.
-      values = list(six.itervalues(self.data))
-      slices = tf.train.slice_input_producer(values)
-      # By default use as many threads as CPUs.
-      batches = tf.train.batch(slices, n_minibatch,
-                               num_threads=multiprocessing.cpu_count())
-      if not isinstance(batches, list):
-        # ``tf.train.batch`` returns tf.Tensor if ``slices`` is a
-        # list of size 1.
-        batches = [batches]
-
-      self.data = {key: value for key, value in
-                   zip(six.iterkeys(self.data), batches)}
+    super(VariationalInference, self).initialize(n_iter, n_minibatch, n_print,
+                                                 sparse_minibatch, local_vars)
 
     if optimizer is None:
       # Use ADAM with a decaying scale factor.
@@ -268,7 +1120,13 @@ class VariationalInference(Inference):
       learning_rate = tf.train.exponential_decay(starter_learning_rate,
                                                  global_step,
                                                  100, 0.9, staircase=True)
-      optimizer = tf.train.AdamOptimizer(learning_rate)
+      if local_vars:
+        # ADAM updates its moments for all rows of the local
+        # variational parameters at each step. Use Adagrad, which
+        # updates only the rows in the minibatch.
+        optimizer = tf.train.AdagradOptimizer(learning_rate)
+      else:
+        optimizer = tf.train.AdamOptimizer(learning_rate)
     elif isinstance(optimizer, str):
       if optimizer == 'gradientdescent':
         optimizer = tf.train.GradientDescentOptimizer(0.01)
@@ -318,44 +1176,6 @@ class VariationalInference(Inference):
     self.coord = tf.train.Coordinator()
     self.threads = tf.train.start_queue_runners(coord=self.coord)
 
-  def update(self):
-    """Run one iteration of optimizer for variational inference.
-
-    Returns
-    -------
-    loss : double
-      Loss function values after one iteration.
-    """
-    sess = get_session()
-    _, loss = sess.run([self.train, self.loss])
-    return loss
-
-  def print_progress(self, t, loss):
-    """Print progress to output.
-
-    Parameters
-    ----------
-    t : int
-      Iteration counter.
-    loss : double
-      Loss function value at iteration ``t``.
-    """
-    if self.n_print is not None:
-      if t % self.n_print == 0:
-        print("iter {:d} loss {:.2f}".format(t, loss))
-        for rv in six.itervalues(self.latent_vars):
-          print(rv)
-
-  def finalize(self):
-    """Function to call after convergence.
-
-    Any class based on ``VariationalInference`` **may**
-    overwrite this method.
-    """
-    # Ask threads to stop.
-    self.coord.request_stop()
-    self.coord.join(self.threads)
-
   def build_loss(self):
     """Build loss function.
 
@@ -482,41 +1302,52 @@ class MFVI(VariationalInference):
     expectation using Monte Carlo sampling.
     """
     p_log_prob = [0.0] * self.n_samples
+    z_samples = []
     q_log_prob = [0.0] * self.n_samples
+    # Log density of the variational model with local latent variables
+    # scaled, as it enters the objective.
+    q_log_prob_scaled = [0.0] * self.n_samples
     for s in range(self.n_samples):
       z_sample = {}
       for z, qz in six.iteritems(self.latent_vars):
         # Copy q(z) to obtain new set of posterior samples.
         qz_copy = copy(qz, scope='inference_' + str(s))
         z_sample[z] = qz_copy.value()
-        q_log_prob[s] += tf.reduce_sum(
+        qz_log_prob = tf.reduce_sum(
             qz.log_prob(tf.stop_gradient(z_sample[z])))
+        q_log_prob[s] += qz_log_prob
+        q_log_prob_scaled[s] += self._latent_scale[z] * qz_log_prob
 
       # Form dictionary in order to replace conditioning on prior or
       # observed variable with conditioning on posterior sample or
       # observed data.
       dict_swap = z_sample
       for x, obs in six.iteritems(self.data):
-        if isinstance(x, RandomVariable):
-          dict_swap[x] = obs
+        if isinstance(x, RandomVariable) or isinstance(x, tf.Tensor):
+          dict_swap[x] = tf.cast(obs, x.dtype)
 
       if self.model_wrapper is None:
         for z in six.iterkeys(self.latent_vars):
           z_copy = copy(z, dict_swap, scope='inference_' + str(s))
-          p_log_prob[s] += tf.reduce_sum(z_copy.log_prob(z_sample[z]))
+          p_log_prob[s] += self._latent_scale[z] * \
+              tf.reduce_sum(z_copy.log_prob(z_sample[z]))
 
         for x, obs in six.iteritems(self.data):
           if isinstance(x, RandomVariable):
             x_copy = copy(x, dict_swap, scope='inference_' + str(s))
-            p_log_prob[s] += tf.reduce_sum(x_copy.log_prob(obs))
+            p_log_prob[s] += self.scale[x] * \
+                tf.reduce_sum(x_copy.log_prob(dict_swap[x]))
       else:
-        x = self.data
-        p_log_prob[s] = self.model_wrapper.log_prob(x, z_sample)
+        z_samples.append(z_sample)
+
+    if self.model_wrapper is not None:
+      p_log_prob = self._wrapper_log_prob(z_samples)
 
     p_log_prob = tf.pack(p_log_prob)
     q_log_prob = tf.pack(q_log_prob)
+    q_log_prob_scaled = tf.pack(q_log_prob_scaled)
 
-    losses = p_log_prob - q_log_prob
+    losses = p_log_prob - q_log_prob_scaled
     self.loss = tf.reduce_mean(losses)
     return -tf.reduce_mean(q_log_prob * tf.stop_gradient(losses))
 
@@ -534,6 +1365,7 @@ class MFVI(VariationalInference):
     expectation using Monte Carlo sampling.
     """
     p_log_prob = [0.0] * self.n_samples
+    z_samples = []
     q_log_prob = [0.0] * self.n_samples
     for s in range(self.n_samples):
       z_sample = {}
@@ -541,28 +1373,33 @@ class MFVI(VariationalInference):
         # Copy q(z) to obtain new set of posterior samples.
         qz_copy = copy(qz, scope='inference_' + str(s))
         z_sample[z] = qz_copy.value()
-        q_log_prob[s] += tf.reduce_sum(qz.log_prob(z_sample[z]))
+        q_log_prob[s] += self._latent_scale[z] * \
+            tf.reduce_sum(qz.log_prob(z_sample[z]))
 
       # Form dictionary in order to replace conditioning on prior or
       # observed variable with conditioning on posterior sample or
       # observed data.
       dict_swap = z_sample
       for x, obs in six.iteritems(self.data):
-        if isinstance(x, RandomVariable):
-          dict_swap[x] = obs
+        if isinstance(x, RandomVariable) or isinstance(x, tf.Tensor):
+          dict_swap[x] = tf.cast(obs, x.dtype)
 
       if self.model_wrapper is None:
         for z in six.iterkeys(self.latent_vars):
           z_copy = copy(z, dict_swap, scope='inference_' + str(s))
-          p_log_prob[s] += tf.reduce_sum(z_copy.log_prob(z_sample[z]))
+          p_log_prob[s] += self._latent_scale[z] * \
+              tf.reduce_sum(z_copy.log_prob(z_sample[z]))
 
         for x, obs in six.iteritems(self.data):
           if isinstance(x, RandomVariable):
             x_copy = copy(x, dict_swap, scope='inference_' + str(s))
-            p_log_prob[s] += tf.reduce_sum(x_copy.log_prob(obs))
+            p_log_prob[s] += self.scale[x] * \
+                tf.reduce_sum(x_copy.log_prob(dict_swap[x]))
       else:
-        x = self.data
-        p_log_prob[s] = self.model_wrapper.log_prob(x, z_sample)
+        z_samples.append(z_sample)
+
+    if self.model_wrapper is not None:
+      p_log_prob = self._wrapper_log_prob(z_samples)
 
     p_log_prob = tf.pack(p_log_prob)
     q_log_prob = tf.pack(q_log_prob)
@@ -604,27 +1441,42 @@ class MFVI(VariationalInference):
       # observed data.
       dict_swap = z_sample
       for x, obs in six.iteritems(self.data):
-        if isinstance(x, RandomVariable):
-          dict_swap[x] = obs
+        if isinstance(x, RandomVariable) or isinstance(x, tf.Tensor):
+          dict_swap[x] = tf.cast(obs, x.dtype)
 
       if self.model_wrapper is None:
         for x, obs in six.iteritems(self.data):
           if isinstance(x, RandomVariable):
             x_copy = copy(x, dict_swap, scope='inference_' + str(s))
-            p_log_lik[s] += tf.reduce_sum(x_copy.log_prob(obs))
+            p_log_lik[s] += self.scale[x] * \
+                tf.reduce_sum(x_copy.log_prob(dict_swap[x]))
       else:
         x = self.data
-        p_log_lik[s] = self.model_wrapper.log_lik(x, z_sample)
+        p_log_lik[s] = self._wrapper_scale() * \
+            self.model_wrapper.log_lik(x, z_sample)
 
     p_log_lik = tf.pack(p_log_lik)
     q_log_prob = tf.pack(q_log_prob)
 
     if self.model_wrapper is None:
-      kl = tf.reduce_sum([kl_multivariate_normal(qz.mu, qz.sigma, z.mu, z.sigma)
-                          for z, qz in six.iteritems(self.latent_vars)])
+      # Condition the prior on data bound to placeholders, e.g., for
+      # local latent variables sized to the minibatch.
+      data_swap = {x: tf.cast(obs, x.dtype)
+                   for x, obs in six.iteritems(self.data)
+                   if isinstance(x, tf.Tensor)}
+      kl = 0.0
+      for z, qz in six.iteritems(self.latent_vars):
+        scale = self._latent_scale[z]
+        if data_swap:
+          z = copy(z, data_swap, scope='inference_' + str(id(self)))
+
+        kl += scale * tf.reduce_sum(
+            kl_multivariate_normal(qz.mu, qz.sigma, z.mu, z.sigma))
     else:
-      kl = tf.reduce_sum([kl_multivariate_normal(qz.mu, qz.sigma)
-                          for qz in six.itervalues(self.latent_vars)])
+      kl = tf.reduce_sum([
+          self._latent_scale[z] *
+          tf.reduce_sum(kl_multivariate_normal(qz.mu, qz.sigma))
+          for z, qz in six.iteritems(self.latent_vars)])
 
     self.loss = tf.reduce_mean(p_log_lik) - kl
     return -(tf.reduce_mean(q_log_prob * tf.stop_gradient(p_log_lik)) - kl)
@@ -646,6 +1498,7 @@ class MFVI(VariationalInference):
     expectation using Monte Carlo sampling.
     """
     p_log_prob = [0.0] * self.n_samples
+    z_samples = []
     q_log_prob = [0.0] * self.n_samples
     for s in range(self.n_samples):
       z_sample = {}
@@ -661,27 +1514,32 @@ class MFVI(VariationalInference):
       # observed data.
       dict_swap = z_sample
       for x, obs in six.iteritems(self.data):
-        if isinstance(x, RandomVariable):
-          dict_swap[x] = obs
+        if isinstance(x, RandomVariable) or isinstance(x, tf.Tensor):
+          dict_swap[x] = tf.cast(obs, x.dtype)
 
       if self.model_wrapper is None:
         for z in six.iterkeys(self.latent_vars):
           z_copy = copy(z, dict_swap, scope='inference_' + str(s))
-          p_log_prob[s] += tf.reduce_sum(z_copy.log_prob(z_sample[z]))
+          p_log_prob[s] += self._latent_scale[z] * \
+              tf.reduce_sum(z_copy.log_prob(z_sample[z]))
 
         for x, obs in six.iteritems(self.data):
           if isinstance(x, RandomVariable):
             x_copy = copy(x, dict_swap, scope='inference_' + str(s))
-            p_log_prob[s] += tf.reduce_sum(x_copy.log_prob(obs))
+            p_log_prob[s] += self.scale[x] * \
+                tf.reduce_sum(x_copy.log_prob(dict_swap[x]))
       else:
-        x = self.data
-        p_log_prob[s] = self.model_wrapper.log_prob(x, z_sample)
+        z_samples.append(z_sample)
+
+    if self.model_wrapper is not None:
+      p_log_prob = self._wrapper_log_prob(z_samples)
 
     p_log_prob = tf.pack(p_log_prob)
     q_log_prob = tf.pack(q_log_prob)
 
-    q_entropy = tf.reduce_sum([qz.entropy()
-                               for qz in six.itervalues(self.latent_vars)])
+    q_entropy = tf.reduce_sum([self._latent_scale[z] *
+                               tf.reduce_sum(qz.entropy())
+                               for z, qz in six.iteritems(self.latent_vars)])
 
     self.loss = tf.reduce_mean(p_log_prob) + q_entropy
     return -(tf.reduce_mean(q_log_prob * tf.stop_gradient(p_log_prob)) +
@@ -719,26 +1577,41 @@ class MFVI(VariationalInference):
       # observed data.
       dict_swap = z_sample
       for x, obs in six.iteritems(self.data):
-        if isinstance(x, RandomVariable):
-          dict_swap[x] = obs
+        if isinstance(x, RandomVariable) or isinstance(x, tf.Tensor):
+          dict_swap[x] = tf.cast(obs, x.dtype)
 
       if self.model_wrapper is None:
         for x, obs in six.iteritems(self.data):
           if isinstance(x, RandomVariable):
             x_copy = copy(x, dict_swap, scope='inference_' + str(s))
-            p_log_lik[s] += tf.reduce_sum(x_copy.log_prob(obs))
+            p_log_lik[s] += self.scale[x] * \
+                tf.reduce_sum(x_copy.log_prob(dict_swap[x]))
       else:
         x = self.data
-        p_log_lik[s] = self.model_wrapper.log_lik(x, z_sample)
+        p_log_lik[s] = self._wrapper_scale() * \
+            self.model_wrapper.log_lik(x, z_sample)
 
     p_log_lik = tf.pack(p_log_lik)
 
     if self.model_wrapper is None:
-      kl = tf.reduce_sum([kl_multivariate_normal(qz.mu, qz.sigma, z.mu, z.sigma)
-                          for z, qz in six.iteritems(self.latent_vars)])
+      # Condition the prior on data bound to placeholders, e.g., for
+      # local latent variables sized to the minibatch.
+      data_swap = {x: tf.cast(obs, x.dtype)
+                   for x, obs in six.iteritems(self.data)
+                   if isinstance(x, tf.Tensor)}
+      kl = 0.0
+      for z, qz in six.iteritems(self.latent_vars):
+        scale = self._latent_scale[z]
+        if data_swap:
+          z = copy(z, data_swap, scope='inference_' + str(id(self)))
+
+        kl += scale * tf.reduce_sum(
+            kl_multivariate_normal(qz.mu, qz.sigma, z.mu, z.sigma))
     else:
-      kl = tf.reduce_sum([kl_multivariate_normal(qz.mu, qz.sigma)
-                          for qz in six.itervalues(self.latent_vars)])
+      kl = tf.reduce_sum([
+          self._latent_scale[z] *
+          tf.reduce_sum(kl_multivariate_normal(qz.mu, qz.sigma))
+          for z, qz in six.iteritems(self.latent_vars)])
 
     p_log_lik = tf.pack(p_log_lik)
     self.loss = tf.reduce_mean(p_log_lik) - kl
@@ -761,6 +1634,7 @@ class MFVI(VariationalInference):
     expectation using Monte Carlo sampling.
     """
     p_log_prob = [0.0] * self.n_samples
+    z_samples = []
     for s in range(self.n_samples):
       z_sample = {}
       for z, qz in six.iteritems(self.latent_vars):
@@ -773,31 +1647,192 @@ class MFVI(VariationalInference):
       # observed data.
       dict_swap = z_sample
       for x, obs in six.iteritems(self.data):
-        if isinstance(x, RandomVariable):
-          dict_swap[x] = obs
+        if isinstance(x, RandomVariable) or isinstance(x, tf.Tensor):
+          dict_swap[x] = tf.cast(obs, x.dtype)
 
       if self.model_wrapper is None:
         for z in six.iterkeys(self.latent_vars):
           z_copy = copy(z, dict_swap, scope='inference_' + str(s))
-          p_log_prob[s] += tf.reduce_sum(z_copy.log_prob(z_sample[z]))
+          p_log_prob[s] += self._latent_scale[z] * \
+              tf.reduce_sum(z_copy.log_prob(z_sample[z]))
 
         for x, obs in six.iteritems(self.data):
           if isinstance(x, RandomVariable):
             x_copy = copy(x, dict_swap, scope='inference_' + str(s))
-            p_log_prob[s] += tf.reduce_sum(x_copy.log_prob(obs))
+            p_log_prob[s] += self.scale[x] * \
+                tf.reduce_sum(x_copy.log_prob(dict_swap[x]))
       else:
-        x = self.data
-        p_log_prob[s] = self.model_wrapper.log_prob(x, z_sample)
+        z_samples.append(z_sample)
+
+    if self.model_wrapper is not None:
+      p_log_prob = self._wrapper_log_prob(z_samples)
 
     p_log_prob = tf.pack(p_log_prob)
 
-    q_entropy = tf.reduce_sum([qz.entropy()
-                               for qz in six.itervalues(self.latent_vars)])
+    q_entropy = tf.reduce_sum([self._latent_scale[z] *
+                               tf.reduce_sum(qz.entropy())
+                               for z, qz in six.iteritems(self.latent_vars)])
 
     self.loss = tf.reduce_mean(p_log_prob) + q_entropy
     return -self.loss
 
 
+class IWVI(MFVI):
+  """Importance-weighted variational inference. (Burda et al., 2016)
+
+  It uses importance sampling to produce an improved lower bound on
+  the log marginal likelihood,
+
+  .. math::
+
+    E_{q(z^1; \lambda), ..., q(z^K; \lambda)} [
+    \log 1/K \sum_{k=1}^K p(x, z^k)/q(z^k; \lambda) ].
+
+  It is the core idea behind importance-weighted autoencoders. IWAEs
+  are the special case when the probabilistic model is among a
+  specific class of deep generative models, and the variational
+  model is parameterized with an inference network.
+
+  Notes
+  -----
+  The ``n_samples`` x ``K`` samples are drawn from each variational
+  factor in one batch, and the importance weights are computed as
+  one ``[n_samples, K]`` tensor.
+
+  For Edward models, the model is evaluated once for all samples by
+  copying it with the batch of samples in place of the latent
+  variables; this requires the model's tensors to broadcast along a
+  new outer dimension. For model wrappers, the model's log density is
+  evaluated for each sample.
+  """
+  def __init__(self, *args, **kwargs):
+    super(IWVI, self).__init__(*args, **kwargs)
+
+  def initialize(self, K=5, *args, **kwargs):
+    """Initialization.
+
+    Parameters
+    ----------
+    K : int, optional
+      Number of importance samples.
+    """
+    self.K = K
+    return super(IWVI, self).initialize(*args, **kwargs)
+
+  def build_loss(self):
+    """Build loss function. Its automatic differentiation
+    is a stochastic gradient of
+
+    .. math::
+
+      -E_{q(z^1; \lambda), ..., q(z^K; \lambda)} [
+      \log 1/K \sum_{k=1}^K p(x, z^k)/q(z^k; \lambda) ]
+
+    based on the score function estimator (Paisley et al., 2012) or
+    the reparameterization trick (Kingma and Welling, 2014).
+
+    Computed by sampling from :math:`q(z;\lambda)` and evaluating
+    the expectation using Monte Carlo sampling. Note there is a
+    difference between the number of samples to approximate the
+    expectations (`n_samples`) and the number of importance
+    samples to determine how many expectations (`K`).
+
+    The bound does not decompose over data points. If all latent
+    variables are local to the subsampled data, it is formed on the
+    minibatch and scaled as a whole by the data scale; otherwise only
+    global latent variables are supported.
+
+    Raises
+    ------
+    ValueError
+      If only some latent variables are local to the data, or if
+      observed variables are subsampled differently from them.
+    """
+    scale = self._local_scale()
+    if scale != 1.0 and any([self.scale[x] != scale
+                             for x in six.iterkeys(self.data)
+                             if isinstance(x, RandomVariable)]):
+      raise ValueError("Local latent variables require all observed "
+                       "variables to be subsampled with their data.")
+
+    n = self.n_samples * self.K
+    z_sample = {}
+    q_log_prob = tf.zeros([n])
+    for z, qz in six.iteritems(self.latent_vars):
+      z_sample[z] = qz.sample_n(n)
+      if self.score:
+        z_sample[z] = tf.stop_gradient(z_sample[z])
+
+      q_log_prob += tf.reduce_sum(
+          tf.reshape(qz.log_prob(z_sample[z]), [n, -1]), 1)
+
+    p_log_prob = self.build_log_joint(z_sample)
+
+    # Form n_samples x K matrix of log importance weights.
+    log_w = tf.reshape(p_log_prob - q_log_prob, [self.n_samples, self.K])
+    # Take log mean exp across importance weights (columns).
+    losses = scale * log_mean_exp(log_w, 1)
+    self.loss = tf.reduce_mean(losses)
+    if self.score:
+      q_log_prob = tf.reduce_sum(
+          tf.reshape(q_log_prob, [self.n_samples, self.K]), 1)
+      return -tf.reduce_mean(q_log_prob * tf.stop_gradient(losses) + losses)
+    else:
+      return -self.loss
+
+  def build_log_joint(self, z_sample):
+    """Build the log joint density for a batch of samples.
+
+    Parameters
+    ----------
+    z_sample : dict
+      Latent variable dictionary, with an outer dimension of size
+      ``n_samples * K`` for each value.
+
+    Returns
+    -------
+    tf.Tensor
+      A vector of ``n_samples * K`` log joint densities. If all latent
+      variables are local to the data, it is the log joint density of
+      the minibatch, without scaling.
+    """
+    n = self.n_samples * self.K
+    scale = self._local_scale()
+    if self.model_wrapper is None:
+      scope = 'inference_' + str(id(self))
+      log_joint = tf.zeros([n])
+      # Form dictionary in order to replace conditioning on prior or
+      # observed variable with conditioning on posterior samples or
+      # observed data.
+      dict_swap = z_sample.copy()
+      for x, obs in six.iteritems(self.data):
+        if isinstance(x, RandomVariable) or isinstance(x, tf.Tensor):
+          dict_swap[x] = tf.cast(obs, x.dtype)
+
+      for z in six.iterkeys(self.latent_vars):
+        z_copy = copy(z, dict_swap, scope=scope)
+        log_joint += tf.reduce_sum(
+            tf.reshape(z_copy.log_prob(z_sample[z]), [n, -1]), 1)
+
+      for x, obs in six.iteritems(self.data):
+        if isinstance(x, RandomVariable):
+          x_copy = copy(x, dict_swap, scope=scope)
+          log_joint += self.scale[x] / scale * tf.reduce_sum(
+              tf.reshape(x_copy.log_prob(dict_swap[x]), [n, -1]), 1)
+
+      return log_joint
+    elif hasattr(self.model_wrapper, 'batch_log_prob') and \
+        (self._wrapper_scale() == 1.0 or scale != 1.0 or
+         not hasattr(self.model_wrapper, 'log_lik')):
+      return self.model_wrapper.batch_log_prob(self.data, z_sample)
+    else:
+      z_unpacked = {z: tf.unpack(value, num=n)
+                    for z, value in six.iteritems(z_sample)}
+      z_samples = [{z: value[s] for z, value in six.iteritems(z_unpacked)}
+                   for s in range(n)]
+      return tf.pack(self._wrapper_log_prob(z_samples)) / scale
+
+
 class KLpq(VariationalInference):
   """A variational inference method that minimizes the Kullback-Leibler
   divergence from the posterior to the variational model (Cappe et al., 2008)
@@ -855,41 +1890,52 @@ class KLpq(VariationalInference):
 
     """
     p_log_prob = [0.0] * self.n_samples
+    z_samples = []
     q_log_prob = [0.0] * self.n_samples
+    # Log density of the variational model with local latent variables
+    # scaled, as it enters the importance weights.
+    q_log_prob_scaled = [0.0] * self.n_samples
     for s in range(self.n_samples):
       z_sample = {}
       for z, qz in six.iteritems(self.latent_vars):
         # Copy q(z) to obtain new set of posterior samples.
         qz_copy = copy(qz, scope='inference_' + str(s))
         z_sample[z] = qz_copy.value()
-        q_log_prob[s] += tf.reduce_sum(
+        qz_log_prob = tf.reduce_sum(
             qz.log_prob(tf.stop_gradient(z_sample[z])))
+        q_log_prob[s] += qz_log_prob
+        q_log_prob_scaled[s] += self._latent_scale[z] * qz_log_prob
 
       # Form dictionary in order to replace conditioning on prior or
       # observed variable with conditioning on posterior sample or
       # observed data.
       dict_swap = z_sample
       for x, obs in six.iteritems(self.data):
-        if isinstance(x, RandomVariable):
-          dict_swap[x] = obs
+        if isinstance(x, RandomVariable) or isinstance(x, tf.Tensor):
+          dict_swap[x] = tf.cast(obs, x.dtype)
 
       if self.model_wrapper is None:
         for z in six.iterkeys(self.latent_vars):
           z_copy = copy(z, dict_swap, scope='inference_' + str(s))
-          p_log_prob[s] += tf.reduce_sum(z_copy.log_prob(z_sample[z]))
+          p_log_prob[s] += self._latent_scale[z] * \
+              tf.reduce_sum(z_copy.log_prob(z_sample[z]))
 
         for x, obs in six.iteritems(self.data):
           if isinstance(x, RandomVariable):
             x_copy = copy(x, dict_swap, scope='inference_' + str(s))
-            p_log_prob[s] += tf.reduce_sum(x_copy.log_prob(obs))
+            p_log_prob[s] += self.scale[x] * \
+                tf.reduce_sum(x_copy.log_prob(dict_swap[x]))
       else:
-        x = self.data
-        p_log_prob[s] = self.model_wrapper.log_prob(x, z_sample)
+        z_samples.append(z_sample)
+
+    if self.model_wrapper is not None:
+      p_log_prob = self._wrapper_log_prob(z_samples)
 
     p_log_prob = tf.pack(p_log_prob)
     q_log_prob = tf.pack(q_log_prob)
+    q_log_prob_scaled = tf.pack(q_log_prob_scaled)
 
-    log_w = p_log_prob - q_log_prob
+    log_w = p_log_prob - q_log_prob_scaled
     log_w_norm = log_w - log_sum_exp(log_w)
     w_norm = tf.exp(log_w_norm)
 
@@ -982,20 +2028,21 @@ class MAP(VariationalInference):
       # observed data.
       dict_swap = z_mode
       for x, obs in six.iteritems(self.data):
-        if isinstance(x, RandomVariable):
-          dict_swap[x] = obs
+        if isinstance(x, RandomVariable) or isinstance(x, tf.Tensor):
+          dict_swap[x] = tf.cast(obs, x.dtype)
 
       for z in six.iterkeys(self.latent_vars):
         z_copy = copy(z, dict_swap, scope='inference_' + str(0))
-        p_log_prob += tf.reduce_sum(z_copy.log_prob(z_mode[z]))
+        p_log_prob += self._latent_scale[z] * \
+            tf.reduce_sum(z_copy.log_prob(z_mode[z]))
 
       for x, obs in six.iteritems(self.data):
         if isinstance(x, RandomVariable):
           x_copy = copy(x, dict_swap, scope='inference_' + str(0))
-          p_log_prob += tf.reduce_sum(x_copy.log_prob(obs))
+          p_log_prob += self.scale[x] * \
+              tf.reduce_sum(x_copy.log_prob(dict_swap[x]))
     else:
-      x = self.data
-      p_log_prob = self.model_wrapper.log_prob(x, z_mode)
+      p_log_prob = self._wrapper_log_prob([z_mode])[0]
 
     self.loss = p_log_prob
     return -self.loss
@@ -1029,3 +2076,398 @@ class Laplace(MAP):
     print("Precision matrix:")
     print(inv_cov.eval())
     super(Laplace, self).finalize()
+
+
+class SGLD(MonteCarlo):
+  """Stochastic gradient Langevin dynamics (Welling and Teh, 2011).
+
+  At each iteration it takes a gradient step on the log joint density,
+  computed on a minibatch of data with the log-likelihood scaled by
+  the ratio of full data size to minibatch size, and adds Gaussian
+  noise,
+
+  .. math::
+
+    z_{t+1} = z_t + \epsilon_t / 2 \\nabla_z \log p(x, z_t)
+              + \eta_t,
+    \qquad \eta_t \sim \mathcal{N}(0, \epsilon_t).
+
+  The step size decays as :math:`\epsilon_t = \epsilon (1 + t)^{-\gamma}`.
+  """
+  def __init__(self, latent_vars, data=None, model_wrapper=None):
+    """
+    Parameters
+    ----------
+    latent_vars : dict of RandomVariable to PointMass
+      Collection of random variables to perform inference on. Each
+      random variable is binded to a ``PointMass`` distribution whose
+      parameters are a TensorFlow variable; these form the state of
+      the chain. Steps are taken on the variable itself, so latent
+      variables with constrained support must be reparameterized in
+      the model, e.g., as the softplus of an unconstrained latent
+      variable.
+
+    Examples
+    --------
+    >>> qz = PointMass(params=tf.Variable(tf.zeros(K)))
+    >>> inference = SGLD({z: qz}, {x: x_train})
+    >>> inference.run(n_minibatch=100, step_size=1e-3)
+    >>> inference.samples[z].mean().eval()
+    """
+    super(SGLD, self).__init__(latent_vars, data, model_wrapper)
+
+  def initialize(self, step_size=1e-3, decay=0.55, scope=None,
+                 *args, **kwargs):
+    """Initialization.
+
+    Parameters
+    ----------
+    step_size : float, optional
+      Initial step size :math:`\epsilon`.
+    decay : float, optional
+      Polynomial decay rate :math:`\gamma` of the step size. It
+      should lie in :math:`(0.5, 1]`.
+    scope : str, optional
+      Scope of TensorFlow variable objects which form the state of
+      the chain. Default is the parameters of all ``PointMass``
+      distributions in ``latent_vars``.
+    """
+    self.step_size = step_size
+    self.decay = decay
+    self.scope = scope
+    return super(SGLD, self).initialize(*args, **kwargs)
+
+  def build_update(self):
+    """Build update, which takes one Langevin step for each TensorFlow
+    variable in the state of the chain.
+    """
+    var_list = self._state_variables()
+    self.loss = self.build_log_joint()
+    grads = tf.gradients(self.loss, var_list)
+    learning_rate = self._learning_rate()
+
+    assign_ops = []
+    for var, grad in zip(var_list, grads):
+      if grad is None:
+        continue
+
+      noise = tf.random_normal(get_dims(var)) * tf.sqrt(learning_rate)
+      assign_ops.append(var.assign_add(0.5 * learning_rate * grad + noise))
+
+    return tf.group(*assign_ops)
+
+  def build_log_joint(self):
+    """Build the log joint density at the current state of the chain,
+    with the log-likelihood scaled by ``self.scale``.
+
+    Raises
+    ------
+    ValueError
+      If data is subsampled for a model wrapper without a ``log_lik``
+      method, as its log-likelihood cannot be scaled apart from the
+      prior.
+    """
+    z_state = {z: qz.value() for z, qz in six.iteritems(self.latent_vars)}
+    if self.model_wrapper is None:
+      scope = 'inference_' + str(id(self))
+      log_joint = 0.0
+      # Form dictionary in order to replace conditioning on prior or
+      # observed variable with conditioning on the current state or
+      # observed data.
+      dict_swap = z_state.copy()
+      for x, obs in six.iteritems(self.data):
+        if isinstance(x, RandomVariable) or isinstance(x, tf.Tensor):
+          dict_swap[x] = tf.cast(obs, x.dtype)
+
+      for z in six.iterkeys(self.latent_vars):
+        z_copy = copy(z, dict_swap, scope=scope)
+        log_joint += tf.reduce_sum(z_copy.log_prob(z_state[z]))
+
+      for x, obs in six.iteritems(self.data):
+        if isinstance(x, RandomVariable):
+          x_copy = copy(x, dict_swap, scope=scope)
+          log_joint += self.scale[x] * \
+              tf.reduce_sum(x_copy.log_prob(dict_swap[x]))
+    else:
+      x = self.data
+      log_joint = self.model_wrapper.log_prob(x, z_state)
+      scale = self._wrapper_scale()
+      if scale != 1.0:
+        if not hasattr(self.model_wrapper, 'log_lik'):
+          raise ValueError("Subsampling data requires the model wrapper "
+                           "to implement log_lik.")
+
+        log_joint += (scale - 1.0) * self.model_wrapper.log_lik(x, z_state)
+
+    return log_joint
+
+  def _state_variables(self):
+    """Return the TensorFlow variables which form the state of the
+    chain: the parameters of each ``PointMass`` in ``latent_vars``,
+    restricted to ``self.scope`` if specified.
+
+    Raises
+    ------
+    ValueError
+      If the parameters of a ``PointMass`` are not a TensorFlow
+      variable, e.g., a transformed variable, whose steps would
+      require the log determinant of the transform's Jacobian.
+    """
+    if self.scope is not None:
+      in_scope = set([var.name for var in tf.get_collection(
+          tf.GraphKeys.TRAINABLE_VARIABLES, scope=self.scope)])
+
+    var_list = []
+    for qz in six.itervalues(self.latent_vars):
+      params = qz._dist_args.get('params')
+      if not isinstance(params, tf.Variable):
+        raise ValueError("The parameters of each PointMass must be a "
+                         "TensorFlow variable.")
+
+      if self.scope is None or params.name in in_scope:
+        var_list.append(params)
+
+    return var_list
+
+  def _learning_rate(self):
+    t = tf.cast(self._t_value, tf.float32)
+    return self.step_size * tf.pow(1.0 + t, -self.decay)
+
+
+class SGHMC(SGLD):
+  """Stochastic gradient Hamiltonian Monte Carlo (Chen et al., 2014).
+
+  It augments the state of the chain with a momentum for each
+  TensorFlow variable and runs the discretized dynamics with friction,
+
+  .. math::
+
+    v_{t+1} = (1 - \\alpha) v_t + \epsilon_t \\nabla_z \log p(x, z_t)
+              + \eta_t,
+    \qquad \eta_t \sim \mathcal{N}(0, 2 \\alpha \epsilon_t),
+
+    z_{t+1} = z_t + v_{t+1}.
+
+  The step size decays as in ``SGLD``.
+  """
+  def __init__(self, *args, **kwargs):
+    super(SGHMC, self).__init__(*args, **kwargs)
+
+  def initialize(self, friction=0.1, *args, **kwargs):
+    """Initialization.
+
+    Parameters
+    ----------
+    friction : float, optional
+      Friction term :math:`\\alpha`, in :math:`(0, 1]`.
+    """
+    self.friction = friction
+    return super(SGHMC, self).initialize(*args, **kwargs)
+
+  def build_update(self):
+    """Build update, which takes one step of the dynamics for each
+    TensorFlow variable in the state of the chain.
+    """
+    var_list = self._state_variables()
+    self.loss = self.build_log_joint()
+    grads = tf.gradients(self.loss, var_list)
+    learning_rate = self._learning_rate()
+
+    assign_ops = []
+    for var, grad in zip(var_list, grads):
+      if grad is None:
+        continue
+
+      # Create the momentum outside of ``MonteCarlo.initialize``'s
+      # control dependencies, so that it can be initialized.
+      with tf.control_dependencies(None):
+        velocity = tf.Variable(tf.zeros(get_dims(var)), trainable=False)
+
+      noise = tf.random_normal(get_dims(var)) * \
+          tf.sqrt(2.0 * self.friction * learning_rate)
+      velocity_new = (1.0 - self.friction) * velocity + \
+          learning_rate * grad + noise
+      assign_ops.append(velocity.assign(velocity_new))
+      assign_ops.append(var.assign_add(velocity_new))
+
+    return tf.group(*assign_ops)
+
+
+class SMC(MonteCarlo):
+  """Sequential Monte Carlo (Gordon et al., 1993; Chopin, 2002).
+
+  It holds ``n_particles`` particles for each latent variable as one
+  batched tensor. Each iteration reweights the particles by the
+  log-likelihood of the current data, e.g., the next minibatch or
+  the next observation fed in, and resamples them if the effective
+  sample size drops below a threshold. It also accumulates an
+  estimate of the log marginal likelihood.
+
+  For state-space models, a model wrapper may define
+  ``sample_transition(zs)``, which propagates the particles before
+  reweighting. This gives the bootstrap particle filter.
+
+  Notes
+  -----
+  The likelihood is evaluated once for all particles. For model
+  wrappers, ``log_lik(xs, zs)`` receives each latent variable with
+  an outer dimension of size ``n_particles`` and must return a vector
+  of ``n_particles`` log-likelihoods. For Edward models, the
+  observed variables are copied with the particles in place of the
+  latent variables, and their log-densities are summed over all but
+  the outer dimension.
+  """
+  def __init__(self, latent_vars, data=None, model_wrapper=None):
+    """
+    Parameters
+    ----------
+    latent_vars : dict of RandomVariable to RandomVariable
+      Collection of random variables to perform inference on. Each
+      random variable is binded to the distribution of its initial
+      particles. This is typically the prior, as the weights only
+      include the likelihood.
+
+    Examples
+    --------
+    >>> inference = SMC({'z': Normal(mu=tf.zeros(K), sigma=tf.ones(K))},
+    ...                 data, model)
+    >>> inference.run(n_particles=10000, n_minibatch=1)
+    >>> inference.samples['z'].mean().eval()
+    """
+    super(SMC, self).__init__(latent_vars, data, model_wrapper)
+
+  def initialize(self, n_particles=1000, ess_threshold=0.5, *args, **kwargs):
+    """Initialization.
+
+    Parameters
+    ----------
+    n_particles : int, optional
+      Number of particles.
+    ess_threshold : float, optional
+      Resample if the effective sample size is below this fraction
+      of the number of particles.
+
+    Notes
+    -----
+    The particles are kept in ``self.samples``, a dictionary binding
+    each latent variable to an ``Empirical`` random variable, and
+    their normalized log weights in ``self.log_weights``. The particles
+    are equally weighted after a resampling step. The estimate of the
+    log marginal likelihood is kept in ``self.log_evidence`` and is
+    returned by ``update``.
+    """
+    self.n_particles = n_particles
+    self.ess_threshold = ess_threshold
+    # Skip ``MonteCarlo.initialize``: the particles, and not a trace of
+    # a chain, form the approximation.
+    super(MonteCarlo, self).initialize(*args, **kwargs)
+
+    self.t = tf.Variable(0, trainable=False)
+    self.samples = {}
+    for z, qz in six.iteritems(self.latent_vars):
+      particles = tf.Variable(qz.sample_n(n_particles), trainable=False)
+      self.samples[z] = Empirical(params=particles)
+
+    self.log_weights = tf.Variable(
+        tf.fill([n_particles], -np.log(n_particles).astype(np.float32)),
+        trainable=False)
+    self.log_evidence = tf.Variable(0.0, trainable=False)
+    update = self.build_update()
+    with tf.control_dependencies([update]):
+      self.train = tf.group(self.t.assign_add(1))
+
+    init = tf.initialize_all_variables()
+    init.run()
+
+    # Start input enqueue threads.
+    self.coord = tf.train.Coordinator()
+    self.threads = tf.train.start_queue_runners(coord=self.coord)
+
+  def build_update(self):
+    """Build update, which propagates, reweights, and possibly
+    resamples the particles.
+    """
+    P = self.n_particles
+    zs = {z: qz.params for z, qz in six.iteritems(self.samples)}
+    if hasattr(self.model_wrapper, 'sample_transition'):
+      zs = self.model_wrapper.sample_transition(zs)
+
+    log_w = self.log_weights + self.build_log_lik(zs)
+    # The weights are normalized, so the normalizing constant of the
+    # new weights estimates the ratio of successive marginal
+    # likelihoods.
+    log_norm = log_sum_exp(log_w)
+    log_w = log_w - log_norm
+    ess = tf.exp(-log_sum_exp(2.0 * log_w))
+
+    is_resample = ess < self.ess_threshold * P
+    idx = tf.cond(is_resample,
+                  lambda: self._resample(log_w),
+                  lambda: tf.range(P))
+    log_w = tf.cond(is_resample,
+                    lambda: tf.fill([P], -np.log(P).astype(np.float32)),
+                    lambda: log_w)
+
+    assign_ops = [tf.assign(self.samples[z].params, tf.gather(zs[z], idx))
+                  for z in six.iterkeys(self.samples)]
+    assign_ops.append(self.log_weights.assign(log_w))
+    self.loss = self.log_evidence.assign_add(log_norm)
+    return tf.group(self.loss, *assign_ops)
+
+  def build_log_lik(self, zs):
+    """Build the log-likelihood of the current data, vectorized over
+    particles.
+
+    Parameters
+    ----------
+    zs : dict
+      Latent variable dictionary, with an outer dimension of size
+      ``n_particles`` for each value.
+
+    Returns
+    -------
+    tf.Tensor
+      A vector of ``n_particles`` log-likelihoods.
+    """
+    if self.model_wrapper is None:
+      scope = 'inference_' + str(id(self))
+      log_lik = tf.zeros([self.n_particles])
+      # Form dictionary in order to replace conditioning on prior or
+      # observed variable with conditioning on the particles or
+      # observed data.
+      dict_swap = zs.copy()
+      for x, obs in six.iteritems(self.data):
+        if isinstance(x, RandomVariable) or isinstance(x, tf.Tensor):
+          dict_swap[x] = tf.cast(obs, x.dtype)
+
+      for x, obs in six.iteritems(self.data):
+        if isinstance(x, RandomVariable):
+          x_copy = copy(x, dict_swap, scope=scope)
+          log_lik += tf.reduce_sum(
+              tf.reshape(x_copy.log_prob(dict_swap[x]),
+                         [self.n_particles, -1]), 1)
+
+      return log_lik
+    else:
+      return self.model_wrapper.log_lik(self.data, zs)
+
+  def _resample(self, log_w, u=None):
+    """Systematic resampling. It returns the index of the ancestor of
+    each new particle, using O(``n_particles``) operations. The offset
+    ``u`` of the points is drawn uniformly on [0, 1) if not given."""
+    P = self.n_particles
+    cdf = tf.cumsum(tf.exp(log_w))
+    cdf = cdf / cdf[P - 1]
+    # The new particles are located at the points (i + u) / P for
+    # i = 0, ..., P - 1. Count the points below each cumulative weight.
+    if u is None:
+      u = tf.random_uniform([])
+
+    counts = tf.cast(tf.clip_by_value(tf.ceil(P * cdf - u), 0.0, P),
+                     tf.int32)
+    # The ancestor of the ith point is the number of particles whose
+    # count is at most i.
+    hist = tf.unsorted_segment_sum(tf.ones([P], dtype=tf.int32), counts,
+                                   P + 1)
+    idx = tf.cumsum(hist)[:P]
+    return tf.minimum(idx, P - 1)
@@ -0,0 +1,207 @@
+"""The Empirical distribution class."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow.contrib.distributions.python.ops import \
+    distribution
+from tensorflow.python.framework import constant_op
+from tensorflow.python.framework import dtypes
+from tensorflow.python.framework import ops
+from tensorflow.python.framework import tensor_shape
+from tensorflow.python.ops import array_ops
+from tensorflow.python.ops import math_ops
+from tensorflow.python.ops import random_ops
+
+import tensorflow as tf
+
+
+class Empirical(distribution.Distribution):
+  """Empirical distribution over a collection of samples, such as
+  the output of a Monte Carlo algorithm.
+
+  The samples are stored along the outer dimension of ``params``. If
+  ``params`` is a ``tf.Variable``, it is kept as is so that samplers
+  can write into it with ``tf.scatter_update``. Samples may be stored
+  as ``tf.float16`` to halve the memory of long traces; all outputs
+  are then cast to ``tf.float32``.
+  """
+  def __init__(self,
+               params,
+               validate_args=True,
+               allow_nan_stats=False,
+               name="Empirical"):
+    self._allow_nan_stats = allow_nan_stats
+    self._validate_args = validate_args
+    with ops.op_scope([params], name):
+      if not isinstance(params, tf.Variable):
+        params = ops.convert_to_tensor(params)
+
+      self._name = name
+      self._params = params
+      if params.dtype.base_dtype == dtypes.float16:
+        self._dtype = dtypes.float32
+      else:
+        self._dtype = params.dtype.base_dtype
+
+      self._n = array_ops.shape(params)[0]
+      self._batch_shape = params.get_shape()[1:]
+      self._event_shape = tensor_shape.TensorShape([])
+
+  @property
+  def allow_nan_stats(self):
+    """Boolean describing behavior when a stat is undefined for batch member."""
+    return self._allow_nan_stats
+
+  @property
+  def validate_args(self):
+    """Boolean describing behavior on invalid input."""
+    return self._validate_args
+
+  @property
+  def name(self):
+    return self._name
+
+  @property
+  def dtype(self):
+    return self._dtype
+
+  def batch_shape(self, name="batch_shape"):
+    """Batch dimensions of this instance as a 1-D int32 `Tensor`.
+
+    The product of the dimensions of the `batch_shape` is the number of
+    independent distributions of this kind the instance represents.
+
+    Args:
+      name: name to give to the op.
+
+    Returns:
+      `Tensor` `batch_shape`
+    """
+    with ops.name_scope(self.name):
+      with ops.op_scope([], name):
+        return array_ops.shape(self._params)[1:]
+
+  def get_batch_shape(self):
+    """`TensorShape` available at graph construction time.
+
+    Same meaning as `batch_shape`. May be only partially defined.
+
+    Returns:
+      batch shape
+    """
+    return self._batch_shape
+
+  def event_shape(self, name="event_shape"):
+    """Shape of a sample from a single distribution as a 1-D int32 `Tensor`.
+
+    Args:
+      name: name to give to the op.
+
+    Returns:
+      `Tensor` `event_shape`
+    """
+    with ops.name_scope(self.name):
+      with ops.op_scope([], name):
+        return constant_op.constant([], dtype=dtypes.int32)
+
+  def get_event_shape(self):
+    """`TensorShape` available at graph construction time.
+
+    Same meaning as `event_shape`. May be only partially defined.
+
+    Returns:
+      event shape
+    """
+    return self._event_shape
+
+  @property
+  def params(self):
+    """Distribution parameter, the collection of samples."""
+    return self._params
+
+  @property
+  def n(self):
+    """Number of samples."""
+    return self._n
+
+  def mean(self, name="mean"):
+    """Mean of this distribution."""
+    with ops.name_scope(self.name):
+      with ops.op_scope([self._params], name):
+        return math_ops.reduce_mean(self._samples(), 0)
+
+  def std(self, name="std"):
+    """Standard deviation of this distribution."""
+    with ops.name_scope(self.name):
+      with ops.op_scope([self._params], name):
+        return math_ops.sqrt(self.variance())
+
+  def variance(self, name="variance"):
+    """Variance of this distribution."""
+    with ops.name_scope(self.name):
+      with ops.op_scope([self._params], name):
+        samples = self._samples()
+        return math_ops.reduce_mean(
+            math_ops.square(samples - math_ops.reduce_mean(samples, 0)), 0)
+
+  def mode(self, name="mode"):
+    """Mode of this distribution."""
+    raise NotImplementedError()
+
+  def log_prob(self, x, name="log_prob"):
+    """Log prob of observations in `x` under this distribution.
+
+    The empirical distribution has no density, so this is not
+    implemented.
+    """
+    raise NotImplementedError()
+
+  def cdf(self, x, name="cdf"):
+    """CDF of observations in `x` under this distribution."""
+    raise NotImplementedError()
+
+  def log_cdf(self, x, name="log_cdf"):
+    """Log CDF of observations `x` under this distribution."""
+    raise NotImplementedError()
+
+  def entropy(self, name="entropy"):
+    """The entropy of this distribution."""
+    raise NotImplementedError()
+
+  def sample_n(self, n, seed=None, name="sample_n"):
+    """Sample `n` observations by drawing uniformly with replacement
+    from the collection of samples.
+
+    Args:
+      n: `Scalar`, type int32, the number of observations to sample.
+      seed: Python integer, the random seed.
+      name: The name to give this op.
+
+    Returns:
+      samples: `[n, ...]`, a `Tensor` of `n` samples for each
+        of the distributions determined by the hyperparameters.
+    """
+    with ops.name_scope(self.name):
+      with ops.op_scope([self._params, n], name):
+        # Draw all indices at once and gather the rows in one op.
+        idx = math_ops.cast(
+            math_ops.floor(random_ops.random_uniform(
+                array_ops.expand_dims(n, 0), seed=seed) *
+                math_ops.cast(self._n, dtypes.float32)),
+            dtypes.int32)
+        idx = math_ops.minimum(idx, self._n - 1)
+        return math_ops.cast(array_ops.gather(self._params, idx),
+                             self._dtype)
+
+  @property
+  def is_reparameterized(self):
+    return False
+
+  @property
+  def is_continuous(self):
+    return False
+
+  def _samples(self):
+    return math_ops.cast(self._params, self._dtype)
@@ -2,19 +2,262 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import hashlib
+import multiprocessing
 import numpy as np
+import os
+import re
 import six
+import tempfile
 import tensorflow as tf
+import threading
+import uuid
 
 from edward.util import get_dims, get_session
 
+from functools import partial
+from six.moves import cPickle as pickle
+
 try:
   import pystan
   from collections import OrderedDict
+  from scipy.special import expit
+except ImportError:
+  pass
+
+try:
+  import theano
 except ImportError:
   pass
 
 
+def _batch(func, n_data):
+  """Return a function which evaluates ``func`` at each sample in a
+  batch. Its inputs after the first ``n_data`` have a leading sample
+  dimension, and its outputs are stacked along it."""
+  def batch_func(*args):
+    data = list(args[:n_data])
+    params = args[n_data:]
+    outputs = [func(*(data + [param[s] for param in params]))
+               for s in range(len(params[0]))]
+    if isinstance(outputs[0], list):
+      return [np.stack([output[i] for output in outputs])
+              for i in range(len(outputs[0]))]
+    else:
+      return np.stack(outputs)
+
+  return batch_func
+
+
+def _py_func(func, inputs, grad_func=None, n_data=0, batch=False):
+  """Wrap a Python function of NumPy arrays, returning a scalar, as a
+  TensorFlow op.
+
+  Parameters
+  ----------
+  func : function
+    Python function taking the values of ``inputs`` and returning a
+    np.float32 scalar.
+  inputs : list of tf.Tensor
+    Inputs to the function. The first ``n_data`` of them are data,
+    which have no gradient.
+  grad_func : function, optional
+    Python function taking the values of ``inputs`` and returning a
+    list of the gradients of ``func`` with respect to each input
+    after the first ``n_data``, as np.float32 arrays. If specified,
+    it is registered as the gradient of the op.
+  n_data : int, optional
+    Number of data inputs.
+  batch : bool, optional
+    Whether inputs after the first ``n_data`` have a leading sample
+    dimension. If so, ``func`` and ``grad_func`` are evaluated at each
+    sample within a single op.
+
+  Returns
+  -------
+  tf.Tensor
+    Scalar, the output of ``func``, or a vector of its output at
+    each sample if ``batch``.
+  """
+  if batch:
+    func = _batch(func, n_data)
+    if grad_func is not None:
+      grad_func = _batch(grad_func, n_data)
+
+  if grad_func is None:
+    return tf.py_func(func, inputs, [tf.float32])[0]
+
+  # Gradients are registered by op type, so register a gradient for
+  # this op alone under a unique name.
+  grad_name = 'PyFuncGrad_' + uuid.uuid4().hex
+
+  @tf.RegisterGradient(grad_name)
+  def _grad(op, grad):
+    params = op.inputs[n_data:]
+    grads = tf.py_func(grad_func, list(op.inputs),
+                       [tf.float32] * len(params))
+    grad_grads = []
+    for g, param in zip(grads, params):
+      # Broadcast the output's gradient, which has one element per
+      # sample if batched, along the dimensions of the parameter.
+      shape = tf.concat(0, [tf.shape(grad), tf.ones(
+          tf.expand_dims(tf.rank(param) - tf.rank(grad), 0), tf.int32)])
+      g = tf.reshape(grad, shape) * tf.reshape(g, tf.shape(param))
+      grad_grads.append(tf.cast(g, param.dtype))
+
+    return [None] * n_data + grad_grads
+
+  with tf.get_default_graph().gradient_override_map({'PyFunc': grad_name}):
+    return tf.py_func(func, inputs, [tf.float32])[0]
+
+
+def _stan_parameters(model_code):
+  """Parse the parameters block of a Stan program.
+
+  Returns a list of the name, transform, and number of vector or
+  matrix dimensions of each parameter, in order of declaration. The
+  transform is ``'identity'``, ``'lower'``, ``'upper'``, or
+  ``'lower_upper'`` for reals, vectors, and matrices with the given
+  bounds, and None for any other constrained type.
+  """
+  # Remove comments, then take the block which follows the start or
+  # a closing brace, unlike ``transformed parameters``.
+  code = re.sub(r'/\*.*?\*/', '', model_code, flags=re.DOTALL)
+  code = re.sub(r'(//|#)[^\n]*', '', code)
+  block = re.search(r'(?:^|\})\s*parameters\s*\{([^}]*)\}', code)
+  if block is None:
+    return []
+
+  declaration = re.compile(
+      r'^(\w+)\s*(<[^>]*>)?\s*(\[[^\]]*\])?\s*(\w+)\s*(\[[^\]]*\])?$')
+  parameters = []
+  for statement in block.group(1).split(';'):
+    statement = statement.strip()
+    if not statement:
+      continue
+
+    match = declaration.match(statement)
+    if match is None:
+      raise ValueError("Cannot parse the Stan declaration " + statement)
+
+    base_type, bounds, _, name, _ = match.groups()
+    rank = {'vector': 1, 'row_vector': 1, 'matrix': 2}.get(base_type, 0)
+    keys = re.findall(r'(\w+)\s*=', bounds or '')
+    if base_type not in ['real', 'vector', 'row_vector', 'matrix'] or \
+       any([key not in ['lower', 'upper'] for key in keys]):
+      transform = None
+    elif not keys:
+      transform = 'identity'
+    else:
+      transform = '_'.join(sorted(set(keys)))
+
+    parameters.append((name, transform, rank))
+
+  return parameters
+
+
+def _stan_axes(ndim, n_array_dims):
+  """Permutation of the axes of a Stan parameter, such that its
+  flattening in row-major order follows Stan's unconstrained order:
+  array dimensions are row-major, and vector and matrix dimensions
+  are column-major."""
+  return list(range(n_array_dims)) + \
+      list(reversed(range(n_array_dims, ndim)))
+
+
+def _compile_stan(cache_dir, **kwargs):
+  """Compile a Stan program with ``pystan.StanModel``, loading it from
+  and saving it to ``cache_dir`` if specified.
+
+  Compiled models are stored under a hash of the program text, the
+  compiler settings, and the PyStan version, so that a program
+  compiles once per machine. A model which cannot be written to
+  ``cache_dir`` is returned without being cached.
+  """
+  if cache_dir is None:
+    return pystan.StanModel(**kwargs)
+
+  settings = {key: value for key, value in six.iteritems(kwargs)
+              if key not in ['file', 'model_code', 'verbose']}
+  model_code = kwargs.get('model_code')
+  if model_code is None:
+    filename = kwargs.get('file')
+    if isinstance(filename, six.string_types):
+      with open(filename, 'rb') as f:
+        model_code = f.read()
+    else:
+      model_code = filename.read()
+      kwargs['file'] = None
+      kwargs['model_code'] = model_code
+
+  if not isinstance(model_code, bytes):
+    model_code = model_code.encode('utf-8')
+
+  key = hashlib.sha256(model_code)
+  key.update(repr(sorted(settings.items())).encode('utf-8'))
+  key.update(pystan.__version__.encode('utf-8'))
+  path = os.path.join(cache_dir, key.hexdigest() + '.pkl')
+  if os.path.exists(path):
+    with open(path, 'rb') as f:
+      return pickle.load(f)
+
+  model = pystan.StanModel(**kwargs)
+  if not os.path.isdir(cache_dir):
+    try:
+      os.makedirs(cache_dir)
+    except OSError:
+      # Another process may have created it.
+      pass
+
+  # Write to a temporary file and move it into place, so that
+  # concurrent processes never read a partially written model.
+  # ``os.replace`` overwrites an existing file on all platforms; it is
+  # not available in Python 2.
+  replace = getattr(os, 'replace', os.rename)
+  try:
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+  except OSError:
+    return model
+
+  try:
+    with os.fdopen(fd, 'wb') as f:
+      pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    replace(tmp_path, path)
+  except OSError:
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+
+  return model
+
+
+# State of a worker process in the pool of a ``PythonModel``.
+_pool_model = None
+_pool_xs = None
+
+
+def _init_pool(model, xs_keys, buffers):
+  """Initialize a worker process with the model and views of the data
+  in shared memory."""
+  global _pool_model, _pool_xs
+  _pool_model = model
+  _pool_xs = {key: np.frombuffer(buf, dtype=dtype).reshape(shape)
+              for key, (buf, dtype, shape) in zip(xs_keys, buffers)}
+
+
+def _pool_log_prob(zs):
+  """Evaluate the model's log density in a worker process."""
+  return _pool_model._py_log_prob(_pool_xs, zs)
+
+
+def _same_data(xs, ys):
+  """Return whether two data dictionaries have the same values."""
+  if ys is None or set(six.iterkeys(xs)) != set(six.iterkeys(ys)):
+    return False
+
+  return all([np.array_equal(xs[key], ys[key]) for key in six.iterkeys(xs)])
+
+
 class PyMC3Model(object):
   """Model wrapper for models written in PyMC3.
   """
@@ -26,11 +269,26 @@ class PyMC3Model(object):
       The probability model, written with Theano shared
       variables to form any observations and with
       `transform=None` for any latent variables. The Theano
-      shared variables are set during inference, and all latent
-      variables live on their original (constrained) space.
+      shared variables are replaced with their realizations during
+      inference, and all latent variables live on their original
+      (constrained) space.
     """
     self.model = model
     self.n_vars = None
+    # Compiled log density and its gradient, as functions of the data
+    # and latent variables, for each ordered set of keys.
+    self._functions = {}
+    # Copies of the compiled functions for each thread.
+    self._local = threading.local()
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    del state['_local']
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._local = threading.local()
 
   def log_prob(self, xs, zs):
     """
@@ -53,40 +311,141 @@ class PyMC3Model(object):
     Notes
     -----
     It wraps around a Python function. The Python function takes
-    inputs of type np.ndarray and outputs a np.ndarray.
+    inputs of type np.ndarray and outputs a np.ndarray. Its gradient
+    with respect to ``zs`` is the gradient of the model's ``logpt``.
+
+    The log density and its gradient are compiled once by Theano, as
+    functions which take the data as inputs rather than reading the
+    Theano shared variables. Each thread calls its own copy of them,
+    so that the wrapper can be evaluated concurrently.
     """
+    return self._log_prob(xs, zs)
+
+  def batch_log_prob(self, xs, zs):
+    """Log joint density at a batch of samples of the latent variables,
+    evaluated in a single Python call.
+
+    Parameters
+    ----------
+    xs : dict
+      Data dictionary, as in ``log_prob``.
+    zs : dict of str to tf.Tensor
+      Latent variable dictionary, as in ``log_prob``, where each
+      realization has a leading dimension of samples.
+
+    Returns
+    -------
+    tf.Tensor
+      Vector, the log joint density log p(xs, zs) at each sample.
+    """
+    return self._log_prob(xs, zs, batch=True)
+
+  def _log_prob(self, xs, zs, batch=False):
     # Store keys so that ``_py_log_prob_args`` knows how each
     # value corresponds to a key.
     self.xs_keys = list(six.iterkeys(xs))
     self.zs_keys = list(six.iterkeys(zs))
+    keys = (tuple(self.xs_keys), tuple(self.zs_keys))
+    if keys not in self._functions:
+      self._functions[keys] = self._compile(*keys)
 
     # Pass in all tensors as a flattened list for tf.py_func().
     inputs = [tf.convert_to_tensor(x) for x in six.itervalues(xs)]
     inputs += [tf.convert_to_tensor(z) for z in six.itervalues(zs)]
 
-    return tf.py_func(self._py_log_prob_args, inputs, [tf.float32])[0]
-
-  def _py_log_prob_args(self, *args):
-    xs_values = args[:len(self.xs_keys)]
-    zs_values = args[len(self.xs_keys):]
-
-    # Set data placeholders in PyMC3 model (Theano shared
-    # variable) to their realizations (NumPy array).
-    for key, value in zip(self.xs_keys, xs_values):
-      key.set_value(value)
+    return _py_func(partial(self._py_log_prob_args, keys), inputs,
+                    partial(self._py_grad_log_prob_args, keys),
+                    n_data=len(self.xs_keys), batch=batch)
+
+  def _compile(self, xs_keys, zs_keys):
+    """Compile the log density and its gradient as Theano functions of
+    the data, replacing the shared variables ``xs_keys``, and of the
+    latent variables named ``zs_keys``."""
+    xs = [key.type() for key in xs_keys]
+    zs = [self.model.named_vars[key] for key in zs_keys]
+    logp = theano.clone(self.model.logpt, replace=dict(zip(xs_keys, xs)))
+    logp_fn = theano.function(xs + zs, logp, on_unused_input='ignore',
+                              allow_input_downcast=True)
+    dlogp_fn = theano.function(xs + zs, theano.grad(logp, zs),
+                               on_unused_input='ignore',
+                               allow_input_downcast=True)
+    return logp_fn, dlogp_fn
+
+  def _thread_functions(self, keys):
+    """Return this thread's copies of the compiled functions."""
+    if not hasattr(self._local, 'functions'):
+      self._local.functions = {}
+
+    if keys not in self._local.functions:
+      self._local.functions[keys] = tuple(
+          fn.copy() for fn in self._functions[keys])
+
+    return self._local.functions[keys]
+
+  def _py_log_prob_args(self, keys, *args):
+    # Calculate model's log density, passing in the data and latent
+    # variables (NumPy arrays) as inputs.
+    logp_fn, _ = self._thread_functions(keys)
+    lp = logp_fn(*args)
+    return np.asarray(lp, dtype=np.float32)
 
-    # Calculate model's log density using a dictionary of latent
-    # variables.
-    z = {key: value for key, value in zip(self.zs_keys, zs_values)}
-    lp = self.model.fastlogp(z)
-    return lp.astype(np.float32)
+  def _py_grad_log_prob_args(self, keys, *args):
+    _, dlogp_fn = self._thread_functions(keys)
+    grads = dlogp_fn(*args)
+    zs_values = args[len(keys[0]):]
+    return [np.reshape(g, np.shape(value)).astype(np.float32)
+            for g, value in zip(grads, zs_values)]
 
 
 class PythonModel(object):
   """Model wrapper for models written in NumPy/SciPy.
+
+  Subclasses implement ``_py_log_prob(xs, zs)``, returning the log
+  joint density. They may also implement ``_py_grad_log_prob(xs,
+  zs)``, returning a dictionary binding each key in ``zs`` to the
+  gradient of the log joint density with respect to it. If so, it is
+  registered as the gradient of ``log_prob``, which enables
+  reparameterization gradients and gradient-based inference such as
+  MAP.
   """
-  def __init__(self):
+  def __init__(self, n_processes=None):
+    """
+    Parameters
+    ----------
+    n_processes : int, optional
+      Number of worker processes with which to evaluate
+      ``_py_log_prob`` at a batch of samples, as in
+      ``batch_log_prob``. The workers are persistent, and read the
+      data from shared memory, which is written only when the data
+      changes rather than sent to each worker. Default is to evaluate
+      all samples in this process.
+
+    Notes
+    -----
+    The workers are started when ``batch_log_prob`` is called, and
+    not while a TensorFlow session runs. They start from a fresh
+    interpreter where possible, as forking a process with a running
+    TensorFlow session is unsafe, so the model's class must be
+    importable, and scripts must guard their entry point with ``if
+    __name__ == '__main__'``.
+    """
     self.n_vars = None
+    self.n_processes = n_processes
+
+  def __getstate__(self):
+    # Worker processes get the model without its pool.
+    state = self.__dict__.copy()
+    state.pop('_pool', None)
+    state.pop('_pool_buffers', None)
+    state.pop('_pool_layout', None)
+    return state
+
+  def close(self):
+    """Terminate the worker processes, if any."""
+    if getattr(self, '_pool', None) is not None:
+      self._pool.terminate()
+      self._pool.join()
+      self._pool = None
 
   def log_prob(self, xs, zs):
     """
@@ -111,6 +470,28 @@ class PythonModel(object):
     It wraps around a Python function. The Python function takes
     inputs of type np.ndarray and outputs a np.ndarray.
     """
+    return self._log_prob(xs, zs)
+
+  def batch_log_prob(self, xs, zs):
+    """Log joint density at a batch of samples of the latent variables,
+    evaluated in a single Python call.
+
+    Parameters
+    ----------
+    xs : dict
+      Data dictionary, as in ``log_prob``.
+    zs : dict of str to tf.Tensor
+      Latent variable dictionary, as in ``log_prob``, where each
+      realization has a leading dimension of samples.
+
+    Returns
+    -------
+    tf.Tensor
+      Vector, the log joint density log p(xs, zs) at each sample.
+    """
+    return self._log_prob(xs, zs, batch=True)
+
+  def _log_prob(self, xs, zs, batch=False):
     # Store keys so that ``_py_log_prob_args`` knows how each
     # value corresponds to a key.
     self.xs_keys = list(six.iterkeys(xs))
@@ -120,7 +501,21 @@ class PythonModel(object):
     inputs = [tf.convert_to_tensor(x) for x in six.itervalues(xs)]
     inputs += [tf.convert_to_tensor(z) for z in six.itervalues(zs)]
 
-    return tf.py_func(self._py_log_prob_args, inputs, [tf.float32])[0]
+    if hasattr(self, '_py_grad_log_prob'):
+      grad_func = self._py_grad_log_prob_args
+    else:
+      grad_func = None
+
+    if batch and getattr(self, 'n_processes', None):
+      self._start_pool(inputs[:len(self.xs_keys)])
+      if grad_func is not None:
+        grad_func = _batch(grad_func, len(self.xs_keys))
+
+      return _py_func(self._py_pool_log_prob_args, inputs, grad_func,
+                      n_data=len(self.xs_keys))
+
+    return _py_func(self._py_log_prob_args, inputs, grad_func,
+                    n_data=len(self.xs_keys), batch=batch)
 
   def _py_log_prob_args(self, *args):
     # Convert from flattened list to dictionaries for use in a
@@ -132,6 +527,63 @@ class PythonModel(object):
     lp = self._py_log_prob(xs, zs)
     return np.asarray(lp, dtype=np.float32)
 
+  def _start_pool(self, xs_tensors):
+    """Start the worker processes, with a buffer in shared memory for
+    each data tensor, unless they are running with the same layout."""
+    layout = []
+    for key, value in zip(self.xs_keys, xs_tensors):
+      shape = value.get_shape()
+      if not shape.is_fully_defined():
+        raise ValueError("Evaluating in worker processes requires data "
+                         "of known shape; " + str(key) + " has shape " +
+                         str(shape) + ".")
+
+      layout.append((np.dtype(value.dtype.as_numpy_dtype),
+                     tuple(shape.as_list())))
+
+    if getattr(self, '_pool', None) is not None and \
+       self._pool_layout == layout:
+      return
+
+    self.close()
+    # Start the workers from a fresh interpreter if possible, as forking
+    # a process with a running TensorFlow session is unsafe.
+    if hasattr(multiprocessing, 'get_context'):
+      ctx = multiprocessing.get_context('spawn')
+    else:
+      ctx = multiprocessing
+
+    self._pool_buffers = [
+        (ctx.RawArray('b', max(int(np.prod(shape)) * dtype.itemsize, 1)),
+         dtype, shape) for dtype, shape in layout]
+    self._pool_layout = layout
+    self._pool = ctx.Pool(self.n_processes, _init_pool,
+                          (self, self.xs_keys, self._pool_buffers))
+
+  def _py_pool_log_prob_args(self, *args):
+    xs_values = args[:len(self.xs_keys)]
+    zs_values = args[len(self.xs_keys):]
+
+    # Write the data into shared memory only if it changed.
+    for value, (buf, dtype, shape) in zip(xs_values, self._pool_buffers):
+      shared = np.frombuffer(buf, dtype=dtype).reshape(shape)
+      if not np.array_equal(shared, value):
+        np.copyto(shared, value)
+
+    zs = [{key: value[s] for key, value in zip(self.zs_keys, zs_values)}
+          for s in range(len(zs_values[0]))]
+    lps = self._pool.map(_pool_log_prob, zs)
+    return np.asarray(lps, dtype=np.float32)
+
+  def _py_grad_log_prob_args(self, *args):
+    xs_values = args[:len(self.xs_keys)]
+    zs_values = args[len(self.xs_keys):]
+    xs = {key: value for key, value in zip(self.xs_keys, xs_values)}
+    zs = {key: value for key, value in zip(self.zs_keys, zs_values)}
+    grads = self._py_grad_log_prob(xs, zs)
+    return [np.asarray(grads[key], dtype=np.float32).reshape(np.shape(value))
+            for key, value in zip(self.zs_keys, zs_values)]
+
   def _py_log_prob(self, xs, zs):
     raise NotImplementedError()
 
@@ -153,16 +605,35 @@ class StanModel(object):
     *args
       Passed into pystan.StanModel.
     **kwargs
-      Passed into pystan.StanModel.
+      Passed into pystan.StanModel. The keyword argument
+      ``cache_dir`` sets a directory of compiled models, e.g.,
+      ``~/.edward/stan``. A program is then compiled only if no
+      model compiled from the same program text and compiler
+      settings is in the directory. Default is None, to always
+      compile. Models are cached only if all arguments are passed
+      by keyword.
     """
-    if model is None:
+    cache_dir = kwargs.pop('cache_dir', None)
+    if model is not None:
+      self.model = model
+    elif args:
       self.model = pystan.StanModel(*args, **kwargs)
     else:
-      self.model = model
+      self.model = _compile_stan(cache_dir, **kwargs)
 
     self.modelfit = None
     self.is_initialized = False
     self.n_vars = None
+    self._fit_data = None
+    self._parameters = _stan_parameters(self.model.model_code)
+    for name, transform, _ in self._parameters:
+      if transform is None:
+        raise NotImplementedError(
+            "StanModel is only available for reals, vectors, and "
+            "matrices with lower and upper bounds; parameter " + name +
+            " has another constrained type.")
+
+    self._dims = None
 
   def log_prob(self, xs, zs):
     """
@@ -187,11 +658,46 @@ class StanModel(object):
     Notes
     -----
     It wraps around a Python function. The Python function takes
-    inputs of type np.ndarray and outputs a np.ndarray.
+    inputs of type np.ndarray and outputs a np.ndarray. Its gradient
+    with respect to ``zs`` is computed by Stan's ``grad_log_prob``
+    on the unconstrained space, and mapped to the constrained space
+    by the derivative of Stan's transform for each element. The
+    gradient is available for reals, vectors, and matrices with
+    lower and upper bounds, and arrays of them. Other constrained
+    types, such as simplexes, raise an error when the model is
+    built.
+
+    Stan's fit object is built once per data set, and reused as long
+    as the data does not change.
     """
-    print("The empty sampling message exists for accessing "
-          "Stan's log_prob method.")
-    self.modelfit = self.model.sampling(data=xs, iter=1, chains=1)
+    return self._log_prob(xs, zs)
+
+  def batch_log_prob(self, xs, zs):
+    """Log joint density at a batch of samples of the latent variables,
+    evaluated in a single Python call.
+
+    Parameters
+    ----------
+    xs : dict
+      Data dictionary, as in ``log_prob``.
+    zs : dict of str to tf.Tensor
+      Latent variable dictionary, as in ``log_prob``, where each
+      realization has a leading dimension of samples.
+
+    Returns
+    -------
+    tf.Tensor
+      Vector, the log joint density log p(xs, zs) at each sample.
+    """
+    return self._log_prob(xs, zs, batch=True)
+
+  def _log_prob(self, xs, zs, batch=False):
+    if not _same_data(xs, self._fit_data):
+      print("The empty sampling message exists for accessing "
+            "Stan's log_prob method.")
+      self.modelfit = self.model.sampling(data=xs, iter=1, chains=1)
+      self._fit_data = xs
+
     if not self.is_initialized:
       self._initialize()
 
@@ -202,12 +708,17 @@ class StanModel(object):
     # Pass in all tensors as a flattened list for tf.py_func().
     inputs = [tf.convert_to_tensor(z) for z in six.itervalues(zs)]
 
-    return tf.py_func(self._py_log_prob_args, inputs, [tf.float32])[0]
+    return _py_func(self._py_log_prob_args, inputs,
+                    self._py_grad_log_prob_args, batch=batch)
 
   def _initialize(self):
     self.is_initialized = True
     self.n_vars = sum([sum(dim) if sum(dim) != 0 else 1
                        for dim in self.modelfit.par_dims])
+    # The fit has the dimensions of each parameter, which may depend
+    # on the data.
+    par_dims = dict(zip(self.modelfit.model_pars, self.modelfit.par_dims))
+    self._dims = [list(par_dims[name]) for name, _, _ in self._parameters]
 
   def _py_log_prob_args(self, *args):
     zs_values = args
@@ -220,3 +731,74 @@ class StanModel(object):
     z_unconst = self.modelfit.unconstrain_pars(z)
     lp = self.modelfit.log_prob(z_unconst, adjust_transform=False)
     return np.asarray(lp, dtype=np.float32)
+
+  def _py_grad_log_prob_args(self, *args):
+    zs_values = [np.asarray(value, dtype=np.float64) for value in args]
+    z = {key: value for key, value in zip(self.zs_keys, zs_values)}
+    z_unconst = np.asarray(self.modelfit.unconstrain_pars(z),
+                           dtype=np.float64)
+    grad_unconst = np.asarray(
+        self.modelfit.grad_log_prob(z_unconst, adjust_transform=False))
+
+    # Each transform acts element-wise, so by the chain rule the
+    # gradient on the constrained space is the gradient on the
+    # unconstrained space divided by the derivative of the transform.
+    grad = grad_unconst / self._transform_derivative(z, z_unconst)
+
+    # Unflatten the gradient, which follows the order of declaration
+    # and Stan's unconstrained order, to each latent variable.
+    grads = {}
+    start = 0
+    for (name, _, rank), dims in zip(self._parameters, self._dims):
+      size = int(np.prod(dims))
+      axes = _stan_axes(len(dims), len(dims) - rank)
+      g = grad[start:start + size].reshape([dims[i] for i in axes])
+      g = np.transpose(g, np.argsort(axes))
+      grads[name] = g.reshape(np.shape(z[name]))
+      start += size
+
+    return [grads[key].astype(np.float32) for key in self.zs_keys]
+
+  def _flatten(self, pars):
+    """Flatten a dictionary of parameters to Stan's unconstrained
+    order."""
+    flat = []
+    for (name, _, rank), dims in zip(self._parameters, self._dims):
+      value = np.reshape(np.asarray(pars[name], dtype=np.float64), dims)
+      flat.append(np.ravel(np.transpose(
+          value, _stan_axes(len(dims), len(dims) - rank))))
+
+    return np.concatenate(flat)
+
+  def _transform_derivative(self, z, z_unconst):
+    """Derivative of the constrained value of each element with respect
+    to its unconstrained value."""
+    transforms = []
+    for (_, transform, _), dims in zip(self._parameters, self._dims):
+      transforms += [transform] * int(np.prod(dims))
+
+    transforms = np.asarray(transforms)
+    derivative = np.ones(len(z_unconst))
+    # x = lower + exp(u), and x = upper - exp(u).
+    lower = transforms == 'lower'
+    derivative[lower] = np.exp(z_unconst[lower])
+    upper = transforms == 'upper'
+    derivative[upper] = -np.exp(z_unconst[upper])
+    # x = lower + (upper - lower) expit(u), so the derivative is
+    # (upper - lower) expit(u) expit(-u). The bounds may depend on
+    # the data, so we get their difference from the constrained
+    # values at a second point, one unit towards zero.
+    both = transforms == 'lower_upper'
+    if np.any(both):
+      u = z_unconst[both]
+      step = np.where(u > 0, -1.0, 1.0)
+      u_step = z_unconst.copy()
+      u_step[both] = u + step
+      x = self._flatten(z)[both]
+      x_step = self._flatten(self.modelfit.constrain_pars(u_step))[both]
+      # expit(u + step) - expit(u), without cancellation in the tails.
+      diff = np.where(u > 0, expit(-u) - expit(-u - step),
+                      expit(u + step) - expit(u))
+      derivative[both] = (x_step - x) / diff * expit(u) * expit(-u)
+
+    return derivative
@@ -4,6 +4,7 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from edward.models.empirical import Empirical as distributions_Empirical
 from edward.models.point_mass import PointMass as distributions_PointMass
 from edward.models.random_variable import RandomVariable
 from edward.util import get_session
@@ -266,3 +267,33 @@ class PointMass(RandomVariable):
       return "params: \n" + params.__str__()
     except:
       return super(PointMass, self).__str__()
+
+
+class Empirical(RandomVariable):
+  """Empirical random variable, backed by a collection of samples.
+
+  Examples
+  --------
+  >>> qz = Empirical(params=tf.Variable(tf.zeros([T, K])))
+  >>> qz.mean()  # averages over the T samples
+  >>> qz.value()  # draws one of the T samples
+  """
+  def __init__(self, *args, **kwargs):
+    super(Empirical, self).__init__(distributions_Empirical, *args, **kwargs)
+
+  def __str__(self):
+    try:
+      sess = get_session()
+      mean, std = sess.run([self.distribution.mean(), self.distribution.std()])
+      return "mean: \n" + mean.__str__() + "\n" + \
+             "std: \n" + std.__str__()
+    except:
+      return super(Empirical, self).__str__()
+
+  @property
+  def params(self):
+    return self.distribution.params
+
+  @property
+  def n(self):
+    return self.distribution.n
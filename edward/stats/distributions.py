@@ -3,15 +3,201 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
+import six
 import tensorflow as tf
 
 from edward.util import get_dims
-from itertools import product
+from functools import wraps
 from scipy import stats
 
 distributions = tf.contrib.distributions
 
 
+def _sparse_gather(param, x):
+  """Gather the elements of ``param``, broadcast to the shape of the
+  ``tf.SparseTensor`` ``x``, at the indices of ``x``."""
+  if not isinstance(param, (tf.Tensor, tf.Variable, np.ndarray, list)):
+    return param
+
+  param = tf.convert_to_tensor(param)
+  shape = param.get_shape().as_list()
+  if len(shape) == 0:
+    return param
+
+  # Compute the position in the flattened parameter of each entry,
+  # skipping dimensions which are broadcast.
+  rank = x.indices.get_shape()[1].value
+  shape = [1] * (rank - len(shape)) + shape
+  indices = tf.unpack(tf.transpose(x.indices), num=rank)
+  flat_idx = tf.zeros_like(indices[0])
+  stride = 1
+  for i in reversed(range(rank)):
+    if shape[i] != 1:
+      flat_idx += indices[i] * stride
+      stride *= shape[i]
+
+  return tf.gather(tf.reshape(param, [-1]), flat_idx)
+
+
+def _factorization_entries(x, s, t):
+  """Return the values of the ``tf.SparseTensor`` ``x`` and the inner
+  products :math:`s_i^T t_j` at their indices."""
+  rows, cols = tf.unpack(tf.transpose(x.indices), num=2)
+  x_values = tf.cast(x.values, dtype=tf.float32)
+  mu = tf.reduce_sum(tf.gather(s, rows) * tf.gather(t, cols), 1)
+  return x_values, mu
+
+
+def _cast_compact(value, dtype):
+  """Cast observations stored in a compact dtype, such as booleans or
+  small integers, to the dtype of the distribution. The cast happens
+  when the density is evaluated, so that the data itself stays
+  compact."""
+  if isinstance(value, (tf.Tensor, tf.Variable)):
+    base_dtype = value.dtype.base_dtype
+    if base_dtype != dtype and (base_dtype.is_integer or
+                                base_dtype == tf.bool):
+      return tf.cast(value, dtype)
+
+  return value
+
+
+def _log_ndtr(z):
+  """Log of the standard normal cumulative distribution function,
+  which is stable in the lower tail."""
+  # Below ``lower``, erfc underflows in single precision, so we use
+  # the asymptotic series of the Mills ratio. Each branch only sees
+  # inputs in its own range, so that gradients remain finite.
+  lower = -10.0
+  z_mid = tf.maximum(z, lower)
+  z_tail = tf.minimum(z, lower)
+  log_mid = tf.log(0.5 * tf.erfc(-z_mid / np.sqrt(2.0)))
+  z2 = tf.square(z_tail)
+  log_tail = -0.5 * z2 - 0.5 * np.log(2.0 * np.pi) - tf.log(-z_tail) + \
+      tf.log(1.0 - 1.0 / z2 + 3.0 / tf.square(z2) - 15.0 / tf.pow(z2, 3))
+  return tf.select(tf.greater(z, lower), log_mid, log_tail)
+
+
+def _log_ndtr_diff(a, b):
+  """Log of the standard normal probability of the interval (a, b).
+  Intervals in the upper tail are reflected into the lower tail,
+  where ``_log_ndtr`` is accurate."""
+  a, b = a + tf.zeros_like(b), b + tf.zeros_like(a)
+  flip = tf.greater(a, 0.0)
+  lo = tf.select(flip, -b, a)
+  hi = tf.select(flip, -a, b)
+  log_hi = _log_ndtr(hi)
+  return log_hi + tf.log(1.0 - tf.exp(_log_ndtr(lo) - log_hi))
+
+
+def _polyval(coeffs, x):
+  """Evaluate a polynomial, with coefficients from the highest
+  degree, using Horner's method."""
+  out = coeffs[0]
+  for coeff in coeffs[1:]:
+    out = out * x + coeff
+
+  return out
+
+
+def _log_ndtri(log_p):
+  """Inverse of the standard normal cumulative distribution function,
+  taking the log-probability so that the lower tail is accurate.
+
+  It uses the rational approximation of Acklam (2003), with relative
+  error below 1.15e-9.
+  """
+  a = [-3.969683028665376e+01, 2.209460984245205e+02,
+       -2.759285104469687e+02, 1.383577518672690e+02,
+       -3.066479806614716e+01, 2.506628277459239e+00]
+  b = [-5.447609879822406e+01, 1.615858368580409e+02,
+       -1.556989798598866e+02, 6.680131188771972e+01,
+       -1.328068155288572e+01, 1.0]
+  c = [-7.784894002430293e-03, -3.223964580411365e-01,
+       -2.400758277161838e+00, -2.549732539343734e+00,
+       4.374664141464968e+00, 2.938163982698783e+00]
+  d = [7.784695709041462e-03, 3.224671290700398e-01,
+       2.445134137142996e+00, 3.754408661907416e+00, 1.0]
+  p_low = 0.02425
+  p = tf.exp(log_p)
+  q = tf.sqrt(-2.0 * tf.minimum(log_p, np.log(p_low)))
+  x_lower = _polyval(c, q) / _polyval(d, q)
+  q = tf.minimum(tf.maximum(p, p_low), 1.0 - p_low) - 0.5
+  r = tf.square(q)
+  x_mid = _polyval(a, r) * q / _polyval(b, r)
+  q = tf.sqrt(-2.0 * tf.log(tf.maximum(tf.minimum(1.0 - p, p_low),
+                                       np.finfo(np.float32).tiny)))
+  x_upper = -_polyval(c, q) / _polyval(d, q)
+  return tf.select(tf.less(p, p_low), x_lower,
+                   tf.select(tf.greater(p, 1.0 - p_low), x_upper, x_mid))
+
+
+def _rvs_shape(size, *params):
+  """Return the shape of ``size`` samples of random variables whose
+  parameters broadcast together, with the samples along the first
+  dimension."""
+  return (size, ) + np.broadcast(*params).shape
+
+
+def _sparse_support(log_prob):
+  """Let a log density take a ``tf.SparseTensor`` of observations,
+  whose entries which are not stored are zero.
+
+  By default, it returns the log density summed over all entries of
+  the dense shape, as a scalar. The sum decomposes into a correction
+  at the stored entries, with the parameters gathered at their
+  indices, and the log density of zero, which is evaluated once over
+  the broadcast shape of the parameters and replicated over the dense
+  shape. The cost scales with the number of entries and the size of
+  the parameters rather than the dense shape.
+
+  With ``missing='implicit'``, entries which are not stored are
+  missing rather than zero. It returns a vector with one element per
+  stored entry. It is required for a minibatch of nonzero entries, as
+  formed by inference with ``sparse_minibatch='nonzero'``: the zeros
+  of the full data are not in the minibatch, and are accounted for
+  separately, e.g., with ``negative_sampling_logpmf``.
+  """
+  @wraps(log_prob)
+  def wrapper(self, x, *args, **kwargs):
+    missing = kwargs.pop('missing', None)
+    if not isinstance(x, tf.SparseTensor):
+      return log_prob(self, x, *args, **kwargs)
+
+    if missing not in (None, 'implicit'):
+      raise ValueError("missing must be None or 'implicit'.")
+
+    if missing is None and x.values.name in \
+       [values.name for values in tf.get_collection('NONZERO_MINIBATCHES')]:
+      raise ValueError("A minibatch of nonzero entries requires "
+                       "missing='implicit'.")
+
+    entry_args = [_sparse_gather(arg, x) for arg in args]
+    entry_kwargs = {key: _sparse_gather(value, x)
+                    for key, value in six.iteritems(kwargs)}
+    log_entries = log_prob(self, x.values, *entry_args, **entry_kwargs)
+    if missing == 'implicit':
+      return log_entries
+
+    log_zero_entries = log_prob(self, tf.zeros_like(x.values),
+                                *entry_args, **entry_kwargs)
+    # Zeros of the broadcast shape of the parameters, of the same rank
+    # as ``x``.
+    rank = x.indices.get_shape()[1].value
+    zeros = tf.zeros([1] * rank)
+    for param in list(args) + list(six.itervalues(kwargs)):
+      if isinstance(param, (tf.Tensor, tf.Variable, np.ndarray, list)):
+        zeros = zeros + tf.zeros_like(tf.cast(param, dtype=tf.float32))
+
+    n_copies = tf.cast(tf.reduce_prod(x.shape), dtype=tf.float32) / \
+        tf.cast(tf.size(zeros), dtype=tf.float32)
+    log_zero = tf.reduce_sum(log_prob(self, zeros, *args, **kwargs))
+    return tf.reduce_sum(log_entries - log_zero_entries) + \
+        n_copies * log_zero
+
+  return wrapper
+
+
 class Distribution(object):
   """A light wrapper to directly call methods from
   `tf.contrib.distributions` in SciPy style.
@@ -48,20 +234,25 @@ class Distribution(object):
     rv = self._dist(*args, **kwargs)
     return rv.sample_n(n, seed)
 
+  @_sparse_support
   def log_prob(self, value, *args, **kwargs):
     rv = self._dist(*args, **kwargs)
+    value = _cast_compact(value, rv.dtype)
     return rv.log_prob(value)
 
   def prob(self, value, *args, **kwargs):
     rv = self._dist(*args, **kwargs)
+    value = _cast_compact(value, rv.dtype)
     return rv.prob(value)
 
   def log_cdf(self, value, *args, **kwargs):
     rv = self._dist(*args, **kwargs)
+    value = _cast_compact(value, rv.dtype)
     return rv.log_cdf(value)
 
   def cdf(self, value, *args, **kwargs):
     rv = self._dist(*args, **kwargs)
+    value = _cast_compact(value, rv.dtype)
     return rv.cdf(value)
 
   def entropy(self, *args, **kwargs):
@@ -84,20 +275,26 @@ class Distribution(object):
     rv = self._dist(*args, **kwargs)
     return rv.mode()
 
+  @_sparse_support
   def log_pdf(self, value, *args, **kwargs):
     rv = self._dist(*args, **kwargs)
+    value = _cast_compact(value, rv.dtype)
     return rv.log_pdf(value)
 
   def pdf(self, value, *args, **kwargs):
     rv = self._dist(*args, **kwargs)
+    value = _cast_compact(value, rv.dtype)
     return rv.pdf(value)
 
+  @_sparse_support
   def log_pmf(self, value, *args, **kwargs):
     rv = self._dist(*args, **kwargs)
+    value = _cast_compact(value, rv.dtype)
     return rv.log_pmf(value)
 
   def pmf(self, value, *args, **kwargs):
     rv = self._dist(*args, **kwargs)
+    value = _cast_compact(value, rv.dtype)
     return rv.pmf(value)
 
   def rvs(self, *args, **kwargs):
@@ -106,16 +303,87 @@ class Distribution(object):
     """
     raise NotImplementedError()
 
+  @_sparse_support
   def logpdf(self, value, *args, **kwargs):
     """Backwards compatibility with SciPy."""
     rv = self._dist(*args, **kwargs)
+    value = _cast_compact(value, rv.dtype)
     return rv.log_pdf(value)
 
+  @_sparse_support
   def logpmf(self, value, *args, **kwargs):
     """Backwards compatibility with SciPy."""
     rv = self._dist(*args, **kwargs)
+    value = _cast_compact(value, rv.dtype)
     return rv.log_pmf(value)
 
+  def negative_sampling_logpmf(self, x, params, n_negative, scale=1.0):
+    """Unbiased estimate of the log of the probability mass function
+    of a sparse matrix of pairwise observations, summed over all
+    pairs, such as edge counts of a network.
+
+    It decomposes the sum over all pairs into a correction at the
+    nonzero entries and a sum of the mass of zero over all pairs,
+
+    .. math::
+
+      \sum_{(i,j): x_{ij} \neq 0} [\log p(x_{ij}; \theta_{ij}) -
+      \log p(0; \theta_{ij})] + \sum_{i=1}^N \sum_{j=1}^M
+      \log p(0; \theta_{ij}),
+
+    and estimates the latter from ``n_negative`` pairs sampled
+    uniformly, reweighted by :math:`NM / n_{negative}`. Parameters
+    are only evaluated at the nonzero entries and the sampled pairs,
+    so the cost is :math:`O(nnz + n_{negative})` rather than
+    :math:`O(N M)`.
+
+    Parameters
+    ----------
+    x : tf.SparseTensor
+      A N x M matrix of observations, with entries for the nonzero
+      observations, or for a minibatch of them.
+    params : function
+      Function of vectors of row and column indices, returning the
+      parameter, or a list of parameters, at those pairs.
+    n_negative : int
+      Number of pairs to sample.
+    scale : float, optional
+      Ratio of the number of nonzero observations to the number of
+      entries in ``x``, if ``x`` is a minibatch of them.
+
+    Returns
+    -------
+    tf.Tensor
+      A scalar.
+
+    Examples
+    --------
+    >>> def rate(rows, cols):
+    ...   return tf.reduce_sum(tf.gather(z, rows) * tf.gather(z, cols), 1)
+    >>>
+    >>> poisson.negative_sampling_logpmf(x, rate, n_negative=1000)
+    """
+    rows, cols = tf.unpack(tf.transpose(x.indices), num=2)
+    x_values = tf.cast(x.values, dtype=tf.float32)
+    args = params(rows, cols)
+    if not isinstance(args, (list, tuple)):
+      args = [args]
+
+    log_lik = tf.reduce_sum(self.logpmf(x_values, *args) -
+                            self.logpmf(tf.zeros_like(x_values), *args))
+
+    shape = tf.cast(x.shape, dtype=tf.float64)
+    neg_rows, neg_cols = tf.unpack(tf.cast(tf.floor(
+        tf.random_uniform([2, n_negative], dtype=tf.float64) *
+        tf.expand_dims(shape, 1)), dtype=tf.int64), num=2)
+    args = params(neg_rows, neg_cols)
+    if not isinstance(args, (list, tuple)):
+      args = [args]
+
+    n_pairs = tf.cast(tf.reduce_prod(shape), dtype=tf.float32)
+    log_zero = tf.reduce_sum(self.logpmf(tf.zeros([n_negative]), *args))
+    return scale * log_lik + n_pairs / n_negative * log_zero
+
 
 class Bernoulli(Distribution):
   """Bernoulli distribution.
@@ -129,7 +397,7 @@ class Bernoulli(Distribution):
     Parameters
     ----------
     p : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`p\in(0,1)`.
     size : int
       Number of random variable samples to return.
@@ -153,15 +421,7 @@ class Bernoulli(Distribution):
     """
     if not isinstance(p, np.ndarray):
       p = np.asarray(p)
-    if len(p.shape) == 0:
-      return stats.bernoulli.rvs(p, size=size)
-
-    x = []
-    for pidx in np.nditer(p):
-      x += [stats.bernoulli.rvs(pidx, size=size)]
-
-    x = np.asarray(x).transpose()
-    return x
+    return stats.bernoulli.rvs(p, size=_rvs_shape(size, p))
 
 
 class Beta(Distribution):
@@ -176,10 +436,10 @@ class Beta(Distribution):
     Parameters
     ----------
     a : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`a > 0`.
     b : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`b > 0`.
     size : int
       Number of random variable samples to return.
@@ -193,16 +453,7 @@ class Beta(Distribution):
       a = np.asarray(a)
     if not isinstance(b, np.ndarray):
       b = np.asarray(b)
-    if len(a.shape) == 0:
-      return stats.beta.rvs(a, b, size=size)
-
-    x = []
-    for aidx, bidx in zip(np.nditer(a), np.nditer(b)):
-      x += [stats.beta.rvs(aidx, bidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    return stats.beta.rvs(a, b, size=_rvs_shape(size, a, b))
 
 
 class Binom(Distribution):
@@ -217,10 +468,10 @@ class Binom(Distribution):
     Parameters
     ----------
     n : int or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`n > 0`.
     p : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`p\in(0,1)`.
     size : int
       Number of random variable samples to return.
@@ -234,17 +485,9 @@ class Binom(Distribution):
       n = np.asarray(n)
     if not isinstance(p, np.ndarray):
       p = np.asarray(p)
-    if len(n.shape) == 0:
-      return stats.binom.rvs(n, p, size=size)
-
-    x = []
-    for nidx, pidx in zip(np.nditer(n), np.nditer(p)):
-      x += [stats.binom.rvs(nidx, pidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    return stats.binom.rvs(n, p, size=_rvs_shape(size, n, p))
 
+  @_sparse_support
   def logpmf(self, x, n, p):
     """Log of the probability density function.
     Parameters
@@ -288,7 +531,7 @@ class Chi2(Distribution):
     Parameters
     ----------
     df : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`df > 0`.
     size : int
       Number of random variable samples to return.
@@ -300,17 +543,9 @@ class Chi2(Distribution):
     """
     if not isinstance(df, np.ndarray):
       df = np.asarray(df)
-    if len(df.shape) == 0:
-      return stats.chi2.rvs(df, size=size)
-
-    x = []
-    for dfidx in np.nditer(df):
-      x += [stats.chi2.rvs(dfidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    return stats.chi2.rvs(df, size=_rvs_shape(size, df))
 
+  @_sparse_support
   def logpdf(self, x, df):
     """Log of the probability density function.
     Parameters
@@ -343,8 +578,9 @@ class Dirichlet(Distribution):
     Parameters
     ----------
     alpha : np.ndarray
-      1-D or 2-D tensor, with each :math:`\\alpha` constrained
-      to :math:`\\alpha_i > 0`.
+      n-D tensor for n > 0, where the inner (right-most) dimension
+      represents the multivariate dimension, and with each
+      :math:`\\alpha` constrained to :math:`\\alpha_i > 0`.
     size : int
       Number of random variable samples to return.
 
@@ -357,14 +593,9 @@ class Dirichlet(Distribution):
       # stats.dirichlet.rvs defaults to (size x alpha.shape)
       return stats.dirichlet.rvs(alpha, size=size)
 
-    x = []
-    # This doesn't work for non-matrix parameters.
-    for alpharow in alpha:
-      x += [stats.dirichlet.rvs(alpharow, size=size)]
-
-    # This only works for rank 3 tensor.
-    x = np.rollaxis(np.asarray(x), 1)
-    return x
+    # Normalize independent Gamma variates along the inner dimension.
+    x = stats.gamma.rvs(alpha, size=_rvs_shape(size, alpha))
+    return x / np.sum(x, axis=-1, keepdims=True)
 
 
 class DirichletMultinomial(Distribution):
@@ -387,7 +618,7 @@ class Exponential(Distribution):
     Parameters
     ----------
     scale : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`scale > 0`.
     size : int
       Number of random variable samples to return.
@@ -399,16 +630,7 @@ class Exponential(Distribution):
     """
     if not isinstance(scale, np.ndarray):
       scale = np.asarray(scale)
-    if len(scale.shape) == 0:
-      return stats.expon.rvs(scale=scale, size=size)
-
-    x = []
-    for scaleidx in np.nditer(scale):
-      x += [stats.expon.rvs(scale=scaleidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    return stats.expon.rvs(scale=scale, size=_rvs_shape(size, scale))
 
 
 class Gamma(Distribution):
@@ -425,10 +647,10 @@ class Gamma(Distribution):
     Parameters
     ----------
     a : float or np.ndarray
-      **Shape** parameter. 0-D or 1-D tensor, with all elements
+      **Shape** parameter. n-D tensor, with all elements
       constrained to :math:`a > 0`.
     scale : float or np.ndarray
-      **Scale** parameter. 0-D or 1-D tensor, with all elements
+      **Scale** parameter. n-D tensor, with all elements
       constrained to :math:`scale > 0`.
     size : int
       Number of random variable samples to return.
@@ -442,16 +664,7 @@ class Gamma(Distribution):
       a = np.asarray(a)
     if not isinstance(scale, np.ndarray):
       scale = np.asarray(scale)
-    if len(a.shape) == 0:
-      return stats.gamma.rvs(a, scale=scale, size=size)
-
-    x = []
-    for aidx, scaleidx in zip(np.nditer(a), np.nditer(scale)):
-      x += [stats.gamma.rvs(aidx, scale=scaleidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    return stats.gamma.rvs(a, scale=scale, size=_rvs_shape(size, a, scale))
 
 
 class Geom(Distribution):
@@ -466,7 +679,7 @@ class Geom(Distribution):
     Parameters
     ----------
     p : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`p\in(0,1)`.
     size : int
       Number of random variable samples to return.
@@ -478,17 +691,9 @@ class Geom(Distribution):
     """
     if not isinstance(p, np.ndarray):
       p = np.asarray(p)
-    if len(p.shape) == 0:
-      return stats.geom.rvs(p, size=size)
-
-    x = []
-    for pidx in np.nditer(p):
-      x += [stats.geom.rvs(pidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    return stats.geom.rvs(p, size=_rvs_shape(size, p))
 
+  @_sparse_support
   def logpmf(self, x, p):
     """Log of the probability mass function.
     Parameters
@@ -522,10 +727,10 @@ class InverseGamma(Distribution):
     Parameters
     ----------
     a : float or np.ndarray
-      **Shape** parameter. 0-D or 1-D tensor, with all elements
+      **Shape** parameter. n-D tensor, with all elements
       constrained to :math:`a > 0`.
     scale : float or np.ndarray
-      **Scale** parameter. 0-D or 1-D tensor, with all elements
+      **Scale** parameter. n-D tensor, with all elements
       constrained to :math:`scale > 0`.
     size : int
       Number of random variable samples to return.
@@ -542,12 +747,7 @@ class InverseGamma(Distribution):
     if len(a.shape) == 0:
       return stats.invgamma.rvs(a, scale=scale, size=size)
 
-    x = []
-    for aidx, scaleidx in zip(np.nditer(a), np.nditer(scale)):
-      x += [stats.invgamma.rvs(aidx, scale=scaleidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
+    x = stats.invgamma.rvs(a, scale=scale, size=_rvs_shape(size, a, scale))
 
     # This is temporary to avoid returning Inf values.
     x[x < 1e-10] = 0.1
@@ -575,7 +775,7 @@ class LogNorm(Distribution):
     Parameters
     ----------
     s : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`s > 0`.
     size : int
       Number of random variable samples to return.
@@ -587,17 +787,9 @@ class LogNorm(Distribution):
     """
     if not isinstance(s, np.ndarray):
       s = np.asarray(s)
-    if len(s.shape) == 0:
-      return stats.lognorm.rvs(s, size=size)
-
-    x = []
-    for sidx in np.nditer(s):
-      x += [stats.lognorm.rvs(sidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    return stats.lognorm.rvs(s, size=_rvs_shape(size, s))
 
+  @_sparse_support
   def logpdf(self, x, s):
     """Log of the probability density function.
     Parameters
@@ -632,11 +824,12 @@ class Multinomial(Distribution):
     Parameters
     ----------
     n : int or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
-      :math:`n > 0`.
+      A tensor of one less dimension than ``p``, with all elements
+      constrained to :math:`n > 0`.
     p : np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
-      :math:`\sum_i p_k = 1`.
+      n-D tensor for n > 0, where the inner (right-most) dimension
+      represents the multivariate dimension, and with all elements
+      constrained to :math:`\sum_i p_k = 1`.
     size : int
       Number of random variable samples to return.
 
@@ -652,13 +845,20 @@ class Multinomial(Distribution):
     if not isinstance(n, np.ndarray):
       n = np.asarray(n)
 
-    x = []
-    # This doesn't work for non-matrix parameters.
-    for nidx, prow in zip(n, p):
-      x += [np.random.multinomial(nidx, prow, size=size)]
-
-    # This only works for rank 3 tensor.
-    x = np.rollaxis(np.asarray(x), 1)
+    # Draw each count from a Binomial conditional on the counts of the
+    # previous categories, for all parameters at once.
+    shape = _rvs_shape(size, np.expand_dims(n, -1), p)
+    tail = np.cumsum(p[..., ::-1], axis=-1)[..., ::-1]
+    n_left = np.broadcast_to(n, shape[:-1]).astype(np.int64)
+    x = np.zeros(shape, dtype=np.int64)
+    for k in range(shape[-1] - 1):
+      # The remaining mass is zero only if p[..., k] is, so divide by
+      # one there to avoid dividing by zero.
+      p_k = p[..., k] / np.where(tail[..., k] > 0, tail[..., k], 1.0)
+      x[..., k] = np.random.binomial(n_left, np.clip(p_k, 0.0, 1.0))
+      n_left = n_left - x[..., k]
+
+    x[..., -1] = n_left
     return x
 
   def logpmf(self, x, n, p):
@@ -696,35 +896,62 @@ class Multinomial(Distribution):
           tf.reduce_sum(x * tf.log(p), multivariate_idx)
 
   def entropy(self, n, p):
-    """TODO
-    """
-    # Note that given n and p where p is a probability vector of
-    # length k, the entropy requires a sum over all
-    # possible configurations of a k-vector which sums to n. It's
-    # expensive.
-    # http://stackoverflow.com/questions/36435754/generating-a-numpy-array-with-all-combinations-of-numbers-that-sum-to-less-than
-    sess = tf.Session()
-    n = sess.run(tf.cast(tf.squeeze(n), dtype=tf.int32))
-    sess.close()
-    p = tf.cast(tf.squeeze(p), dtype=tf.float32)
-    if isinstance(n, np.int32):
-      k = get_dims(p)[0]
-      max_range = np.zeros(k, dtype=np.int32) + n
-      x = np.array([i for i in product(*(range(i + 1) for i in max_range))
-                    if sum(i) == n])
-      logpmf = self.logpmf(x, n, p)
-      return tf.reduce_sum(tf.exp(logpmf) * logpmf)
-    else:
-      out = []
-      for j in range(n.shape[0]):
-        k = get_dims(p)[0]
-        max_range = np.zeros(k, dtype=np.int32) + n[j]
-        x = np.array([i for i in product(*(range(i + 1) for i in max_range))
-                      if sum(i) == n[j]])
-        logpmf = self.logpmf(x, n[j], p[j, :])
-        out += [tf.reduce_sum(tf.exp(logpmf) * logpmf)]
+    """Expected log of the probability mass function.
 
-      return tf.pack(out)
+    It decomposes over the Binomial marginals :math:`x_i \sim
+    Binomial(n, p_i)` of each count, rather than summing over all
+    configurations of counts, so it takes :math:`O(n k)` time.
+
+    Parameters
+    ----------
+    n : tf.Tensor
+      A tensor of one less dimension than ``p``, representing the
+      number of outcomes.
+    p : tf.Tensor
+      A n-D tensor for n >= 1, where the inner (right-most)
+      dimension represents the multivariate dimension, and
+      representing probabilities which sum to 1.
+
+    Returns
+    -------
+    tf.Tensor
+      A tensor of one dimension less than the input.
+    """
+    n = tf.cast(n, dtype=tf.float32)
+    p = tf.cast(p, dtype=tf.float32)
+    multivariate_idx = len(get_dims(p)) - 1
+    # E[log p(x)] = log n! + n \sum_i p_i log p_i - \sum_i E[log x_i!],
+    # where the last expectation is a sum over the support 0, ..., n
+    # of each marginal.
+    x = tf.cast(tf.range(tf.cast(tf.reduce_max(n), dtype=tf.int32) + 1),
+                dtype=tf.float32)
+    n_k = tf.expand_dims(tf.expand_dims(n, multivariate_idx),
+                         multivariate_idx + 1)
+    p_k = tf.expand_dims(p, multivariate_idx + 1)
+    # Mask the values of the range which lie outside each support. A
+    # marginal with p_i = 0 has support 0, and one with p_i = 1 has
+    # support n.
+    mask = tf.cast(tf.less_equal(x, n_k), dtype=tf.float32) * \
+        tf.maximum(tf.cast(tf.greater(p_k, 0.0), dtype=tf.float32),
+                   tf.cast(tf.equal(x, 0.0), dtype=tf.float32)) * \
+        tf.maximum(tf.cast(tf.less(p_k, 1.0), dtype=tf.float32),
+                   tf.cast(tf.equal(x, n_k), dtype=tf.float32))
+    # Take the logarithms at one where p_i = 0 or p_i = 1, so that
+    # the masked terms and their gradients are zero rather than NaN.
+    ones = tf.ones_like(p_k)
+    log_p_k = tf.log(tf.select(tf.greater(p_k, 0.0), p_k, ones))
+    log_1m_p_k = tf.log(tf.select(tf.less(p_k, 1.0), 1.0 - p_k, ones))
+    n_minus_x = tf.maximum(n_k - x, 0.0)
+    log_pmf = tf.lgamma(n_k + 1.0) - tf.lgamma(x + 1.0) - \
+        tf.lgamma(n_minus_x + 1.0) + \
+        x * log_p_k + n_minus_x * log_1m_p_k
+    expected_log_factorial = tf.reduce_sum(
+        mask * tf.exp(log_pmf) * tf.lgamma(x + 1.0),
+        [multivariate_idx, multivariate_idx + 1])
+    log_p = tf.log(tf.select(tf.greater(p, 0.0), p, tf.ones_like(p)))
+    return tf.lgamma(n + 1.0) + \
+        n * tf.reduce_sum(p * log_p, multivariate_idx) - \
+        expected_log_factorial
 
 
 class MultivariateNormalDiag(Distribution):
@@ -756,9 +983,12 @@ class MultivariateNormalFull(Distribution):
     Parameters
     ----------
     mean : np.ndarray, optional
-      1-D tensor. Defaults to zero mean.
+      n-D tensor for n > 0, where the inner (right-most) dimension
+      represents the multivariate dimension. Defaults to zero mean.
     cov : np.ndarray, optional
-      1-D or 2-D tensor. Defaults to identity matrix.
+      A tensor of one more dimension than ``mean``, representing
+      covariance matrices, or a single covariance matrix shared by
+      all means. Defaults to identity matrix.
     size : int
       Number of random variable samples to return.
 
@@ -780,14 +1010,15 @@ class MultivariateNormalFull(Distribution):
 
       return x
 
-    x = []
-    # This doesn't work for non-matrix parameters.
-    for meanrow, covmat in zip(mean, cov):
-      x += [stats.multivariate_normal.rvs(meanrow, covmat, size=size)]
+    # Transform standard normal variates by the Cholesky factor of
+    # each covariance, broadcasting a shared covariance over the means.
+    cov = np.asarray(cov)
+    if len(cov.shape) == 0:
+      cov = cov * np.eye(mean.shape[-1])
 
-    # This only works for rank 3 tensor.
-    x = np.rollaxis(np.asarray(x), 1)
-    return x
+    eps = np.random.standard_normal(_rvs_shape(size, mean))
+    L = np.linalg.cholesky(cov)
+    return mean + np.einsum('...ij,...j->...i', L, eps)
 
 
 class NBinom(Distribution):
@@ -802,10 +1033,10 @@ class NBinom(Distribution):
     Parameters
     ----------
     n : int or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`n > 0`.
     p : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`p\in(0,1)`.
     size : int
       Number of random variable samples to return.
@@ -819,17 +1050,9 @@ class NBinom(Distribution):
       n = np.asarray(n)
     if not isinstance(p, np.ndarray):
       p = np.asarray(p)
-    if len(n.shape) == 0:
-      return stats.nbinom.rvs(n, p, size=size)
-
-    x = []
-    for nidx, pidx in zip(np.nditer(n), np.nditer(p)):
-      x += [stats.nbinom.rvs(nidx, pidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    return stats.nbinom.rvs(n, p, size=_rvs_shape(size, n, p))
 
+  @_sparse_support
   def logpmf(self, x, n, p):
     """Log of the probability mass function.
 
@@ -868,9 +1091,9 @@ class Normal(Distribution):
     Parameters
     ----------
     loc : float or np.ndarray
-      0-D or 1-D tensor.
+      n-D tensor.
     scale : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`scale > 0`.
     size : int
       Number of random variable samples to return.
@@ -884,16 +1107,55 @@ class Normal(Distribution):
       loc = np.asarray(loc)
     if not isinstance(scale, np.ndarray):
       scale = np.asarray(scale)
-    if len(loc.shape) == 0:
-      return stats.norm.rvs(loc, scale, size=size)
+    return stats.norm.rvs(loc, scale, size=_rvs_shape(size, loc, scale))
 
-    x = []
-    for locidx, scaleidx in zip(np.nditer(loc), np.nditer(scale)):
-      x += [stats.norm.rvs(locidx, scaleidx, size=size)]
+  def factorization_logpdf(self, x, s, t, scale=1.0):
+    """Log of the probability density function of a matrix whose
+    means factorize, summed over all entries,
 
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    .. math::
+
+      \sum_{i=1}^N \sum_{j=1}^M \log Normal(x_{ij}; s_i^T t_j, scale).
+
+    If ``x`` is a ``tf.SparseTensor``, the sum of squared errors
+    expands as :math:`\sum_{ij} x_{ij}^2 - 2 \sum_{ij} x_{ij} s_i^T
+    t_j + \sum_{ij} (s_i^T t_j)^2`. The first two sums run over the
+    nonzero entries only, and the last is computed in closed form as
+    the elementwise product of :math:`S^T S` and :math:`T^T T`. The
+    cost is :math:`O(nnz K + (N + M) K^2)` rather than
+    :math:`O(N M K)`.
+
+    Parameters
+    ----------
+    x : tf.SparseTensor or tf.Tensor
+      A N x M matrix. If sparse, entries which are not stored are
+      zero.
+    s : tf.Tensor
+      A N x K matrix of row factors.
+    t : tf.Tensor
+      A M x K matrix of column factors.
+    scale : float or tf.Tensor, optional
+      A scalar, constrained to :math:`scale > 0`.
+
+    Returns
+    -------
+    tf.Tensor
+      A scalar.
+    """
+    s = tf.cast(s, dtype=tf.float32)
+    t = tf.cast(t, dtype=tf.float32)
+    scale = tf.cast(scale, dtype=tf.float32)
+    if not isinstance(x, tf.SparseTensor):
+      return tf.reduce_sum(
+          self.logpdf(x, tf.matmul(s, t, transpose_b=True), scale))
+
+    x_values, mu = _factorization_entries(x, s, t)
+    sum_mu_sq = tf.reduce_sum(tf.matmul(s, s, transpose_a=True) *
+                              tf.matmul(t, t, transpose_a=True))
+    sse = tf.reduce_sum(tf.square(x_values) - 2.0 * x_values * mu) + sum_mu_sq
+    n_entries = tf.cast(tf.reduce_prod(x.shape), dtype=tf.float32)
+    return -0.5 * n_entries * tf.log(2.0 * np.pi * tf.square(scale)) - \
+        0.5 * sse / tf.square(scale)
 
 
 class Poisson(Distribution):
@@ -908,7 +1170,7 @@ class Poisson(Distribution):
     Parameters
     ----------
     mu : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`mu > 0`.
     size : int
       Number of random variable samples to return.
@@ -920,17 +1182,9 @@ class Poisson(Distribution):
     """
     if not isinstance(mu, np.ndarray):
       mu = np.asarray(mu)
-    if len(mu.shape) == 0:
-      return stats.poisson.rvs(mu, size=size)
-
-    x = []
-    for muidx in np.nditer(mu):
-      x += [stats.poisson.rvs(muidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    return stats.poisson.rvs(mu, size=_rvs_shape(size, mu))
 
+  @_sparse_support
   def logpmf(self, x, mu):
     """Log of the probability mass function.
     Parameters
@@ -949,6 +1203,48 @@ class Poisson(Distribution):
     mu = tf.cast(mu, dtype=tf.float32)
     return x * tf.log(mu) - mu - tf.lgamma(x + 1.0)
 
+  def factorization_logpmf(self, x, s, t):
+    """Log of the probability mass function of a matrix of counts
+    whose rates factorize, summed over all entries,
+
+    .. math::
+
+      \sum_{i=1}^N \sum_{j=1}^M \log Poisson(x_{ij}; s_i^T t_j).
+
+    If ``x`` is a ``tf.SparseTensor``, zero entries contribute only
+    the negative sum of rates, which is computed in closed form as
+    :math:`(\sum_i s_i)^T (\sum_j t_j)`. Only the nonzero entries are
+    evaluated explicitly, so the cost is :math:`O(nnz K + (N + M) K)`
+    rather than :math:`O(N M K)`.
+
+    Parameters
+    ----------
+    x : tf.SparseTensor or tf.Tensor
+      A N x M matrix of counts. If sparse, entries which are not
+      stored are zero.
+    s : tf.Tensor
+      A N x K matrix of row factors, with all elements constrained to
+      :math:`s \geq 0`.
+    t : tf.Tensor
+      A M x K matrix of column factors, with all elements constrained
+      to :math:`t \geq 0`.
+
+    Returns
+    -------
+    tf.Tensor
+      A scalar.
+    """
+    s = tf.cast(s, dtype=tf.float32)
+    t = tf.cast(t, dtype=tf.float32)
+    if not isinstance(x, tf.SparseTensor):
+      return tf.reduce_sum(
+          self.logpmf(x, tf.matmul(s, t, transpose_b=True)))
+
+    x_values, mu = _factorization_entries(x, s, t)
+    sum_mu = tf.reduce_sum(tf.reduce_sum(s, 0) * tf.reduce_sum(t, 0))
+    return tf.reduce_sum(x_values * tf.log(mu) - tf.lgamma(x_values + 1.0)) - \
+        sum_mu
+
 
 class StudentT(Distribution):
   """Student-t distribution.
@@ -962,12 +1258,12 @@ class StudentT(Distribution):
     Parameters
     ----------
     df : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`df > 0`.
     loc : float or np.ndarray
-      0-D or 1-D tensor.
+      n-D tensor.
     scale : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`scale > 0`.
     size : int
       Number of random variable samples to return.
@@ -983,18 +1279,8 @@ class StudentT(Distribution):
       loc = np.asarray(loc)
     if not isinstance(scale, np.ndarray):
       scale = np.asarray(scale)
-    if len(df.shape) == 0:
-      return stats.t.rvs(df, loc=loc, scale=scale, size=size)
-
-    x = []
-    for dfidx, locidx, scaleidx in zip(np.nditer(df),
-                                       np.nditer(loc),
-                                       np.nditer(scale)):
-      x += [stats.t.rvs(dfidx, loc=locidx, scale=scaleidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    return stats.t.rvs(df, loc=loc, scale=scale,
+                       size=_rvs_shape(size, df, loc, scale))
 
 
 class TruncNorm(Distribution):
@@ -1010,14 +1296,14 @@ class TruncNorm(Distribution):
     ----------
     a : float or np.ndarray
       Left boundary, with respect to the standard normal.
-      0-D or 1-D tensor.
+      n-D tensor.
     b : float or np.ndarray
       Right boundary, with respect to the standard normal.
-      0-D or 1-D tensor, and with ``b > a`` element-wise.
+      n-D tensor, and with ``b > a`` element-wise.
     loc : float or np.ndarray
-      0-D or 1-D tensor.
+      n-D tensor.
     scale : float or np.ndarray
-      0-D or 1-D tensor, with all elements constrained to
+      n-D tensor, with all elements constrained to
       :math:`scale > 0`.
     size : int
       Number of random variable samples to return.
@@ -1035,20 +1321,63 @@ class TruncNorm(Distribution):
       loc = np.asarray(loc)
     if not isinstance(scale, np.ndarray):
       scale = np.asarray(scale)
-    if len(a.shape) == 0:
-      return stats.truncnorm.rvs(a, b, loc, scale, size=size)
+    return stats.truncnorm.rvs(a, b, loc, scale,
+                               size=_rvs_shape(size, a, b, loc, scale))
 
-    x = []
-    for aidx, bidx, locidx, scaleidx in zip(np.nditer(a),
-                                            np.nditer(b),
-                                            np.nditer(loc),
-                                            np.nditer(scale)):
-      x += [stats.truncnorm.rvs(aidx, bidx, locidx, scaleidx, size=size)]
+  def sample_n(self, n, a, b, loc=0, scale=1, seed=None):
+    """Random variates, as a tensor which is differentiable with
+    respect to the parameters.
 
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    It transforms uniform variates by the inverse of the cumulative
+    distribution function, computed in log space so that intervals in
+    the tails are sampled accurately.
+
+    Parameters
+    ----------
+    n : int
+      Number of random variable samples to return.
+    a : tf.Tensor
+      Left boundary, with respect to the standard normal.
+    b : tf.Tensor
+      Right boundary, with respect to the standard normal.
+      A tensor of same shape as ``a``, and with ``b > a``
+      element-wise.
+    loc : tf.Tensor
+      A tensor of same shape as ``a``.
+    scale : tf.Tensor
+      A tensor of same shape as ``a``, and with all elements
+      constrained to :math:`scale > 0`.
+    seed : int, optional
+      Seed of the uniform variates.
 
+    Returns
+    -------
+    tf.Tensor
+      A tensor of dimensions n x shape.
+    """
+    a = tf.cast(a, dtype=tf.float32)
+    b = tf.cast(b, dtype=tf.float32)
+    loc = tf.cast(loc, dtype=tf.float32)
+    scale = tf.cast(scale, dtype=tf.float32)
+    zeros = tf.zeros_like(a + b + loc + scale)
+    a = a + zeros
+    b = b + zeros
+    # Sample from the reflected interval if it lies in the upper tail.
+    flip = tf.greater(a, 0.0)
+    lo = tf.select(flip, -b, a)
+    hi = tf.select(flip, -a, b)
+    sign = 1.0 - 2.0 * tf.cast(flip, dtype=tf.float32)
+    u = tf.random_uniform(tf.concat(0, [[n], tf.shape(zeros)]), seed=seed)
+    # log p = log(Phi(lo) + u (Phi(hi) - Phi(lo))).
+    log_lo = _log_ndtr(lo)
+    log_u = tf.log(u) + _log_ndtr_diff(lo, hi)
+    log_max = tf.maximum(log_lo, log_u)
+    log_p = log_max + tf.log(tf.exp(log_lo - log_max) +
+                             tf.exp(log_u - log_max))
+    z = tf.minimum(tf.maximum(_log_ndtri(log_p), lo), hi)
+    return loc + scale * sign * z
+
+  @_sparse_support
   def logpdf(self, x, a, b, loc=0, scale=1):
     """Log of the probability density function.
 
@@ -1076,16 +1405,13 @@ class TruncNorm(Distribution):
     """
     # Note there is no error checking if x is outside domain.
     x = tf.cast(x, dtype=tf.float32)
-    # This is slow, as we require use of stats.norm.cdf.
-    sess = tf.Session()
-    a = sess.run(tf.cast(a, dtype=tf.float32))
-    b = sess.run(tf.cast(b, dtype=tf.float32))
-    loc = sess.run(tf.cast(loc, dtype=tf.float32))
-    scale = sess.run(tf.cast(scale, dtype=tf.float32))
-    sess.close()
-    return -tf.log(scale) + norm.logpdf(x, loc, scale) - \
-        tf.log(tf.cast(stats.norm.cdf((b - loc) / scale) -
-               stats.norm.cdf((a - loc) / scale), dtype=tf.float32))
+    a = tf.cast(a, dtype=tf.float32)
+    b = tf.cast(b, dtype=tf.float32)
+    loc = tf.cast(loc, dtype=tf.float32)
+    scale = tf.cast(scale, dtype=tf.float32)
+    z = (x - loc) / scale
+    return -0.5 * tf.square(z) - 0.5 * np.log(2.0 * np.pi) - \
+        tf.log(scale) - _log_ndtr_diff(a, b)
 
 
 class Uniform(Distribution):
@@ -1102,9 +1428,9 @@ class Uniform(Distribution):
     Parameters
     ----------
     loc : float or np.ndarray
-      Left boundary. 0-D or 1-D tensor.
+      Left boundary. n-D tensor.
     scale : float or np.ndarray
-      Width of distribution. 0-D or 1-D tensor, with all
+      Width of distribution. n-D tensor, with all
       elements constrained to math:`scale > 0`.
     size : int
       Number of random variable samples to return.
@@ -1118,16 +1444,7 @@ class Uniform(Distribution):
       loc = np.asarray(loc)
     if not isinstance(scale, np.ndarray):
       scale = np.asarray(scale)
-    if len(loc.shape) == 0:
-      return stats.uniform.rvs(loc, scale, size=size)
-
-    x = []
-    for locidx, scaleidx in zip(np.nditer(loc), np.nditer(scale)):
-      x += [stats.uniform.rvs(locidx, scaleidx, size=size)]
-
-    # Note this doesn't work for multi-dimensional sizes.
-    x = np.asarray(x).transpose()
-    return x
+    return stats.uniform.rvs(loc, scale, size=_rvs_shape(size, loc, scale))
 
 
 bernoulli = Bernoulli()
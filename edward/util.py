@@ -5,9 +5,11 @@ from __future__ import print_function
 import numpy as np
 import six
 import tensorflow as tf
+import threading
 
 from copy import deepcopy
 from edward.models.random_variable import RandomVariable
+from scipy import sparse
 from tensorflow.core.framework import attr_value_pb2
 from tensorflow.python.ops import control_flow_ops
 from tensorflow.python.framework.ops import set_shapes_for_outputs
@@ -16,6 +18,142 @@ from tensorflow.python.util import compat
 distributions = tf.contrib.distributions
 
 
+class BatchIterator(object):
+  """Iterator over shuffled minibatches of arrays, prefetched in a
+  background thread.
+
+  Each epoch visits the rows in a new random order. Minibatches have a
+  fixed size; rows left over at the end of an epoch are completed
+  with rows from the next epoch. Rows within a minibatch are read in
+  sorted order, so that reads from memory-mapped arrays are mostly
+  sequential.
+
+  A background thread assembles up to ``n_prefetch`` minibatches
+  ahead, overlapping reading and copying the data with the training
+  step that consumes it.
+
+  SciPy sparse matrices are batched by row. Their minibatches are
+  ``scipy.sparse.coo_matrix``'s with ``n_minibatch`` rows.
+
+  Examples
+  --------
+  >>> batches = BatchIterator([x_train, y_train], 100)
+  >>> for t in range(1000):
+  ...   x_batch, y_batch = next(batches)
+  ...   inference.update(feed_dict={X: x_batch, y: y_batch})
+  >>> batches.close()
+  """
+  def __init__(self, arrays, n_minibatch, n_prefetch=2, shuffle=True,
+               dtype=None):
+    """Initialization.
+
+    Parameters
+    ----------
+    arrays : list of np.ndarray or scipy.sparse.spmatrix
+      Arrays to batch along their first dimension. They must have the
+      same number of rows. They may be ``np.memmap``s.
+    n_minibatch : int
+      Number of rows in each minibatch.
+    n_prefetch : int, optional
+      Maximum number of minibatches to assemble ahead.
+    shuffle : bool, optional
+      Whether to visit rows in a random order each epoch.
+    dtype : np.dtype, optional
+      Type to convert minibatches to. Default is to keep each
+      array's type.
+    """
+    # Sparse matrices are sliced by row in compressed row format.
+    self.arrays = [array.tocsr() if sparse.issparse(array) else array
+                   for array in arrays]
+    self.n_minibatch = n_minibatch
+    self.shuffle = shuffle
+    self.dtype = dtype
+    self.n_data = arrays[0].shape[0]
+    if any([array.shape[0] != self.n_data for array in arrays]):
+      raise ValueError("Arrays must have the same number of rows.")
+
+    if n_minibatch > self.n_data:
+      raise ValueError("n_minibatch is larger than the number of rows.")
+
+    # Number of completed epochs, counting minibatches returned.
+    self.epoch = 0
+    self._n_rows = 0
+    self._idx = np.zeros(0, dtype=np.int64)
+    self._buffer = six.moves.queue.Queue(maxsize=n_prefetch)
+    self._stop = threading.Event()
+    self._thread = threading.Thread(target=self._prefetch)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    batch = self._buffer.get()
+    if isinstance(batch, Exception):
+      raise batch
+
+    self._n_rows += self.n_minibatch
+    self.epoch = self._n_rows // self.n_data
+    return batch
+
+  next = __next__
+
+  def close(self):
+    """Stop the background thread."""
+    self._stop.set()
+    # Unblock the thread if it waits for space in the buffer.
+    while self._thread.is_alive():
+      try:
+        self._buffer.get_nowait()
+      except six.moves.queue.Empty:
+        pass
+
+      self._thread.join(0.01)
+
+  def _next_indices(self):
+    while len(self._idx) < self.n_minibatch:
+      if self.shuffle:
+        perm = np.random.permutation(self.n_data)
+      else:
+        perm = np.arange(self.n_data)
+
+      self._idx = np.concatenate([self._idx, perm])
+
+    idx = np.sort(self._idx[:self.n_minibatch])
+    self._idx = self._idx[self.n_minibatch:]
+    return idx
+
+  def _prefetch(self):
+    try:
+      while not self._stop.is_set():
+        idx = self._next_indices()
+        batch = []
+        for array in self.arrays:
+          if sparse.issparse(array):
+            rows = array[idx].tocoo()
+            if self.dtype is not None:
+              rows = rows.astype(self.dtype)
+
+            batch.append(rows)
+          else:
+            batch.append(np.asarray(array[idx], dtype=self.dtype))
+
+        self._put(batch)
+    except Exception as e:
+      self._put(e)
+
+  def _put(self, item):
+    """Put an item in the buffer, waiting for space unless the thread
+    is asked to stop."""
+    while not self._stop.is_set():
+      try:
+        self._buffer.put(item, timeout=0.1)
+        break
+      except six.moves.queue.Full:
+        pass
+
+
 def copy(org_instance, dict_swap=None, scope="copied",
          replace_itself=False, copy_q=False):
   """Build a new node in the TensorFlow graph from `org_instance`,
@@ -746,6 +884,131 @@ def set_seed(x):
   tf.set_random_seed(x)
 
 
+class TFRecordData(object):
+  """Data source of ``tf.train.Example`` records, stored in files
+  matching a pattern.
+
+  Index it by feature name to bind a feature in an inference's data
+  dictionary. During initialization, inference builds one input
+  pipeline per source, with size given by ``n_minibatch``:
+
+  1. A queue of the file names, shuffled each epoch.
+  2. ``n_readers`` readers, each reading records from the next file
+     in the queue, so that records of several files are interleaved.
+  3. A shuffle buffer of serialized records, from which minibatches
+     are dequeued.
+  4. ``tf.parse_example`` on each minibatch as a whole.
+
+  Examples
+  --------
+  >>> records = TFRecordData('data/train-*.tfrecords',
+  ...                        {'x': tf.FixedLenFeature([10], tf.float32),
+  ...                         'y': tf.FixedLenFeature([], tf.int64)})
+  >>> data = {'x': records['x'], 'y': records['y']}
+  >>> inference = ed.MFVI({'z': qz}, data, model)
+  >>> inference.initialize(n_minibatch=128)
+  """
+  def __init__(self, file_pattern, features, n_readers=4, shuffle=True,
+               capacity=10000, n_data=None):
+    """Initialization.
+
+    Parameters
+    ----------
+    file_pattern : str or list of str
+      File pattern, or list of file patterns, of TFRecord files.
+    features : dict
+      Feature specification for ``tf.parse_example``, binding feature
+      names to ``tf.FixedLenFeature``s or ``tf.VarLenFeature``s. A
+      ``tf.VarLenFeature`` is parsed as a ``tf.SparseTensor``, which
+      only model wrappers can take as data.
+    n_readers : int, optional
+      Number of readers to read files in parallel.
+    shuffle : bool, optional
+      Whether to shuffle files and records.
+    capacity : int, optional
+      Minimum number of records in the shuffle buffer after a
+      dequeue. Larger values mix records better, at the cost of
+      memory and start-up time.
+    n_data : int, optional
+      Number of records, used to scale the log-likelihood of a
+      minibatch. Default is to not scale it.
+
+    Raises
+    ------
+    ValueError
+      If no files match ``file_pattern``.
+    """
+    if isinstance(file_pattern, six.string_types):
+      file_pattern = [file_pattern]
+
+    self.filenames = sorted([filename for pattern in file_pattern
+                             for filename in tf.gfile.Glob(pattern)])
+    if not self.filenames:
+      raise ValueError("No files match " + str(file_pattern) + ".")
+
+    self.features = features
+    self.n_readers = n_readers
+    self.shuffle = shuffle
+    self.capacity = capacity
+    self.n_data = n_data
+    self._batches = {}
+
+  def __getitem__(self, name):
+    if name not in self.features:
+      raise KeyError(name)
+
+    return TFRecordFeature(self, name)
+
+  def build(self, n_minibatch):
+    """Build the input pipeline.
+
+    It is built once for each graph and minibatch size, so that
+    features bound to different keys come from the same records.
+
+    Parameters
+    ----------
+    n_minibatch : int
+      Number of records in each minibatch.
+
+    Returns
+    -------
+    dict
+      Dictionary binding each feature name to its minibatch tensor.
+    """
+    key = (tf.get_default_graph(), n_minibatch)
+    if key not in self._batches:
+      filename_queue = tf.train.string_input_producer(
+          self.filenames, shuffle=self.shuffle)
+      records = []
+      for _ in range(self.n_readers):
+        reader = tf.TFRecordReader()
+        _, record = reader.read(filename_queue)
+        records.append([record])
+
+      if self.shuffle:
+        batch = tf.train.shuffle_batch_join(
+            records, n_minibatch,
+            capacity=self.capacity + 3 * n_minibatch,
+            min_after_dequeue=self.capacity)
+      else:
+        batch = tf.train.batch_join(records, n_minibatch,
+                                    capacity=self.capacity)
+
+      if isinstance(batch, list):
+        batch = batch[0]
+
+      self._batches[key] = tf.parse_example(batch, self.features)
+
+    return self._batches[key]
+
+
+class TFRecordFeature(object):
+  """A feature of a ``TFRecordData`` source."""
+  def __init__(self, source, name):
+    self.source = source
+    self.name = name
+
+
 def tile(input, multiples, *args, **kwargs):
   """Constructs a tensor by tiling a given tensor.
 
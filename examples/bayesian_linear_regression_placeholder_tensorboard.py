@@ -38,9 +38,8 @@ data = {X: X_train, y: y_train}
 inference = ed.MFVI({beta: qbeta}, data)
 inference.initialize(logdir='train')
 
-sess = ed.get_session()
 for t in range(501):
-  _, loss = sess.run([inference.train, inference.loss], {X: data[X]})
+  loss = inference.update(feed_dict={X: data[X]})
   inference.print_progress(t, loss)
 
 y_post = ed.copy(y, {beta: qbeta.mean()})
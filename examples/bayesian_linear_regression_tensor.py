@@ -39,7 +39,6 @@ data = {y: y_data}
 inference = ed.MFVI({beta: qbeta}, data)
 inference.initialize()
 
-sess = ed.get_session()
 for t in range(501):
-  _, loss = sess.run([inference.train, inference.loss])
+  loss = inference.update()
   inference.print_progress(t, loss)
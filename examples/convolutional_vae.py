@@ -50,7 +50,7 @@ class NormalBernoulli:
                            variance_epsilon=0.001,
                            scale_after_normalization=True):
       return (pt.wrap(z).
-              reshape([N_MINIBATCH, 1, 1, self.n_vars]).
+              reshape([-1, 1, 1, self.n_vars]).
               deconv2d(3, 128, edges='VALID').
               deconv2d(5, 64, edges='VALID').
               deconv2d(5, 32, stride=2).
@@ -94,7 +94,7 @@ def neural_network(x):
                          variance_epsilon=0.001,
                          scale_after_normalization=True):
     params = (pt.wrap(x).
-              reshape([N_MINIBATCH, 28, 28, 1]).
+              reshape([-1, 28, 28, 1]).
               conv2d(5, 32, stride=2).
               conv2d(5, 64, stride=2).
               conv2d(5, 128, edges='VALID').
@@ -121,23 +121,25 @@ model = NormalBernoulli(n_vars=10)
 # to explicitly represent the variational factors for a mini-batch,
 # q(z_{batch} | x) = prod_{m=1}^{n_data}
 #                    Normal(z_m | mu, sigma = neural_network(x_m))
-x_ph = ed.placeholder(tf.float32, [N_MINIBATCH, 28 * 28])
+# The inference network takes a placeholder as input; inference
+# replaces it with the current minibatch at each iteration.
+x_ph = ed.placeholder(tf.float32, [None, 28 * 28])
 mu, sigma = neural_network(x_ph)
 qz = Normal(mu=mu, sigma=sigma)
 
-# MNIST batches are fed at training time.
 if not os.path.exists(DATA_DIR):
   os.makedirs(DATA_DIR)
 
 mnist = input_data.read_data_sets(DATA_DIR, one_hot=True)
-x = ed.placeholder(tf.float32, [N_MINIBATCH, 28 * 28])
-data = {'x': x}
+x_train = mnist.train.images
+data = {'x': x_train, x_ph: x_train}
 
 sess = ed.get_session()
 inference = ed.MFVI({'z': qz}, data, model)
 with tf.variable_scope("model") as scope:
   optimizer = tf.train.AdamOptimizer(0.01, epsilon=1.0)
-  inference.initialize(optimizer=optimizer, use_prettytensor=True)
+  inference.initialize(n_minibatch=N_MINIBATCH, optimizer=optimizer,
+                       use_prettytensor=True)
 with tf.variable_scope("model", reuse=True) as scope:
   p_rep = model.sample_prior(N_MINIBATCH)
 
@@ -151,15 +153,13 @@ for epoch in range(n_epoch):
   pbar.start()
   for t in range(n_iter_per_epoch):
     pbar.update(t)
-    x_train, _ = mnist.train.next_batch(N_MINIBATCH)
-    _, loss = sess.run([inference.train, inference.loss],
-                       feed_dict={x: x_train, x_ph: x_train})
+    loss = inference.update()
     avg_loss += loss
 
-  # Take average over all ELBOs during the epoch, and over minibatch
-  # of data points (images).
+  # Take average over all ELBOs during the epoch, and over all data
+  # points (images). Each ELBO is scaled to the full training set.
   avg_loss = avg_loss / n_iter_per_epoch
-  avg_loss = avg_loss / N_MINIBATCH
+  avg_loss = avg_loss / x_train.shape[0]
 
   # Print a lower bound to the average marginal likelihood for an
   # image.
@@ -172,3 +172,5 @@ for epoch in range(n_epoch):
 
     imsave(os.path.join(IMG_DIR, '%d.png') % b,
            imgs[b].reshape(28, 28))
+
+inference.finalize()
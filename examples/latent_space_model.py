@@ -19,11 +19,16 @@ class LatentSpaceModel:
   """
   p(x, z) = [ prod_{i=1}^N prod_{j=1}^N Poi(Y_{ij}; 1/||z_i - z_j|| ) ]
             [ prod_{i=1}^N N(z_i; 0, I)) ]
+
+  If ``n_negative`` is specified, the data is a sparse matrix and the
+  Poisson likelihood is estimated from its nonzero entries and
+  ``n_negative`` sampled pairs, rather than evaluated over all pairs.
   """
   def __init__(self, N, K, prior_std=1.0,
                like='Poisson',
                prior='Lognormal',
-               dist='euclidean'):
+               dist='euclidean',
+               n_negative=None):
     self.n_vars = N * K
     self.N = N
     self.K = K
@@ -31,6 +36,7 @@ class LatentSpaceModel:
     self.like = like
     self.prior = prior
     self.dist = dist
+    self.n_negative = n_negative
 
   def log_prob(self, xs, zs):
     """Return scalar, the log joint density log p(xs, zs)."""
@@ -42,6 +48,20 @@ class LatentSpaceModel:
       raise NotImplementedError("prior not available.")
 
     z = tf.reshape(zs['z'], [self.N, self.K])
+    if self.n_negative is not None:
+      if not (self.like == 'Poisson' and self.dist == 'euclidean'):
+        raise NotImplementedError("Negative sampling is only available "
+                                  "for the Poisson likelihood with "
+                                  "euclidean distance.")
+
+      def rate(rows, cols):
+        diff = tf.gather(z, rows) - tf.gather(z, cols)
+        return 1.0 / tf.reduce_sum(diff * diff, 1)
+
+      log_lik = poisson.negative_sampling_logpmf(xs['x'], rate,
+                                                 self.n_negative)
+      return log_lik + log_prior
+
     if self.dist == 'euclidean':
       xp = tf.matmul(tf.ones([1, self.N]),
                      tf.reduce_sum(z * z, 1, keep_dims=True))
@@ -70,6 +90,13 @@ model = LatentSpaceModel(N=x_train.shape[0], K=3,
                          like='Poisson', prior='Gaussian')
 
 data = {'x': x_train}
+# Alternatively, for large networks, store the edges sparsely and
+# estimate the likelihood by sampling non-edges:
+# from scipy import sparse
+# model = LatentSpaceModel(N=x_train.shape[0], K=3,
+#                          like='Poisson', prior='Gaussian',
+#                          n_negative=x_train.shape[0] * 10)
+# data = {'x': sparse.csr_matrix(x_train)}
 inference = ed.MAP(['z'], data, model)
 # Alternatively, run
 # qz_mu = tf.Variable(tf.random_normal([model.n_vars]))
@@ -12,6 +12,7 @@ import numpy as np
 
 from edward.models import Normal, PointMass
 from edward.stats import lognorm, norm, poisson
+from scipy import sparse
 
 
 class MatrixFactorization:
@@ -48,10 +49,21 @@ class MatrixFactorization:
     s = tf.reshape(zs['z'][:self.n_rows * self.K], [self.n_rows, self.K])
     t = tf.reshape(zs['z'][self.n_cols * self.K:], [self.n_cols, self.K])
 
-    xp = tf.matmul(s, t, transpose_b=True)
-    if self.interaction == 'multiplicative':
-      xp = tf.exp(xp)
-    elif self.interaction != 'additive':
+    if self.interaction == 'additive':
+      # Evaluate the likelihood over the nonzero entries of the sparse
+      # data, with the zero entries' contribution in closed form.
+      if self.like == 'Gaussian':
+        log_lik = norm.factorization_logpdf(xs['x'], s, t, 1.0)
+      elif self.like == 'Poisson':
+        log_lik = poisson.factorization_logpmf(xs['x'], s, t)
+      else:
+        raise NotImplementedError("likelihood not available.")
+
+      return log_lik + log_prior
+    elif self.interaction == 'multiplicative':
+      xp = tf.exp(tf.matmul(s, t, transpose_b=True))
+      xs = {'x': tf.sparse_tensor_to_dense(xs['x'])}
+    else:
       raise NotImplementedError("interaction type unknown.")
 
     if self.like == 'Gaussian':
@@ -76,7 +88,7 @@ model = MatrixFactorization(K, n_rows=x_train.shape[0])
 qz = PointMass(
     params=tf.nn.softplus(tf.Variable(tf.random_normal([model.n_vars]))))
 
-data = {'x': x_train}
+data = {'x': sparse.csr_matrix(x_train)}
 inference = ed.MAP({'z': qz}, data, model)
 # Alternatively, run
 # qz_mu = tf.Variable(tf.random_normal([model.n_vars]))
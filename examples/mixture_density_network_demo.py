@@ -116,8 +116,7 @@ NEPOCH = 1000
 train_loss = np.zeros(NEPOCH)
 test_loss = np.zeros(NEPOCH)
 for i in range(NEPOCH):
-  _, train_loss[i] = sess.run([inference.train, inference.loss],
-                              feed_dict={X: X_train, y: y_train})
+  train_loss[i] = inference.update(feed_dict={X: X_train, y: y_train})
   test_loss[i] = sess.run(inference.loss, feed_dict={X: X_test, y: y_test})
 
 pred_weights, pred_means, pred_std = \
@@ -25,7 +25,6 @@ data = {x: np.array([0.0] * 50, dtype=np.float32)}
 inference = ed.MFVI({mu: qmu}, data)
 inference.initialize(logdir='train')
 
-sess = ed.get_session()
 for t in range(1001):
-  _, loss = sess.run([inference.train, inference.loss])
+  loss = inference.update()
   inference.print_progress(t, loss)
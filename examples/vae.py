@@ -21,26 +21,34 @@ M = 100  # batch size during training
 d = 2  # latent variable dimension
 ed.set_seed(42)
 
+# Data placeholder, used as input to both the probability model (to
+# size the local latent variables) and the inference network. During
+# inference it is replaced with the current minibatch.
+x_ph = ed.placeholder(tf.float32, [None, 28 * 28])
+n_batch = tf.shape(x_ph)[0]
+
 # Probability model (subgraph)
-z = Normal(mu=tf.zeros([M, d]), sigma=tf.ones([M, d]))
-hidden = Dense(256, activation=K.relu)(z.value())  # (M, 64)
+z = Normal(mu=tf.zeros(tf.pack([n_batch, d])),
+           sigma=tf.ones(tf.pack([n_batch, d])))
+hidden = Dense(256, activation=K.relu)(z.value())  # (M, 256)
 x = Bernoulli(logits=Dense(28 * 28)(hidden))  # (M, 784)
 
 # Variational model (subgraph)
-x_ph = ed.placeholder(tf.float32, [M, 28 * 28])
-hidden = Dense(256, activation=K.relu)(x_ph)  # (M, 64)
+hidden = Dense(256, activation=K.relu)(x_ph)  # (M, 256)
 qz = Normal(mu=Dense(d)(hidden),
             sigma=Dense(d, activation=K.softplus)(hidden))
 
-# Bind p(x, z) and q(z | x) to the same TensorFlow placeholder for x.
+# Bind p(x, z) and q(z | x) to the same data. Inference subsamples
+# a minibatch of images for both at each iteration.
 mnist = input_data.read_data_sets("data/mnist", one_hot=True)
-data = {x: x_ph}
+x_train = mnist.train.images
+data = {x: x_train, x_ph: x_train}
 
 sess = ed.get_session()
 K.set_session(sess)
 inference = ed.MFVI({z: qz}, data)
 optimizer = tf.train.RMSPropOptimizer(0.01, epsilon=1.0)
-inference.initialize(optimizer=optimizer)
+inference.initialize(n_minibatch=M, optimizer=optimizer)
 
 n_epoch = 100
 n_iter_per_epoch = 1000
@@ -52,21 +60,21 @@ for epoch in range(n_epoch):
     pbar.start()
     for t in range(n_iter_per_epoch):
         pbar.update(t)
-        x_train, _ = mnist.train.next_batch(M)
-        _, loss = sess.run([inference.train, inference.loss],
-                           feed_dict={x_ph: x_train})
+        loss = inference.update()
         avg_loss += loss
 
-    # Take average over all ELBOs during the epoch, and over minibatch
-    # of data points (images).
+    # Take average over all ELBOs during the epoch, and over all data
+    # points (images). Each ELBO is scaled to the full training set.
     avg_loss = avg_loss / n_iter_per_epoch
-    avg_loss = avg_loss / M
+    avg_loss = avg_loss / x_train.shape[0]
 
     # Print a lower bound to the average marginal likelihood for an
     # image.
     print("log p(x) >= {:0.3f}".format(avg_loss))
 
     # Prior predictive check.
-    imgs = sess.run(x.value())
+    imgs = sess.run(x.value(), {n_batch: M})
     for m in range(M):
         imsave("img/%d.png" % m, imgs[m].reshape(28, 28))
+
+inference.finalize()
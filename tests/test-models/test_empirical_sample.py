@@ -0,0 +1,54 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from edward.models import Empirical
+from edward.util import get_dims
+
+
+def _test(params, n):
+  x = Empirical(params=params)
+  val_est = get_dims(x.sample(n))
+  val_true = n + get_dims(params)[1:]
+  assert val_est == val_true
+
+
+class test_empirical_sample_class(tf.test.TestCase):
+
+  def test_0d(self):
+    with self.test_session():
+      _test(np.array([0.5, 1.2]), [1])
+      _test(np.array([0.5, 1.2]), [5])
+      _test(tf.constant([0.5, 1.2]), [1])
+      _test(tf.constant([0.5, 1.2]), [5])
+
+  def test_1d(self):
+    with self.test_session():
+      _test(np.array([[0.5, 1.2], [0.2, 0.8]]), [1])
+      _test(np.array([[0.5, 1.2], [0.2, 0.8]]), [10])
+      _test(tf.constant([[0.5, 1.2], [0.2, 0.8]]), [1])
+      _test(tf.constant([[0.5, 1.2], [0.2, 0.8]]), [10])
+
+  def test_moments(self):
+    with self.test_session():
+      params = np.random.randn(100, 3).astype(np.float32)
+      x = Empirical(params=params)
+      self.assertAllClose(x.mean().eval(), np.mean(params, 0))
+      self.assertAllClose(x.variance().eval(), np.var(params, 0))
+      val = x.sample(50).eval()
+      assert np.all([np.any(np.all(row == params, 1)) for row in val])
+
+  def test_float16(self):
+    with self.test_session():
+      params = tf.Variable(tf.zeros([10, 3], dtype=tf.float16))
+      x = Empirical(params=params)
+      tf.initialize_all_variables().run()
+      assert x.dtype == tf.float32
+      assert x.mean().eval().dtype == np.float32
+      assert x.sample(5).eval().dtype == np.float32
+
+if __name__ == '__main__':
+  tf.test.main()
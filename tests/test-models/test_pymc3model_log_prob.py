@@ -39,5 +39,32 @@ class test_pymc3_log_prob_class(tf.test.TestCase):
       zs = {'p': np.array(0.5)}
       _test(model, data, zs)
 
+  def test_grad(self):
+    with self.test_session():
+      x_obs = theano.shared(np.zeros(1))
+      with pm.Model() as pm_model:
+        p = pm.Beta('p', 1, 1, transform=None)
+        x = pm.Bernoulli('x', p, observed=x_obs)
+
+      model = PyMC3Model(pm_model)
+      data = {x_obs: np.array([0, 1, 0, 0, 0, 0, 0, 0, 0, 1])}
+      p = tf.constant(0.5)
+      val_ed = model.log_prob(data, {'p': p})
+      grad_ed = tf.gradients(val_ed, [p])[0]
+      assert np.allclose(grad_ed.eval(), 2 / 0.5 - 8 / 0.5)
+
+  def test_shared_unchanged(self):
+    with self.test_session():
+      x_obs = theano.shared(np.zeros(1))
+      with pm.Model() as pm_model:
+        p = pm.Beta('p', 1, 1, transform=None)
+        x = pm.Bernoulli('x', p, observed=x_obs)
+
+      model = PyMC3Model(pm_model)
+      data = {x_obs: np.array([0, 1, 0, 0, 0, 0, 0, 0, 0, 1])}
+      zs = {'p': np.array(0.5)}
+      _test(model, data, zs)
+      assert np.all(x_obs.get_value() == np.zeros(1))
+
 if __name__ == '__main__':
   tf.test.main()
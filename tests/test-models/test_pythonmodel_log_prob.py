@@ -19,6 +19,14 @@ class BetaBernoulli(PythonModel):
     return log_lik + log_prior
 
 
+class BetaBernoulliGrad(BetaBernoulli):
+  """p(x, p) = Bernoulli(x | p) * Beta(p | 1, 1), with gradient"""
+  def _py_grad_log_prob(self, xs, zs):
+    n_ones = np.sum(xs['x'])
+    n_zeros = len(xs['x']) - n_ones
+    return {'p': n_ones / zs['p'] - n_zeros / (1.0 - zs['p'])}
+
+
 def _test(model, xs, zs):
   val_true = beta.logpdf(zs['p'], 1.0, 1.0)
   val_true += np.sum([bernoulli.logpmf(x, zs['p'])
@@ -40,5 +48,53 @@ class test_pythonmodel_log_prob_class(tf.test.TestCase):
       zs = {'p': np.array(0.5)}
       _test(model, data, zs)
 
+  def test_grad(self):
+    with self.test_session():
+      model = BetaBernoulliGrad()
+      data = {'x': np.array([0, 1, 0, 0, 0, 0, 0, 0, 0, 1])}
+      p = tf.constant(0.5)
+      val_ed = model.log_prob(data, {'p': p})
+      grad_ed = tf.gradients(val_ed, [p])[0]
+      assert np.allclose(grad_ed.eval(), 2 / 0.5 - 8 / 0.5)
+
+  def test_batch(self):
+    with self.test_session():
+      model = BetaBernoulliGrad()
+      data = {'x': np.array([0, 1, 0, 0, 0, 0, 0, 0, 0, 1])}
+      p = tf.constant([0.3, 0.5])
+      val_true = [beta.logpdf(p_s, 1.0, 1.0) +
+                  np.sum(bernoulli.logpmf(data['x'], p_s))
+                  for p_s in [0.3, 0.5]]
+      val_ed = model.batch_log_prob(data, {'p': p})
+      assert np.allclose(val_ed.eval(), val_true)
+      grad_ed = tf.gradients(tf.reduce_sum(val_ed), [p])[0]
+      assert np.allclose(grad_ed.eval(),
+                         [2 / 0.3 - 8 / 0.7, 2 / 0.5 - 8 / 0.5])
+
+  def test_pool(self):
+    with self.test_session():
+      model = BetaBernoulli(n_processes=2)
+      data = {'x': np.array([0, 1, 0, 0, 0, 0, 0, 0, 0, 1])}
+      p = tf.constant([0.3, 0.5, 0.7])
+      val_true = [beta.logpdf(p_s, 1.0, 1.0) +
+                  np.sum(bernoulli.logpmf(data['x'], p_s))
+                  for p_s in [0.3, 0.5, 0.7]]
+      val_ed = model.batch_log_prob(data, {'p': p})
+      # Check the workers start when the graph is built, rather than
+      # inside the session.
+      assert model._pool is not None
+      assert np.allclose(val_ed.eval(), val_true)
+      # Check the unchanged data in shared memory is reused.
+      assert np.allclose(val_ed.eval(), val_true)
+      # Check new data is written to shared memory.
+      x = tf.placeholder(tf.int64, [10])
+      val_ed = model.batch_log_prob({'x': x}, {'p': p})
+      data_new = np.ones(10, dtype=np.int64)
+      val_true = [beta.logpdf(p_s, 1.0, 1.0) +
+                  np.sum(bernoulli.logpmf(data_new, p_s))
+                  for p_s in [0.3, 0.5, 0.7]]
+      assert np.allclose(val_ed.eval({x: data_new}), val_true)
+      model.close()
+
 if __name__ == '__main__':
   tf.test.main()
@@ -4,7 +4,10 @@ from __future__ import print_function
 
 import edward as ed
 import numpy as np
+import os
+import pystan
 import six
+import tempfile
 import tensorflow as tf
 
 from scipy.stats import bernoulli, beta
@@ -22,6 +25,15 @@ def _test(model, xs, zs):
   assert np.allclose(val_ed.eval(), val_true)
 
 
+def _test_grad(model, xs, zs):
+  n_ones = np.sum(xs['x'])
+  grad_true = n_ones / zs['p'] - (xs['N'] - n_ones) / (1.0 - zs['p'])
+  zs_tf = {key: tf.constant(value, dtype=tf.float32)
+           for key, value in six.iteritems(zs)}
+  grad_ed = tf.gradients(model.log_prob(xs, zs_tf), [zs_tf['p']])[0]
+  assert np.allclose(grad_ed.eval(), grad_true)
+
+
 class test_stanmodel_log_prob_class(tf.test.TestCase):
 
   def test_1latent(self):
@@ -44,6 +56,140 @@ class test_stanmodel_log_prob_class(tf.test.TestCase):
       data = {'N': 10, 'x': [0, 1, 0, 1, 0, 1, 0, 1, 1, 1]}
       zs = {'p': np.array(0.5)}
       _test(model, data, zs)
+      _test_grad(model, data, zs)
+      _test_grad(model, data, {'p': np.array(0.2)})
+
+  def test_grad_bounds(self):
+    model_code = """
+      data {
+        real<lower=0> b;
+      }
+      parameters {
+        real<lower=0> s;
+        vector<upper=1>[2] v;
+        real<lower=-1,upper=b> w;
+        real m;
+      }
+      model {
+        s ~ exponential(2.0);
+        v ~ normal(0.0, 1.0);
+        w ~ normal(1.0, 2.0);
+        m ~ normal(0.0, 1.0);
+      }
+    """
+    with self.test_session():
+      model = ed.StanModel(model_code=model_code)
+      data = {'b': 3.5}
+      zs = {'s': tf.constant(0.7), 'v': tf.constant([-0.4, 0.9]),
+            'w': tf.constant(2.5), 'm': tf.constant(0.3)}
+      grads = tf.gradients(model.log_prob(data, zs),
+                           [zs['s'], zs['v'], zs['w'], zs['m']])
+      grads = [grad.eval() for grad in grads]
+      assert np.allclose(grads[0], -2.0)
+      assert np.allclose(grads[1], [0.4, -0.9])
+      assert np.allclose(grads[2], -(2.5 - 1.0) / 4.0)
+      assert np.allclose(grads[3], -0.3)
+
+  def test_grad_arrays(self):
+    model_code = """
+      data {
+        vector[3] a[2];
+        matrix[2, 2] b[3];
+      }
+      parameters {
+        vector<lower=0>[3] v[2];
+        matrix[2, 2] m[3];
+      }
+      model {
+        for (i in 1:2)
+          v[i] ~ normal(a[i], 1.0);
+        for (i in 1:3)
+          to_vector(m[i]) ~ normal(to_vector(b[i]), 1.0);
+      }
+    """
+    with self.test_session() as sess:
+      model = ed.StanModel(model_code=model_code)
+      data = {'a': np.arange(6.0).reshape([2, 3]) / 6.0,
+              'b': np.arange(12.0).reshape([3, 2, 2]) / 12.0}
+      v = np.array([[0.5, 1.5, 0.2], [1.0, 0.1, 2.0]])
+      m = np.linspace(-1.0, 1.0, 12).reshape([3, 2, 2])
+      zs = {'v': tf.placeholder(tf.float32, [2, 3]),
+            'm': tf.placeholder(tf.float32, [3, 2, 2])}
+      log_prob = model.log_prob(data, zs)
+      grads = tf.gradients(log_prob, [zs['v'], zs['m']])
+      grads = sess.run(grads, {zs['v']: v, zs['m']: m})
+      assert np.allclose(grads[0], -(v - data['a']))
+      assert np.allclose(grads[1], -(m - data['b']))
+      # Check each element against central finite differences.
+      for key, value, grad in zip(['v', 'm'], [v, m], grads):
+        for i in np.ndindex(*value.shape):
+          step = np.zeros(value.shape)
+          step[i] = 1e-2
+          feed = {zs['v']: v, zs['m']: m}
+          feed[zs[key]] = value + step
+          upper = sess.run(log_prob, feed)
+          feed[zs[key]] = value - step
+          lower = sess.run(log_prob, feed)
+          assert np.allclose((upper - lower) / 2e-2, grad[i], atol=1e-2)
+
+  def test_unsupported_type(self):
+    model_code = """
+      parameters {
+        simplex[3] p;
+      }
+      model {
+        p ~ dirichlet(rep_vector(1.0, 3));
+      }
+    """
+    self.assertRaises(NotImplementedError, ed.StanModel,
+                      model_code=model_code)
+
+  def test_cache(self):
+    model_code = """
+      parameters {
+        real p;
+      }
+      model {
+        p ~ normal(0.0, 1.0);
+      }
+    """
+    cache_dir = tempfile.mkdtemp()
+    model = ed.StanModel(model_code=model_code, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    # Check the compiled model is loaded from the cache, without
+    # compiling it again.
+    stan_model = pystan.StanModel
+
+    def fail(*args, **kwargs):
+      raise AssertionError("The cached model was compiled again.")
+
+    pystan.StanModel = fail
+    try:
+      model_1 = ed.StanModel(model_code=model_code, cache_dir=cache_dir)
+    finally:
+      pystan.StanModel = stan_model
+
+    assert len(os.listdir(cache_dir)) == 1
+    assert model_1.model.model_code == model.model.model_code
+
+  def test_cache_read_only(self):
+    model_code = """
+      parameters {
+        real p;
+      }
+      model {
+        p ~ normal(0.0, 1.0);
+      }
+    """
+    # Check a model is compiled even if it cannot be cached.
+    cache_dir = tempfile.mkdtemp()
+    os.chmod(cache_dir, 0o500)
+    try:
+      model = ed.StanModel(model_code=model_code, cache_dir=cache_dir)
+    finally:
+      os.chmod(cache_dir, 0o700)
+
+    assert model.model.model_code is not None
 
 if __name__ == '__main__':
   tf.test.main()
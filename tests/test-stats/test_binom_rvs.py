@@ -26,15 +26,15 @@ class test_binom_rvs_class(tf.test.TestCase):
     self._test(np.array([3, 2]), np.array([0.2, 0.8]), 1)
     self._test(np.array([3, 2]), np.array([0.2, 0.8]), 10)
 
-  # def test_2d(self):
-  #    self._test(np.array([[3]]), np.array([[0.5]]), 1)
-  #    self._test(np.array([[3]]), np.array([[0.5]]), 5)
-  #    self._test(np.array([[3, 2]]), np.array([[0.2, 0.8]]), 1)
-  #    self._test(np.array([[3, 2]]), np.array([[0.2, 0.8]]), 10)
-  #    self._test(np.array([[3, 2], [7, 4]]),
-  #               np.array([[0.2, 0.8], [0.7, 0.6]]), 1)
-  #    self._test(np.array([[3, 2], [7, 4]]),
-  #               np.array([[0.2, 0.8], [0.7, 0.6]]), 10)
+  def test_2d(self):
+    self._test(np.array([[3]]), np.array([[0.5]]), 1)
+    self._test(np.array([[3]]), np.array([[0.5]]), 5)
+    self._test(np.array([[3, 2]]), np.array([[0.2, 0.8]]), 1)
+    self._test(np.array([[3, 2]]), np.array([[0.2, 0.8]]), 10)
+    self._test(np.array([[3, 2], [7, 4]]),
+               np.array([[0.2, 0.8], [0.7, 0.6]]), 1)
+    self._test(np.array([[3, 2], [7, 4]]),
+               np.array([[0.2, 0.8], [0.7, 0.6]]), 10)
 
 if __name__ == '__main__':
   tf.test.main()
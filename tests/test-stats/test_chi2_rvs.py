@@ -26,13 +26,13 @@ class test_chi2_rvs_class(tf.test.TestCase):
     self._test(np.array([3, 2]), 1)
     self._test(np.array([3, 2]), 10)
 
-  # def test_2d(self):
-  #    self._test(np.array([[3]]), 1)
-  #    self._test(np.array([[3]]), 5)
-  #    self._test(np.array([[3, 2]]), 1)
-  #    self._test(np.array([[3, 2]]), 10)
-  #    self._test(np.array([[3, 2], [7, 4]]), 1)
-  #    self._test(np.array([[3, 2], [7, 4]]), 10)
+  def test_2d(self):
+    self._test(np.array([[3]]), 1)
+    self._test(np.array([[3]]), 5)
+    self._test(np.array([[3, 2]]), 1)
+    self._test(np.array([[3, 2]]), 10)
+    self._test(np.array([[3, 2], [7, 4]]), 1)
+    self._test(np.array([[3, 2], [7, 4]]), 10)
 
 if __name__ == '__main__':
   tf.test.main()
@@ -7,6 +7,7 @@ import tensorflow as tf
 
 from edward.stats import multinomial
 from itertools import product
+from scipy import stats
 from scipy.special import gammaln
 
 
@@ -81,5 +82,28 @@ class test_multinomial_entropy_class(tf.test.TestCase):
     self._test(np.array([1, 3]), np.array([[0.5, 0.5], [0.75, 0.25]]))
     self._test(np.array([5, 2]), np.array([[0.5, 0.5], [0.75, 0.25]]))
 
+  def test_zero_probabilities(self):
+    # Categories with zero probability do not change the entropy.
+    n = np.array([3, 2])
+    p = np.array([[0.75, 0.25, 0.0], [1.0, 0.0, 0.0]])
+    val_true = np.array([multinomial_entropy(3, np.array([0.75, 0.25])),
+                         0.0])
+    with self.test_session():
+      self.assertAllClose(multinomial.entropy(n, p).eval(), val_true)
+      p_tf = tf.constant(p, dtype=tf.float32)
+      grad = tf.gradients(multinomial.entropy(n, p_tf), [p_tf])[0]
+      assert np.all(np.isfinite(grad.eval()))
+
+  def test_large(self):
+    # Enumerating all configurations of counts is intractable here.
+    n = np.array([50, 100])
+    p = np.array([[0.1, 0.2, 0.3, 0.15, 0.05, 0.2],
+                  [0.3, 0.1, 0.1, 0.2, 0.25, 0.05]])
+    val_true = np.array([-stats.multinomial.entropy(n[i], p[i])
+                         for i in range(2)])
+    with self.test_session():
+      self.assertAllClose(multinomial.entropy(n, p).eval(), val_true,
+                          rtol=1e-4, atol=1e-4)
+
 if __name__ == '__main__':
   tf.test.main()
@@ -20,11 +20,19 @@ class test_multinomial_rvs_class(tf.test.TestCase):
     self._test(3, np.array([0.4, 0.6]), 1)
     self._test(np.array(3), np.array([0.4, 0.6]), 5)
 
-  # def test_2d(self):
-  #    self._test(np.array([3]), np.array([[0.4, 0.6]]), 1)
-  #    self._test(np.array([3]), np.array([[0.4, 0.6]]), 5)
-  #    self._test(np.array([3, 2]), np.array([[0.2, 0.8], [0.6, 0.4]]), 1)
-  #    self._test(np.array([3, 2]), np.array([[0.2, 0.8], [0.6, 0.4]]), 10)
+  def test_2d(self):
+    self._test(np.array([3]), np.array([[0.4, 0.6]]), 1)
+    self._test(np.array([3]), np.array([[0.4, 0.6]]), 5)
+    self._test(np.array([3, 2]), np.array([[0.2, 0.8], [0.6, 0.4]]), 1)
+    self._test(np.array([3, 2]), np.array([[0.2, 0.8], [0.6, 0.4]]), 10)
+
+  def test_zero_probabilities(self):
+    p = np.array([[0.5, 0.5, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0]])
+    with np.errstate(all='raise'):
+      x = multinomial.rvs(np.array([3, 2]), p, size=10)
+
+    assert np.all(x[..., 2:] == 0)
+    assert np.all(np.sum(x, -1) == [3, 2])
 
 if __name__ == '__main__':
   tf.test.main()
@@ -22,15 +22,27 @@ class test_multivariate_normal_rvs_class(tf.test.TestCase):
     self._test(np.array([0.2, 0.8]), np.diag([1.0, 1.0]), 1)
     self._test(np.array([0.2, 0.8]), np.diag([1.0, 1.0]), 10)
 
-  # def test_2d(self):
-  #    self._test(np.array([[0.5]]), np.asarray([np.diag([1.0])]), 1)
-  #    self._test(np.array([[0.5]]), np.asarray([np.diag([1.0])]), 5)
-  #    self._test(np.array([[0.2, 0.8]]), np.asarray([np.diag([1.0]*2)]), 1)
-  #    self._test(np.array([[0.2, 0.8]]), np.asarray([np.diag([1.0]*2)]), 10)
-  #    self._test(np.array([[0.2, 0.8], [0.7, 0.6]]),
-  #                   np.asarray([np.diag([1.0]*2)]*2), 1)
-  #    self._test(np.array([[0.2, 0.8], [0.7, 0.6]]),
-  #                   np.asarray([np.diag([1.0]*2)]*2), 10)
+  def test_2d(self):
+    self._test(np.array([[0.5]]), np.asarray([np.diag([1.0])]), 1)
+    self._test(np.array([[0.5]]), np.asarray([np.diag([1.0])]), 5)
+    self._test(np.array([[0.2, 0.8]]), np.asarray([np.diag([1.0]*2)]), 1)
+    self._test(np.array([[0.2, 0.8]]), np.asarray([np.diag([1.0]*2)]), 10)
+    self._test(np.array([[0.2, 0.8], [0.7, 0.6]]),
+               np.asarray([np.diag([1.0]*2)]*2), 1)
+    self._test(np.array([[0.2, 0.8], [0.7, 0.6]]),
+               np.asarray([np.diag([1.0]*2)]*2), 10)
+
+  def test_2d_shared_cov(self):
+    # A single covariance matrix is shared by all means, including one
+    # whose size equals the number of means.
+    mean = np.array([[0.2, 0.8], [0.7, 0.6]])
+    cov = np.array([[1.0, 0.9], [0.9, 1.0]])
+    self._test(mean, cov, 1)
+    self._test(mean, cov, 10)
+    x = multivariate_normal.rvs(mean, cov, size=20000)
+    for i in range(2):
+      assert np.allclose(np.mean(x[:, i], 0), mean[i], atol=0.05)
+      assert np.allclose(np.cov(x[:, i].T), cov, atol=0.05)
 
 if __name__ == '__main__':
   tf.test.main()
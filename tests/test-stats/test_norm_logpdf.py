@@ -35,5 +35,44 @@ class test_norm_logpdf_class(tf.test.TestCase):
                np.array([0.0] * 4, dtype=np.float32),
                np.array([1.0] * 4, dtype=np.float32))
 
+  def test_compact_1d(self):
+    # Check observations in a compact dtype are cast lazily.
+    self._test(np.array([0, 1, 2, 3], dtype=np.int8),
+               np.array([0.0] * 4, dtype=np.float32),
+               np.array([1.0] * 4, dtype=np.float32))
+
+  def test_sparse_2d(self):
+    x = np.array([[0.0, 1.0, 0.58], [2.3, 0.0, 0.0]], dtype=np.float32)
+    mu = np.array([0.5, -0.5, 0.0], dtype=np.float32)
+    sigma = np.array([[1.0], [2.0]], dtype=np.float32)
+    rows, cols = np.nonzero(x)
+    xtf = tf.SparseTensor(np.vstack([rows, cols]).T.astype(np.int64),
+                          x[rows, cols], x.shape)
+    with self.test_session():
+      # Check the log density sums over all entries, including zeros.
+      self.assertAllClose(norm.logpdf(xtf, mu, sigma).eval(),
+                          np.sum(stats.norm.logpdf(x, mu, sigma)))
+      # Check it is evaluated only at the entries if zeros are missing.
+      self.assertAllClose(
+          norm.logpdf(xtf, mu, sigma, missing='implicit').eval(),
+          stats.norm.logpdf(x, mu, sigma)[rows, cols])
+
+  def test_factorization(self):
+    s = np.random.randn(6, 3).astype(np.float32)
+    t = np.random.randn(4, 3).astype(np.float32)
+    mu = np.dot(s, t.T)
+    x = (np.random.randn(6, 4) * (np.random.rand(6, 4) < 0.5)).astype(
+        np.float32)
+    rows, cols = np.nonzero(x)
+    xtf = tf.SparseTensor(np.vstack([rows, cols]).T.astype(np.int64),
+                          x[rows, cols], x.shape)
+    val_true = np.sum(stats.norm.logpdf(x, mu, 2.0))
+    with self.test_session():
+      self.assertAllClose(norm.factorization_logpdf(xtf, s, t, 2.0).eval(),
+                          val_true)
+      self.assertAllClose(
+          norm.factorization_logpdf(tf.constant(x), s, t, 2.0).eval(),
+          val_true)
+
 if __name__ == '__main__':
   tf.test.main()
@@ -42,5 +42,60 @@ class test_poisson_logpmf_class(tf.test.TestCase):
     self._test(np.array([[0.0, 1.0, 3.0], [0.0, 1.0, 3.0]]), 0.5)
     self._test(np.array([[1.0, 8.0, 2.0], [1.0, 8.0, 2.0]]), 0.75)
 
+  def test_sparse_2d(self):
+    x = np.array([[0.0, 1.0, 3.0], [0.0, 0.0, 2.0]], dtype=np.float32)
+    mu = np.array([[0.5, 1.5, 2.0], [0.1, 0.2, 0.3]], dtype=np.float32)
+    rows, cols = np.nonzero(x)
+    xtf = tf.SparseTensor(np.vstack([rows, cols]).T.astype(np.int64),
+                          x[rows, cols], x.shape)
+    with self.test_session():
+      # Check the log mass sums over all entries, including zeros.
+      self.assertAllClose(poisson.logpmf(xtf, mu).eval(),
+                          np.sum(stats.poisson.logpmf(x, mu)))
+      # Check parameters broadcast along rows.
+      self.assertAllClose(poisson.logpmf(xtf, mu[0]).eval(),
+                          np.sum(stats.poisson.logpmf(x, mu[0])))
+      self.assertAllClose(poisson.logpmf(xtf, 0.5).eval(),
+                          np.sum(stats.poisson.logpmf(x, 0.5)))
+      # Check the log mass is evaluated only at the entries if zeros
+      # are missing.
+      self.assertAllClose(poisson.logpmf(xtf, mu, missing='implicit').eval(),
+                          stats.poisson.logpmf(x, mu)[rows, cols])
+      self.assertAllClose(
+          poisson.logpmf(xtf, mu[0], missing='implicit').eval(),
+          stats.poisson.logpmf(x, mu[0])[rows, cols])
+
+  def test_factorization(self):
+    s = np.random.rand(6, 3).astype(np.float32)
+    t = np.random.rand(4, 3).astype(np.float32)
+    mu = np.dot(s, t.T)
+    x = np.random.poisson(mu) * (np.random.rand(6, 4) < 0.5)
+    rows, cols = np.nonzero(x)
+    xtf = tf.SparseTensor(np.vstack([rows, cols]).T.astype(np.int64),
+                          x[rows, cols].astype(np.float32), x.shape)
+    val_true = np.sum(stats.poisson.logpmf(x, mu))
+    with self.test_session():
+      self.assertAllClose(poisson.factorization_logpmf(xtf, s, t).eval(),
+                          val_true)
+      self.assertAllClose(
+          poisson.factorization_logpmf(tf.constant(x), s, t).eval(),
+          val_true)
+
+  def test_negative_sampling(self):
+    mu = np.random.rand(6, 4).astype(np.float32) + 0.5
+    x = np.random.poisson(mu) * (np.random.rand(6, 4) < 0.5)
+    rows, cols = np.nonzero(x)
+    xtf = tf.SparseTensor(np.vstack([rows, cols]).T.astype(np.int64),
+                          x[rows, cols].astype(np.float32), x.shape)
+    val_true = np.sum(stats.poisson.logpmf(x, mu))
+    mutf = tf.constant(mu)
+
+    def params(rows, cols):
+      return tf.gather(tf.reshape(mutf, [-1]), rows * 4 + cols)
+
+    with self.test_session():
+      val_est = poisson.negative_sampling_logpmf(xtf, params, 100000)
+      self.assertAllClose(val_est.eval(), val_true, rtol=1e-2, atol=1e-1)
+
 if __name__ == '__main__':
   tf.test.main()
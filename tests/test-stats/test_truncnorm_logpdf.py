@@ -11,14 +11,15 @@ from scipy import stats
 
 class test_trucnorm_logpdf_class(tf.test.TestCase):
 
-  def _test(self, x, a, b, loc=0, scale=1):
+  def _test(self, x, a, b, loc=0, scale=1, atol=1e-6):
     xtf = tf.constant(x)
     val_true = stats.truncnorm.logpdf(x, a, b, loc, scale)
     with self.test_session():
       self.assertAllClose(truncnorm.logpdf(xtf, a, b, loc, scale).eval(),
-                          val_true)
+                          val_true, atol=atol)
       self.assertAllClose(truncnorm.logpdf(xtf, a, b, tf.constant(loc),
-                                           tf.constant(scale)).eval(), val_true)
+                                           tf.constant(scale)).eval(),
+                          val_true, atol=atol)
 
   def test_0d(self):
     self._test(0.0, a=-1.0, b=3.0)
@@ -31,5 +32,15 @@ class test_trucnorm_logpdf_class(tf.test.TestCase):
     self._test(np.array([[0.0, 1.0, 0.58, 2.3], [0.0, 1.0, 0.58, 2.3]]),
                a=-1.0, b=3.0)
 
+  def test_loc_scale(self):
+    self._test(np.array([0.0, 1.0, 0.58, 2.3]), a=-1.0, b=3.0,
+               loc=0.5, scale=2.0)
+
+  def test_tail(self):
+    # The log normalizer is about -117, so allow for single precision.
+    self._test(np.array([-16.0, -15.5, -15.1]), a=-20.0, b=-15.0,
+               atol=1e-4)
+    self._test(np.array([15.1, 17.0, 20.0]), a=15.0, b=30.0, atol=1e-4)
+
 if __name__ == '__main__':
   tf.test.main()
@@ -30,5 +30,19 @@ class test_truncnorm_rvs_class(tf.test.TestCase):
     self._test(np.array([0.0, 0.4]), np.array([0.2, 0.8]),
                np.array([0.2, 0.8]), np.array([0.2, 0.8]), 10)
 
+  def test_sample_n(self):
+    a = np.array([-1.0, 2.0, -20.0])
+    b = np.array([3.0, 5.0, -15.0])
+    loc = np.array([0.5, 0.0, 0.0])
+    scale = np.array([2.0, 1.0, 1.0])
+    with self.test_session():
+      x = truncnorm.sample_n(10000, a, b, loc, scale, seed=42).eval()
+      assert x.shape == (10000, 3)
+      assert np.all(x >= loc + scale * a - 1e-4)
+      assert np.all(x <= loc + scale * b + 1e-4)
+      self.assertAllClose(np.mean(x, 0),
+                          stats.truncnorm.mean(a, b, loc, scale),
+                          rtol=0.05, atol=0.05)
+
 if __name__ == '__main__':
   tf.test.main()
@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from edward.util import BatchIterator
+
+
+class FailingArray(object):
+  """Array whose reads fail after the first one."""
+  shape = (10, )
+
+  def __init__(self):
+    self.n_reads = 0
+
+  def __getitem__(self, idx):
+    self.n_reads += 1
+    if self.n_reads > 1:
+      raise IOError("Cannot read the array.")
+
+    return np.zeros(len(idx))
+
+
+class test_batch_iterator_class(tf.test.TestCase):
+
+  def test_epoch(self):
+    x = np.arange(10)
+    y = 2 * np.arange(10)
+    batches = BatchIterator([x, y], 5)
+    val = [next(batches) for _ in range(2)]
+    batches.close()
+    # Check rows of different arrays stay aligned.
+    for x_batch, y_batch in val:
+      self.assertAllEqual(2 * x_batch, y_batch)
+
+    # Check one epoch visits every row once.
+    self.assertAllEqual(np.sort(np.concatenate([v[0] for v in val])), x)
+    self.assertEqual(batches.epoch, 1)
+
+  def test_remainder(self):
+    x = np.arange(10)
+    batches = BatchIterator([x], 4, shuffle=False)
+    val = [next(batches)[0] for _ in range(3)]
+    batches.close()
+    # Check rows left over in an epoch continue into the next.
+    self.assertAllEqual(val[2], [0, 1, 8, 9])
+    self.assertEqual(batches.epoch, 1)
+
+  def test_dtype(self):
+    x = np.arange(10)
+    batches = BatchIterator([x], 5, dtype=np.float32)
+    x_batch, = next(batches)
+    batches.close()
+    self.assertEqual(x_batch.dtype, np.float32)
+
+  def test_error(self):
+    # Check an error in the background thread is raised by the next
+    # minibatch, even if the buffer is full when it occurs.
+    batches = BatchIterator([FailingArray()], 5, n_prefetch=1)
+    next(batches)
+    with self.assertRaises(IOError):
+      next(batches)
+
+    batches.close()
+
+  def test_mismatched_rows(self):
+    with self.assertRaises(ValueError):
+      BatchIterator([np.zeros(10), np.zeros(9)], 5)
+
+if __name__ == '__main__':
+  tf.test.main()
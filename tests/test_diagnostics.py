@@ -0,0 +1,39 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from edward.criticisms import effective_sample_size, \
+    potential_scale_reduction
+
+
+class test_diagnostics_class(tf.test.TestCase):
+
+  def test_iid_chains(self):
+    x = np.random.randn(4, 1000, 3)
+    rhat = potential_scale_reduction(x)
+    ess = effective_sample_size(x)
+    assert rhat.shape == (3,)
+    assert ess.shape == (3,)
+    assert np.all(np.abs(rhat - 1.0) < 0.01)
+    assert np.all(ess > 2000)
+
+  def test_autocorrelated_chains(self):
+    # AR(1) chains with coefficient 0.9 have an effective sample size
+    # of about (1 - 0.9) / (1 + 0.9) times the number of samples.
+    x = np.zeros([4, 2000])
+    for t in range(1, 2000):
+      x[:, t] = 0.9 * x[:, t - 1] + np.random.randn(4)
+
+    ess = effective_sample_size(x)
+    assert 200 < ess < 800
+
+  def test_separated_chains(self):
+    x = np.random.randn(4, 1000) + np.arange(4).reshape([4, 1])
+    assert potential_scale_reduction(x) > 1.1
+
+if __name__ == '__main__':
+  np.random.seed(42)
+  tf.test.main()
@@ -5,10 +5,15 @@ from __future__ import print_function
 import tensorflow as tf
 import numpy as np
 import edward as ed
+import os
 import six
+import tempfile
 
-from edward.models import Normal
+from scipy import sparse
+
+from edward.models import Normal, PointMass
 from edward.stats import norm
+from scipy import stats
 
 
 class NormalModel:
@@ -19,6 +24,23 @@ class NormalModel:
     return log_lik + log_prior
 
 
+class NormalLikModel(NormalModel):
+  """p(x, mu) = Normal(x; mu, 1) Normal(mu; 0, 1), with its
+  log-likelihood."""
+  def log_lik(self, xs, zs):
+    return tf.reduce_sum(norm.logpdf(xs['x'], zs['mu'], 1.0))
+
+
+class NormalEntriesModel:
+  """p(x, mu) = Normal(x; mu, 1) Normal(mu; 0, 1), with the
+  log-likelihood of the stored entries of sparse data only."""
+  def log_prob(self, xs, zs):
+    log_prior = norm.logpdf(zs['mu'], 0.0, 1.0)
+    log_lik = tf.reduce_sum(
+        norm.logpdf(xs['x'], zs['mu'], 1.0, missing='implicit'))
+    return log_lik + log_prior
+
+
 class test_inference_data_class(tf.test.TestCase):
 
   def read_and_decode_single_example(self, filename):
@@ -106,6 +128,328 @@ class test_inference_data_class(tf.test.TestCase):
       data = {'x': x}
       self._test(sess, data, None, is_file=True)
 
+  def test_tfrecord(self):
+    with self.test_session() as sess:
+      records = ed.TFRecordData(
+          "tests/data/toy_data.tfrecords",
+          {'outcome': tf.FixedLenFeature([], tf.int64)},
+          capacity=10, n_data=10)
+      model = NormalModel()
+      qmu = Normal(mu=tf.Variable(tf.random_normal([1])),
+                   sigma=tf.constant([1.0]))
+
+      inference = ed.MFVI({'mu': qmu}, {'x': records['outcome']}, model)
+      inference.initialize(n_minibatch=5)
+      assert inference.scale['x'] == 2.0
+      # Check records are parsed in minibatches.
+      val = sess.run(inference.data)
+      assert val['x'].shape == (5, )
+      inference.finalize()
+      # Check the pipeline is built again in a new graph.
+      with tf.Graph().as_default() as graph:
+        assert records.build(5)['outcome'].graph is graph
+
+  def test_tfrecord_var_len(self):
+    with self.test_session() as sess:
+      filename = os.path.join(tempfile.mkdtemp(), 'var_len.tfrecords')
+      writer = tf.python_io.TFRecordWriter(filename)
+      for n in range(10):
+        feature = tf.train.Feature(
+            int64_list=tf.train.Int64List(value=list(range(n % 3 + 1))))
+        example = tf.train.Example(
+            features=tf.train.Features(feature={'x': feature}))
+        writer.write(example.SerializeToString())
+
+      writer.close()
+      records = ed.TFRecordData(
+          filename, {'x': tf.VarLenFeature(tf.int64)}, capacity=10,
+          n_data=10)
+      model = NormalEntriesModel()
+      qmu = Normal(mu=tf.Variable(tf.random_normal([1])),
+                   sigma=tf.constant([1.0]))
+
+      inference = ed.MFVI({'mu': qmu}, {'x': records['x']}, model)
+      inference.initialize(n_minibatch=5)
+      # Check the records are parsed in sparse minibatches, cast to
+      # floats, and passed to the model wrapper.
+      x = inference.data['x']
+      assert isinstance(x, tf.SparseTensor)
+      assert x.dtype == tf.float32
+      log_prob, val = sess.run(
+          [model.log_prob(inference.data, {'mu': tf.constant([0.5])}),
+           x.values])
+      assert np.allclose(log_prob, np.sum(stats.norm.logpdf(val, 0.5)) +
+                         stats.norm.logpdf(0.5))
+      inference.finalize()
+
+      # Random variables cannot take the sparse minibatches.
+      mu = Normal(mu=tf.zeros(1), sigma=tf.ones(1))
+      x = Normal(mu=tf.ones(5) * mu, sigma=tf.ones(5))
+      inference = ed.MFVI({mu: qmu}, {x: records['x']})
+      self.assertRaises(TypeError, inference.initialize, n_minibatch=5)
+
+  def test_batch_rows(self):
+    with self.test_session() as sess:
+      n_queue_runners = len(tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS))
+      x = np.arange(10, dtype=np.float32)
+      model = NormalModel()
+      qmu = Normal(mu=tf.Variable(tf.random_normal([1])),
+                   sigma=tf.constant([1.0]))
+
+      inference = ed.MFVI({'mu': qmu}, {'x': x}, model)
+      inference.initialize(n_minibatch=5)
+      # Check the data is batched without queue runners, by gathering
+      # the rows at the fed indices.
+      assert len(tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS)) == \
+          n_queue_runners
+      idx = np.array([1, 4, 5, 7, 8], dtype=np.int32)
+      val = sess.run(inference.data['x'],
+                     {inference.batch_indices['x']: idx})
+      assert np.all(val == x[idx])
+      inference.update()
+      inference.finalize()
+
+  def test_grouped(self):
+    with self.test_session() as sess:
+      x = np.arange(10, dtype=np.float32)
+      y = 2 * np.arange(10, dtype=np.float32)
+      g = np.arange(4, dtype=np.float32)
+      model = NormalModel()
+      qmu = Normal(mu=tf.Variable(tf.random_normal([1])),
+                   sigma=tf.constant([1.0]))
+
+      data = {'x': x, 'y': y, 'g': g}
+      inference = ed.MFVI({'mu': qmu}, data, model)
+      inference.initialize(n_minibatch={'x': 5})
+      # Check each group has its own scale.
+      assert inference.scale == {'x': 2.0, 'y': 2.0, 'g': 1.0}
+      val_x, val_y, val_g, idx = sess.run(
+          [inference.data['x'], inference.data['y'], inference.data['g'],
+           inference.batch_indices['x']])
+      # Check rows in the same group are subsampled jointly, and the
+      # indices locate the rows of the batch.
+      assert val_x.shape == (5, )
+      assert np.all(val_y == 2 * val_x)
+      assert np.all(val_x == x[idx])
+      # Check groups without a batch size use all their data.
+      assert np.all(val_g == g)
+      inference.finalize()
+
+  def test_scale(self):
+    with self.test_session() as sess:
+      x_data = np.arange(10, dtype=np.float32)
+      qmu = PointMass(params=tf.Variable(tf.constant([0.5])))
+
+      # Check only the log-likelihood is scaled, for model wrappers.
+      inference = ed.MAP({'mu': qmu}, {'x': x_data}, NormalLikModel())
+      inference.initialize(n_minibatch=5)
+      loss, val, mu = sess.run(
+          [inference.loss, inference.data['x'], qmu.params])
+      log_joint = stats.norm.logpdf(mu, 0.0, 1.0).sum() + \
+          2.0 * stats.norm.logpdf(val, mu, 1.0).sum()
+      self.assertAllClose(loss, log_joint)
+      inference.finalize()
+
+      # Check each observed random variable is scaled by the scale of
+      # its group.
+      y_data = np.arange(4, dtype=np.float32)
+      mu_rv = Normal(mu=tf.zeros(1), sigma=tf.ones(1))
+      x = Normal(mu=tf.ones(5) * mu_rv, sigma=tf.ones(5))
+      y = Normal(mu=tf.ones(1) * mu_rv, sigma=tf.ones(1))
+      inference = ed.MAP({mu_rv: qmu}, {x: x_data, y: y_data})
+      inference.initialize(n_minibatch={x: 5, y: 1})
+      assert inference.scale == {x: 2.0, y: 4.0}
+      loss, val_x, val_y, mu = sess.run(
+          [inference.loss, inference.data[x], inference.data[y],
+           qmu.params])
+      log_joint = stats.norm.logpdf(mu, 0.0, 1.0).sum() + \
+          2.0 * stats.norm.logpdf(val_x, mu, 1.0).sum() + \
+          4.0 * stats.norm.logpdf(val_y, mu, 1.0).sum()
+      self.assertAllClose(loss, log_joint)
+      inference.finalize()
+
+  def test_local_scale(self):
+    with self.test_session() as sess:
+      x_data = np.arange(10, dtype=np.float32)
+      x_ph = ed.placeholder(tf.float32, [None])
+      n_batch = tf.pack([tf.shape(x_ph)[0]])
+      # A nearly deterministic inference network, so that the loss is
+      # the ELBO up to a negligible sampling error.
+      q_sigma = 1e-4
+
+      def elbo(val, z_mu):
+        kl = 0.5 * (q_sigma ** 2 + z_mu ** 2 - 1.0) - np.log(q_sigma)
+        return np.sum(stats.norm.logpdf(val, z_mu, 1.0) - kl)
+
+      # Check the prior, or KL, of local latent variables is scaled
+      # as the log-likelihood of their data, so that the loss
+      # estimates the ELBO of the full data.
+      z = Normal(mu=tf.zeros(n_batch), sigma=tf.ones(n_batch))
+      x = Normal(mu=z, sigma=tf.ones(n_batch))
+      qz = Normal(mu=tf.Variable(0.5) * x_ph,
+                  sigma=q_sigma * tf.ones(n_batch))
+
+      inference = ed.MFVI({z: qz}, {x: x_data, x_ph: x_data})
+      inference.initialize(n_minibatch=5)
+      loss, val = sess.run([inference.loss, inference.data[x]])
+      self.assertAllClose(loss, 2.0 * elbo(val, 0.5 * val), rtol=1e-3)
+      inference.finalize()
+
+      # Check the same for model wrappers.
+      qz = Normal(mu=tf.Variable(0.5) * x_ph,
+                  sigma=q_sigma * tf.ones(n_batch))
+
+      inference = ed.MFVI({'mu': qz}, {'x': x_data, x_ph: x_data},
+                          NormalLikModel())
+      inference.initialize(n_minibatch=5)
+      loss, val = sess.run([inference.loss, inference.data['x']])
+      self.assertAllClose(loss, 2.0 * elbo(val, 0.5 * val), rtol=1e-3)
+      inference.finalize()
+
+  def test_local_vars(self):
+    with self.test_session() as sess:
+      x_data = np.arange(10, dtype=np.float32)
+      z = Normal(mu=tf.zeros(5), sigma=tf.ones(5))
+      x = Normal(mu=z, sigma=tf.ones(5))
+      qz_mu = tf.Variable(tf.random_normal([10]))
+      qz = Normal(mu=qz_mu, sigma=tf.nn.softplus(tf.Variable(tf.zeros([10]))))
+
+      inference = ed.MFVI({z: qz}, {x: x_data})
+      inference.initialize(n_minibatch=5, local_vars={z: x})
+      # Check only the rows of the minibatch are gathered, both for a
+      # parameter which is a variable and one which is a tensor.
+      val_mu, val_sigma, idx, val_x = sess.run(
+          [inference.latent_vars[z].mu, inference.latent_vars[z].sigma,
+           inference.batch_indices[x], inference.data[x]])
+      assert val_mu.shape == (5, )
+      assert val_sigma.shape == (5, )
+      assert np.allclose(val_mu, qz_mu.eval()[idx])
+      assert np.all(val_x == x_data[idx])
+      # Check the prior and KL of the local latent variable are scaled
+      # as the log-likelihood of its data.
+      assert inference._latent_scale[z] == 2.0
+      # Check the gradient is sparse.
+      grad = tf.gradients(inference.loss, [qz_mu.ref()])[0]
+      assert isinstance(grad, tf.IndexedSlices)
+      # Check updates leave the rows outside the minibatches unchanged,
+      # also over several steps of the default optimizer.
+      val_before = qz_mu.eval()
+      idx = [sess.run([inference.train, inference.batch_indices[x]])[1]
+             for _ in range(2)]
+      val_after = qz_mu.eval()
+      outside = np.setdiff1d(np.arange(10), np.concatenate(idx))
+      assert np.all(val_after[outside] == val_before[outside])
+      assert not np.allclose(val_after[idx[1]], val_before[idx[1]])
+      inference.finalize()
+
+  def test_compact_dtype(self):
+    with self.test_session() as sess:
+      x = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9], dtype=np.int8)
+      model = NormalModel()
+      qmu = Normal(mu=tf.Variable(tf.random_normal([1])),
+                   sigma=tf.constant([1.0]))
+
+      inference = ed.MFVI({'mu': qmu}, {'x': x}, model)
+      inference.initialize()
+      # Check data is stored in its compact dtype.
+      assert inference.data['x'].dtype.base_dtype == tf.int8
+      val = sess.run(inference.data)
+      assert np.all(val['x'] == x)
+      inference.update()
+      inference.finalize()
+
+  def test_amortized(self):
+    with self.test_session() as sess:
+      x = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9])
+      x_ph = ed.placeholder(tf.float32, [None])
+      # Variational parameter is a function of the data placeholder.
+      qmu = Normal(mu=tf.Variable(tf.zeros([1])) +
+                   tf.reduce_mean(x_ph, 0, keep_dims=True),
+                   sigma=tf.constant([1.0]))
+      data = {'x': x, x_ph: x}
+
+      inference = ed.MFVI({'mu': qmu}, data, NormalModel())
+      inference.initialize(n_minibatch=5)
+      # Check data bound twice is batched once.
+      assert inference.data['x'] is inference.data[x_ph]
+      # Check the variational model takes the minibatch as input.
+      qmu_mu, val = sess.run([inference.latent_vars['mu'].mu,
+                              inference.data['x']])
+      assert np.allclose(qmu_mu, np.mean(val))
+      inference.finalize()
+
+  def test_memmap(self):
+    with self.test_session() as sess:
+      x = np.arange(10, dtype=np.float32)
+      filename = os.path.join(tempfile.mkdtemp(), 'x.npy')
+      np.save(filename, x)
+      model = NormalModel()
+      qmu = Normal(mu=tf.Variable(tf.random_normal([1])),
+                   sigma=tf.constant([1.0]))
+
+      inference = ed.MFVI({'mu': qmu}, {'x': filename}, model)
+      inference.initialize(n_minibatch=5)
+      assert inference.scale['x'] == 2.0
+      # Check batches are rows of the data, and each epoch visits
+      # every row once.
+      val = np.concatenate([next(inference.batches)[0] for _ in range(2)])
+      assert val.shape == (10, )
+      assert np.all(np.sort(val) == x)
+      # Check batches are fed at each update.
+      inference.update()
+      inference.finalize()
+
+  def test_sparse(self):
+    with self.test_session() as sess:
+      x = sparse.random(10, 4, density=0.5, format='csr', dtype=np.float32)
+      model = NormalModel()
+      qmu = Normal(mu=tf.Variable(tf.random_normal([1])),
+                   sigma=tf.constant([1.0]))
+
+      # Preloaded full setting.
+      inference = ed.MFVI({'mu': qmu}, {'x': x}, model)
+      inference.initialize()
+      assert isinstance(inference.data['x'], tf.SparseTensor)
+      val = sess.run(inference.data['x'].values)
+      assert np.allclose(np.sort(val), np.sort(x.data))
+      inference.finalize()
+
+      # Preloaded batch setting, subsampling nonzero entries.
+      inference = ed.MFVI({'mu': qmu}, {'x': x}, NormalEntriesModel())
+      inference.initialize(n_minibatch=5, sparse_minibatch='nonzero')
+      assert inference.scale['x'] == x.nnz / 5.0
+      val = sess.run(inference.data['x'].values)
+      assert val.shape == (5, )
+      assert np.all(np.in1d(val, x.data))
+      inference.finalize()
+
+      # Check a minibatch of nonzero entries is not read as having
+      # zeros at the entries which are not stored.
+      inference = ed.MFVI({'mu': qmu}, {'x': x}, model)
+      self.assertRaises(ValueError, inference.initialize,
+                        n_minibatch=5, sparse_minibatch='nonzero')
+
+      # Preloaded batch setting, subsampling rows.
+      inference = ed.MFVI({'mu': qmu}, {'x': x}, model)
+      inference.initialize(n_minibatch=5)
+      assert inference.scale['x'] == 2.0
+      batch, = next(inference.batches)
+      assert batch.shape == (5, 4)
+      inference.update()
+      inference.finalize()
+
+  def test_sparse_random_variable(self):
+    with self.test_session():
+      x_data = sparse.random(10, 4, density=0.5, format='csr',
+                             dtype=np.float32)
+      mu = Normal(mu=tf.zeros(1), sigma=tf.ones(1))
+      x = Normal(mu=tf.ones([10, 4]) * mu, sigma=tf.ones([10, 4]))
+      qmu = Normal(mu=tf.Variable(tf.zeros(1)), sigma=tf.ones(1))
+
+      # Check sparse data is rejected for random variables.
+      inference = ed.MFVI({mu: qmu}, {x: x_data})
+      self.assertRaises(TypeError, inference.initialize)
+
 if __name__ == '__main__':
   ed.set_seed(1512351)
   tf.test.main()
@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import edward as ed
+import numpy as np
+import tensorflow as tf
+
+from edward.models import Normal
+from edward.stats import norm
+from scipy import stats
+
+
+class NormalModel:
+  """p(x, mu) = Normal(x; mu, 1) Normal(mu; 0, 1)"""
+  def log_prob(self, xs, zs):
+    log_prior = norm.logpdf(zs['mu'], 0.0, 1.0)
+    log_lik = tf.reduce_sum(norm.logpdf(xs['x'], zs['mu'], 1.0))
+    return log_lik + tf.reduce_sum(log_prior)
+
+
+def _model(x_data, qmu, native):
+  N = x_data.shape[0]
+  if native:
+    mu = Normal(mu=tf.zeros(1), sigma=tf.ones(1))
+    x = Normal(mu=tf.ones(N) * mu, sigma=tf.ones(N))
+    return {mu: qmu}, {x: x_data}, None
+  else:
+    return {'mu': qmu}, {'x': x_data}, NormalModel()
+
+
+def _test_bound(native):
+  # The posterior of the normal mean is normal with precision N + 1,
+  # and the data is jointly normal with covariance I + 11^T.
+  N = 50
+  x_data = np.random.randn(N).astype(np.float32) + 1.0
+  post_mean = np.sum(x_data) / (N + 1.0)
+  post_sd = np.sqrt(1.0 / (N + 1.0))
+  log_evidence = stats.multivariate_normal.logpdf(
+      x_data, np.zeros(N), np.eye(N) + 1.0)
+
+  # Fix the variational model two posterior standard deviations away
+  # from the posterior mean, so that the ELBO is log p(x) - 2.
+  shape = [1] if native else []
+  qmu = Normal(mu=tf.Variable(tf.constant(post_mean + 2.0 * post_sd,
+                                          shape=shape)),
+               sigma=tf.Variable(tf.constant(post_sd, shape=shape)))
+  latent_vars, data, model_wrapper = _model(x_data, qmu, native)
+  elbo = ed.MFVI(latent_vars, data, model_wrapper)
+  elbo.initialize(n_samples=10, n_print=None)
+  bound = ed.IWVI(latent_vars, data, model_wrapper)
+  bound.initialize(K=5, n_samples=10, n_print=None)
+
+  elbo_val = np.mean([elbo.loss.eval() for _ in range(200)])
+  bound_val = np.mean([bound.loss.eval() for _ in range(200)])
+  assert np.abs(elbo_val - (log_evidence - 2.0)) < 0.3
+  assert bound_val > elbo_val + 0.5
+  assert bound_val < log_evidence + 0.2
+
+
+def _test_posterior(native):
+  N = 50
+  x_data = np.random.randn(N).astype(np.float32) + 1.0
+  post_mean = np.sum(x_data) / (N + 1.0)
+
+  shape = [1] if native else []
+  qmu = Normal(mu=tf.Variable(tf.zeros(shape)),
+               sigma=tf.nn.softplus(tf.Variable(tf.zeros(shape))))
+  latent_vars, data, model_wrapper = _model(x_data, qmu, native)
+  inference = ed.IWVI(latent_vars, data, model_wrapper)
+  inference.run(K=5, n_iter=2000, n_print=None)
+  assert np.abs(qmu.mu.eval() - post_mean) < 0.05
+
+
+class test_iwvi_class(tf.test.TestCase):
+
+  def test_bound_native(self):
+    with self.test_session():
+      _test_bound(True)
+
+  def test_bound_model_wrapper(self):
+    with self.test_session():
+      _test_bound(False)
+
+  def test_posterior_native(self):
+    with self.test_session():
+      _test_posterior(True)
+
+  def test_posterior_model_wrapper(self):
+    with self.test_session():
+      _test_posterior(False)
+
+if __name__ == '__main__':
+  np.random.seed(42)
+  tf.test.main()
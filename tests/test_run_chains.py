@@ -0,0 +1,43 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import edward as ed
+import numpy as np
+import tensorflow as tf
+
+from edward.models import PointMass
+from edward.stats import norm
+
+
+class NormalModel:
+  """p(x, mu) = Normal(x; mu, 1) Normal(mu; 0, 1)"""
+  def log_prob(self, xs, zs):
+    log_prior = tf.reduce_sum(norm.logpdf(zs['mu'], 0.0, 1.0))
+    log_lik = tf.reduce_sum(norm.logpdf(xs['x'], zs['mu'], 1.0))
+    return log_lik + log_prior
+
+
+def build_inference():
+  x_data = np.array([0.5, 1.5, 1.0, 2.0, 0.0], dtype=np.float32)
+  qmu = PointMass(params=tf.Variable(tf.zeros(1)))
+  return ed.SGLD({'mu': qmu}, {'x': x_data}, NormalModel())
+
+
+class test_run_chains_class(tf.test.TestCase):
+
+  def test_two_chains(self):
+    samples, rhat, ess = ed.run_chains(
+        build_inference, n_chains=2, n_check=50, seed=42, n_iter=200,
+        n_print=None, step_size=0.05, decay=0.0)
+    # Check the samples of each chain are merged, and the diagnostics
+    # are computed for each latent variable.
+    assert samples['mu'].shape[0] == 2
+    assert samples['mu'].shape[2:] == (1, )
+    assert 4 <= samples['mu'].shape[1] <= 201
+    assert np.all(np.isfinite(samples['mu']))
+    assert rhat['mu'].shape == (1, )
+    assert ess['mu'].shape == (1, )
+
+if __name__ == '__main__':
+  tf.test.main()
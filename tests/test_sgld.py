@@ -0,0 +1,87 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import edward as ed
+import numpy as np
+import tensorflow as tf
+
+from edward.models import Normal, PointMass
+from edward.stats import norm
+
+
+class NormalModel:
+  """p(x, mu) = Normal(x; mu, 1) Normal(mu; 0, 1)"""
+  def log_prob(self, xs, zs):
+    log_prior = norm.logpdf(zs['mu'], 0.0, 1.0)
+    log_lik = tf.reduce_sum(norm.logpdf(xs['x'], zs['mu'], 1.0))
+    return log_lik + log_prior
+
+
+def _test(inference_cls, **kwargs):
+  # The posterior of the normal mean is normal with precision N + 1.
+  x_data = np.random.randn(50).astype(np.float32) + 1.0
+  post_mean = np.sum(x_data) / 51.0
+  post_var = 1.0 / 51.0
+
+  mu = Normal(mu=tf.zeros(1), sigma=tf.ones(1))
+  x = Normal(mu=tf.ones(50) * mu, sigma=tf.ones(50))
+  qmu = PointMass(params=tf.Variable(tf.zeros(1)))
+
+  inference = inference_cls({mu: qmu}, {x: x_data})
+  # Use a constant step size, small enough to keep the discretization
+  # bias of the variance to a few percent.
+  inference.run(n_iter=10000, burn=1000, n_print=None, decay=0.0, **kwargs)
+  samples = inference.samples[mu].params.eval()
+  assert np.abs(np.mean(samples) - post_mean) < 0.05
+  assert np.abs(np.var(samples) / post_var - 1.0) < 0.3
+
+
+class test_sgld_class(tf.test.TestCase):
+
+  def test_sgld(self):
+    with self.test_session():
+      _test(ed.SGLD, step_size=2e-3)
+
+  def test_sghmc(self):
+    with self.test_session():
+      _test(ed.SGHMC, step_size=2e-3, friction=0.1)
+
+  def test_learning_rate(self):
+    with self.test_session() as sess:
+      mu = Normal(mu=tf.zeros(1), sigma=tf.ones(1))
+      x = Normal(mu=tf.ones(5) * mu, sigma=tf.ones(5))
+      qmu = PointMass(params=tf.Variable(tf.zeros(1)))
+
+      inference = ed.SGLD({mu: qmu}, {x: np.zeros(5, np.float32)})
+      inference.initialize(n_iter=10, n_print=None, step_size=0.1, decay=0.5)
+      learning_rate = inference._learning_rate()
+      for t in range(10):
+        # The step size of an update uses the iteration before its
+        # increment.
+        _, value = sess.run([inference.train, learning_rate])
+        assert np.allclose(value, 0.1 * (1.0 + t) ** -0.5)
+
+      assert inference.t.eval() == 10
+      inference.finalize()
+
+  def test_transformed_params(self):
+    with self.test_session():
+      sigma = Normal(mu=tf.zeros(1), sigma=tf.ones(1))
+      x = Normal(mu=tf.zeros(5), sigma=tf.ones(5) * tf.exp(sigma))
+      qsigma = PointMass(params=tf.nn.softplus(tf.Variable(tf.zeros(1))))
+
+      inference = ed.SGLD({sigma: qsigma}, {x: np.zeros(5, np.float32)})
+      self.assertRaises(ValueError, inference.initialize)
+
+  def test_wrapper_without_log_lik(self):
+    with self.test_session():
+      qmu = PointMass(params=tf.Variable(tf.zeros([])))
+
+      inference = ed.SGLD({'mu': qmu}, {'x': np.zeros(10, np.float32)},
+                          NormalModel())
+      self.assertRaises(ValueError, inference.initialize, n_minibatch=5)
+
+if __name__ == '__main__':
+  np.random.seed(42)
+  tf.test.main()
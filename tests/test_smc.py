@@ -0,0 +1,68 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import edward as ed
+import numpy as np
+import tensorflow as tf
+
+from edward.models import Normal
+from scipy import stats
+
+
+class test_smc_class(tf.test.TestCase):
+
+  def test_normal_mean(self):
+    with self.test_session():
+      # The posterior of the normal mean is normal with precision
+      # N + 1, and the data is jointly normal with covariance I + 11^T.
+      N = 20
+      x_data = np.random.randn(N).astype(np.float32) + 1.0
+      post_mean = np.sum(x_data) / (N + 1.0)
+      post_var = 1.0 / (N + 1.0)
+      log_evidence = stats.multivariate_normal.logpdf(
+          x_data, np.zeros(N), np.eye(N) + 1.0)
+
+      mu = Normal(mu=tf.zeros(1), sigma=tf.ones(1))
+      x = Normal(mu=tf.ones(1) * mu, sigma=tf.ones(1))
+      qmu = Normal(mu=tf.zeros(1), sigma=tf.ones(1))
+
+      inference = ed.SMC({mu: qmu}, {x: x_data})
+      inference.initialize(n_particles=5000, n_minibatch=1, n_print=None)
+      # Reweight the particles by each observation once.
+      for _ in range(N):
+        inference.update()
+
+      particles = inference.samples[mu].params.eval()[:, 0]
+      weights = np.exp(inference.log_weights.eval())
+      mean = np.sum(weights * particles)
+      var = np.sum(weights * (particles - mean) ** 2)
+      assert np.abs(mean - post_mean) < 0.05
+      assert np.abs(var / post_var - 1.0) < 0.25
+      assert np.abs(inference.log_evidence.eval() - log_evidence) < 0.2
+      inference.finalize()
+
+  def test_resample(self):
+    with self.test_session():
+      P = 100
+      qmu = Normal(mu=tf.zeros(1), sigma=tf.ones(1))
+      inference = ed.SMC({'mu': qmu})
+      inference.initialize(n_particles=P, n_print=None)
+      for u in [0.0, 0.3, 0.999]:
+        log_w = 3.0 * np.random.randn(P).astype(np.float32)
+        log_w -= np.log(np.sum(np.exp(log_w)))
+        idx = inference._resample(tf.constant(log_w), tf.constant(u)).eval()
+        # The ancestor of the ith point (i + u) / P is the first
+        # particle whose cumulative weight exceeds it.
+        cdf = np.cumsum(np.exp(log_w), dtype=np.float32)
+        cdf /= cdf[-1]
+        points = (np.arange(P) + u) / P
+        idx_true = np.minimum(np.searchsorted(cdf, points, side='right'),
+                              P - 1)
+        assert np.all(idx == idx_true)
+
+      inference.finalize()
+
+if __name__ == '__main__':
+  np.random.seed(42)
+  tf.test.main()